@@ -2,16 +2,144 @@
 
 from __future__ import annotations
 
+import csv
+import json
+import os
 import sys
-from argparse import ArgumentParser, Namespace
 import time
-from typing import Any, Callable, Iterable, Type
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any, Callable, Iterable, TextIO, Type
 
 import pytermgui as ptg
 
 import viz
 
 
+_latest_lookup = 0
+"""Counts submitted tip names, lookups from older submissions are dropped."""
+
+_tip_names: Future | None = None
+"""Index of every tip name, built in the background at startup."""
+
+def run_in_background(func: Callable[..., Any], *args: Any) -> Future:
+    """runs a function on a daemon thread so the UI keeps responding
+
+    Args:
+        func (Callable[..., Any]): function to run
+        *args (Any): arguments to func
+
+    Returns:
+        Future: holds the result (or exception) once func finishes
+    """
+    future: Future = Future()
+
+    def work() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    Thread(target=work, daemon=True).start()
+    return future
+
+class LatestRunner:
+    """Runs lookups one at a time on a daemon thread, a newer lookup cancels one still waiting to start.
+
+    A lookup that is already running can't be stopped, so at most one stale lookup
+    keeps running behind the latest one.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._waiting: tuple[Future, Callable[..., Any], tuple] | None = None
+        self._busy = False
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        """queues func to run next, cancelling the one queued before it
+
+        Args:
+            func (Callable[..., Any]): function to run
+            *args (Any): arguments to func
+
+        Returns:
+            Future: holds the result (or exception) once func finishes, cancelled if a newer lookup replaced it
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._waiting is not None:
+                self._waiting[0].cancel()
+            self._waiting = (future, func, args)
+            if not self._busy:
+                self._busy = True
+                Thread(target=self._work, daemon=True).start()
+        return future
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                if self._waiting is None:
+                    self._busy = False
+                    return
+                future, func, args = self._waiting
+                self._waiting = None
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+class UiCompositor(ptg.Compositor):
+    """A Compositor that runs calls handed over from other threads before drawing a frame.
+
+    Widgets and the window list are only read by the draw loop, so changing them
+    between its frames never races a draw.
+    """
+
+    def __init__(self, windows: list[ptg.Window], framerate: int) -> None:
+        super().__init__(windows, framerate)
+
+        self._calls: list[tuple[float, Callable[..., Any], tuple]] = []
+        self._calls_lock = Lock()
+
+    def call_at(self, when: float, func: Callable[..., Any], *args: Any) -> None:
+        """queues func to run on the draw loop at or after a time.monotonic() time"""
+        with self._calls_lock:
+            self._calls.append((when, func, args))
+
+    def draw(self, force: bool = False) -> None:
+        """runs due calls, then draws"""
+        # forced redraws come from the resize handler on the input thread, calls only run in the draw loop
+        if not force:
+            now = time.monotonic()
+            with self._calls_lock:
+                due = [call for call in self._calls if call[0] <= now]
+                self._calls = [call for call in self._calls if call[0] > now]
+            for _, func, args in due:
+                func(*args)
+
+        super().draw(force)
+
+class KaleManager(ptg.WindowManager):
+    """A WindowManager that background threads hand their window changes to, made on the draw loop."""
+
+    def __init__(self, **attrs: Any) -> None:
+        super().__init__(**attrs)
+
+        self.compositor = UiCompositor(self._windows, framerate=self.compositor.framerate)
+
+    def call_soon(self, func: Callable[..., Any], *args: Any) -> None:
+        """runs func on the draw loop before the next frame, safe to call from any thread"""
+        self.compositor.call_at(time.monotonic(), func, *args)
+
+    def call_later(self, delay: float, func: Callable[..., Any], *args: Any) -> None:
+        """runs func on the draw loop once delay seconds have passed, safe to call from any thread"""
+        self.compositor.call_at(time.monotonic() + delay, func, *args)
+
 class AppWindow(ptg.Window):
     """A generic application window.
 
@@ -47,10 +175,102 @@ class AppWindow(ptg.Window):
 
         self._add_widget(ptg.Container(f"[ptg.title]{self.app_title}", box=header_box))
 
+        # one lookup at a time per window, newer input cancels a waiting one
+        self._lookups = LatestRunner()
+
     def _update(self, *_: Any):
         """updates window contents after a condition is met"""
         return
 
+    def _update_names(self, names: list[str]) -> None:
+        """updates window contents for one or more input tip names, windows showing a single tip use the first
+
+        Args:
+            names (list[str]): tip names
+        """
+        self._update(names[0])
+
+    def _refresh(self, changes: dict[str, set[str] | None]) -> None:
+        """redraws window contents that depend on pipeline outputs that changed, used by -watch
+
+        Args:
+            changes (dict[str, set[str] | None]): changed outputs, from viz.SourceWatcher.poll()
+        """
+        return
+
+    def _start_lookup(self, value: Any, lookup: Callable[[Any], ptg.Widget]) -> None:
+        """shows a loading indicator and runs a lookup in the background, showing its result when done
+
+        Called on the draw loop (through KaleManager.call_soon), the result is handed back to it too.
+        Results of lookups started before the latest input are thrown away, and lookups that were
+        still waiting behind a running one never run.
+
+        Args:
+            value (Any): tip name, or names
+            lookup (Callable[[Any], ptg.Widget]): function making the window's new content
+        """
+        started = _latest_lookup
+        self._content.set_widgets([ptg.Label("Loading...")])
+
+        def show(future: Future) -> None:
+            if future.cancelled() or started != _latest_lookup:
+                return
+            try:
+                item = future.result()
+            except Exception as exc:
+                item = ptg.Label(f"[ptg.alert]Lookup failed: {exc}")
+            self._content.set_widgets([item])
+
+        self._lookups.submit(lookup, value).add_done_callback(lambda future: self.manager.call_soon(show, future))
+
+class TipInput(ptg.InputField):
+    """An InputField that suggests tip names as you type, <TAB> completes the name"""
+
+    def __init__(self, value: str = "", suggestions: ptg.Label | None = None, **attrs: Any) -> None:
+        super().__init__(value, **attrs)
+
+        self.suggestions = suggestions
+
+    def _replace(self, text: str) -> None:
+        """replaces the field's text"""
+        self.move_cursor((0, len(self.value) - self.cursor.col))
+        self.delete_back(len(self.value))
+        self.insert_text(text)
+
+    def _last_name(self) -> tuple[str, str]:
+        """splits the text into the names before the last comma and the name being typed"""
+        before, _, last = self.value.rpartition(",")
+        return (before + "," if before else ""), last.strip()
+
+    def _suggest(self) -> None:
+        """shows completions of the current text, or close names if nothing starts with it"""
+        if self.suggestions is None:
+            return
+        typed = self._last_name()[1]
+        if _tip_names is None or not _tip_names.done() or _tip_names.exception() is not None or typed == "":
+            self.suggestions.value = ""
+            return
+
+        index = _tip_names.result()
+        names = index.complete(typed, limit=5)
+        if len(names) > 0:
+            self.suggestions.value = "  ".join(names)
+        else:
+            self.suggestions.value = "[ptg.alert]no match[/] did you mean: " + "  ".join(index.suggest(typed))
+
+    def handle_key(self, key: str) -> bool:
+        """completes the tip name being typed on <TAB>, and refreshes suggestions after every edit"""
+        if key == ptg.keys.TAB and _tip_names is not None and _tip_names.done() and _tip_names.exception() is None:
+            before, typed = self._last_name()
+            self._replace(before + _tip_names.result().common_prefix(typed))
+            self._suggest()
+            return True
+
+        handled = super().handle_key(key)
+        if handled:
+            self._suggest()
+        return handled
+
 class Input_Updater(AppWindow):
     """A window for users to input tree tip names"""
 
@@ -60,36 +280,95 @@ class Input_Updater(AppWindow):
     def __init__(self, args: Namespace | None = None, **attrs: Any) -> None:
         super().__init__(args, **attrs)
 
-        self._input = ptg.InputField("Example_1234", prompt="Tip Name: ")
+        self._suggestions = ptg.Label("", parent_align=0)
+        self._input = TipInput("Example_1234", suggestions=self._suggestions, prompt="Tip Name: ")
         self._input.bind(ptg.keys.CARRIAGE_RETURN, lambda*_: updater(self.manager, self._input.value))
 
-        self._content = ptg.Container(self._input)
+        self._content = ptg.Container(self._input, self._suggestions)
         self._add_widget(self._content)
 
     def _update(self, *_: Any) -> None:
         """On update, empties InputField to accept new input"""
         self._content.set_widgets([])
 
-        item = ptg.InputField("", prompt="Tip Name: ")
+        self._suggestions = ptg.Label("", parent_align=0)
+        item = TipInput("", suggestions=self._suggestions, prompt="Tip Name: ")
         item.bind(ptg.keys.CARRIAGE_RETURN, lambda*_: updater(self.manager, item.value))
 
-        self._content.set_widgets(ptg.Container(item))
+        self._content.set_widgets(ptg.Container(item, self._suggestions))
 
 class TreeWindow(AppWindow):
-    """A window to show ascii phylogenetic tree output"""
+    """A window to show the phylogenetic tree, drawn to the window's width"""
 
     app_title = "Tree View"
     app_id = "tree"
 
     def __init__(self, args: Namespace | None = None, **attrs: Any) -> None:
+        # tree is read and rendered in the background the first time the window is drawn
+        self._loader: Future | None = None
+        self._loaded = False
+        self._tree: viz.TreeView | None = None
+        self._selected: str | None = None
+        # clades to collapse, from the command line
+        self._min_support = getattr(args, "collapse_support", None)
+        self._max_depth = getattr(args, "collapse_depth", None)
+
         super().__init__(args, **attrs)
 
-        self._content = viz.gui_ize()
+        self._content = ptg.Container(ptg.Label("Loading tree..."))
 
         self._add_widget(self._content)
 
+    def get_lines(self) -> list[str]:
+        """starts loading the tree on first draw, and swaps it in once it is ready"""
+        if self._loader is None:
+            # windows only get drawn once they are added to a manager
+            if self.manager is not None:
+                self._loader = run_in_background(viz.gui_ize, None, self._min_support, self._max_depth)
+        elif self._loader.done() and not self._loaded:
+            self._loaded = True
+            try:
+                self._tree = self._loader.result()
+                item = self._tree
+                if self._selected is not None:
+                    self._tree.jump_to(self._selected)
+            except Exception as exc:
+                item = ptg.Label(f"[ptg.alert]Could not load tree: {exc}")
+            self._content.set_widgets([item])
+
+        # only as many tree rows as fit below the header and inside both borders
+        if self._tree is not None:
+            self._tree.rows = max(1, self.height - self._widgets[0].height - 4)
+
+        return super().get_lines()
+
+    def handle_key(self, key: str) -> bool:
+        """scrolls the tree with the scroll keys"""
+        if self._tree is not None:
+            if key in self.keys["scroll_down"]:
+                return self._tree.scroll(1)
+            if key in self.keys["scroll_up"]:
+                return self._tree.scroll(-1)
+        return super().handle_key(key)
+
+    def _refresh(self, changes: dict[str, set[str] | None]) -> None:
+        """loads the tree again when the treefile was written, the old tree stays up until the new one is ready"""
+        if "tree" in changes:
+            self._loader = None
+            self._loaded = False
+
+    def _update(self, value: str) -> None:
+        """jumps to newly input tip in the tree
+
+        Args:
+            value (str): tip name
+        """
+        self._selected = value
+        if self._tree is not None:
+            self._tree.jump_to(value)
+
 class AlignmentView(AppWindow):
-    """A window to show alignment statistics of selected tip sequence"""
+    """A window to show alignment statistics and the aligned sequence of selected tip"""
 
     app_title = "Alignment Viewer"
     app_id = "alignment"
@@ -98,6 +377,7 @@ class AlignmentView(AppWindow):
         super().__init__(args, **attrs)
 
         self._content = ptg.Container(ptg.Label("Input tip name to show alignment stats"))
+        self._names: list[str] | None = None
 
         self._add_widget(self._content)
 
@@ -107,11 +387,42 @@ class AlignmentView(AppWindow):
         Args:
             id (str): tip name
         """
-        self._content.set_widgets([])
+        self._update_names([id])
+
+    def _update_names(self, names: list[str]) -> None:
+        """updates window to show the first tip's alignment statistics, and the stats of the clade holding every tip
+
+        Args:
+            names (list[str]): tip names
+        """
+        self._names = names
+        self._start_lookup(names, self._lookup)
 
-        item = viz.out_alignment_stats(id)
+    def _refresh(self, changes: dict[str, set[str] | None]) -> None:
+        """looks the shown tips up again when alignment outputs changed, clade stats cover more than the input tips
+        so any change to the stats counts"""
+        if self._names is not None and changes.keys() & {"stats", "clusters", "tree", "alignment"}:
+            self._start_lookup(self._names, self._lookup)
 
-        self._content.set_widgets(item)
+    @staticmethod
+    def _lookup(names: list[str]) -> ptg.Container:
+        """alignment stats of a tip and of the smallest clade holding all tips, with the first tip's aligned
+        sequence below when the tree and alignment fasta are there
+
+        Args:
+            names (list[str]): tip names
+
+        Returns:
+            ptg.Container: window content
+        """
+        items = [viz.out_alignment_stats(names[0])]
+        if os.path.exists(viz.tree_file()):
+            items.append(viz.out_clade_stats(names))
+        if os.path.exists(viz.alignment_index().path):
+            items.append(viz.out_alignment(names[0]))
+        if len(items) == 1:
+            return items[0]
+        return ptg.Container(*items, box="EMPTY")
 
 class BlastView(AppWindow):
 
@@ -122,6 +433,7 @@ class BlastView(AppWindow):
         super().__init__(args, **attrs)
 
         self._content = ptg.Container(ptg.Label("Input tip name to show blast stats"))
+        self._value: str | None = None
 
         self._add_widget(self._content)
 
@@ -131,27 +443,101 @@ class BlastView(AppWindow):
         Args:
             value (str): tip name
         """
-        self._content.set_widgets([])
+        self._value = value
+        self._start_lookup(value, viz.blast_table)
+
+    def _refresh(self, changes: dict[str, set[str] | None]) -> None:
+        """looks the shown tip up again when blast outputs holding it changed"""
+        if self._value is not None and self._value in changes.get("blast", ()):
+            self._start_lookup(self._value, viz.blast_table)
 
-        item = viz.blast_table(value)
+BATCH_FORMATS = ("tsv", "json")
+"""Output formats of the -batch mode."""
 
-        self._content.set_widgets(item)
+def _process_arguments(argv: list[str] | None = None) -> Namespace:
+    """Processes command line arguments.
 
-#TODO use this to do standalone windows
-# def _process_arguments(argv: list[str] | None = None) -> Namespace:
-#     """Processes command line arguments.
+    Note that you don't _have to_ use the bultin argparse module for this; it
+    is just what the module uses.
 
-#     Note that you don't _have to_ use the bultin argparse module for this; it
-#     is just what the module uses.
+    Args:
+        argv: A list of command line arguments, not including the binary path
+            (sys.argv[0]).
+    """
+
+    parser = ArgumentParser(description="KaleViewer, starts the interactive viewer unless -batch is given")
+    parser.add_argument("-batch", type=str, metavar="FILE", help="print the alignment stats and blast hits of every tip name in FILE (one per line, - for stdin) instead of starting the viewer")
+    parser.add_argument("-format", choices=BATCH_FORMATS, default="tsv", help="-batch output, tab separated with the best blast hit of each tip, or json lines with every hit")
+    parser.add_argument("-collapse_support", type=float, metavar="SUPPORT", help="collapse tree clades with sh-alrt support below SUPPORT into one row, looking up a tip opens the clades holding it")
+    parser.add_argument("-collapse_depth", type=int, metavar="DEPTH", help="collapse tree clades more than DEPTH nodes below the root into one row")
+    parser.add_argument("-watch", type=float, nargs="?", const=2.0, metavar="SECONDS", help="check for new pipeline output every SECONDS (default 2) while viewing, and update the windows it changes")
 
-#     Args:
-#         argv: A list of command line arguments, not including the binary path
-#             (sys.argv[0]).
-#     """
+    return parser.parse_args(argv)
 
-#     parser = ArgumentParser(description="KaleViewer")
+def _read_tip_names(path: str) -> list[str]:
+    """reads tip names, one per line, skipping blank lines and # comments
 
-#     return parser.parse_args(argv)
+    Args:
+        path (str): file to read, - for stdin
+
+    Returns:
+        list[str]: tip names in file order
+    """
+    handle = sys.stdin if path == "-" else open(path, "r")
+    try:
+        return [line.strip() for line in handle if line.strip() and not line.startswith("#")]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def batch_query(names: list[str], output_format: str = "tsv", out: TextIO = sys.stdout) -> None:
+    """writes the alignment stats and blast hits of many tips without the interactive viewer
+
+    Lookups for the whole batch are done in one go by viz.batch_lookup(). Each tip gets a line, in the
+    order given, with found telling if the tip has alignment stats (like the viewer's tip search), and
+    representative the tip they are of when clustering left the tip out of the alignment.
+
+    Args:
+        names (list[str]): tip names
+        output_format (str, optional): "tsv" for a header line then a row per tip with its best blast hit,
+            "json" for a json object per line with every hit. Defaults to "tsv".
+        out (TextIO, optional): where to write. Defaults to sys.stdout.
+    """
+    headers, results = viz.batch_lookup(names)
+    # first stats column is the tip name itself
+    stat_headers = headers[1:]
+
+    if output_format == "json":
+        for name in names:
+            result = results[name]
+            stats = result["stats"]
+            out.write(json.dumps({
+                "name": name,
+                "found": stats is not None,
+                "representative": result["representative"],
+                "stats": dict(zip(stat_headers, stats[1:])) if stats is not None else None,
+                "tree_order": result["tree_order"],
+                "root_distance": result["root_distance"],
+                "hits": [dict(zip(viz.SUMMARY_HIT_COLUMNS, hit)) for hit in result["hits"]],
+            }) + "\n")
+        return
+
+    writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+    writer.writerow(["name", "found", "representative", *stat_headers, "tree_order", "root_distance", "hits", *(f"best_{column}" for column in viz.SUMMARY_HIT_COLUMNS)])
+    for name in names:
+        result = results[name]
+        stats = result["stats"]
+        best = result["hits"][0] if result["hits"] else [None] * len(viz.SUMMARY_HIT_COLUMNS)
+        writer.writerow([
+            name,
+            stats is not None,
+            result["representative"],
+            *(stats[1:] if stats is not None else [None] * len(stat_headers)),
+            result["tree_order"],
+            result["root_distance"],
+            len(result["hits"]),
+            *best,
+        ])
 
 def _create_aliases() -> None:
     """Creates all the TIM aliases used by the application.
@@ -207,43 +593,127 @@ def _define_layout() -> ptg.Layout:
 
     return layout
 
-def tip_not_found(man: ptg.WindowManager) -> None:
-    """Opens a modal dialogue to warn user that input value was not found"""
+def tip_not_found(man: KaleManager) -> None:
+    """Opens a modal dialogue to warn user that input value was not found, closing it after 2 seconds
+
+    Runs on the draw loop, the dialogue is closed from there too.
+    """
 
     modal = man.alert( "[ptg.alert]Seqence Not Found!", "", center=True)
 
-    time.sleep(2)
+    def close() -> None:
+        # user may have closed it already
+        if modal in list(man):
+            man.remove(modal)
 
-    man.remove(modal)
+    man.call_later(2, close)
 
-def updater(manager: ptg.WindowManager, value: str) -> None:
+_tip_checks = LatestRunner()
+"""Checks input tip names exist, newer input cancels a check that hasn't started."""
+
+def updater(manager: KaleManager, value: str) -> None:
     """used to check input and update all windows on valid input
 
+    The check and the window lookups run in the background, newer input makes
+    lookups that are still running get thrown away. Windows are only changed on
+    the draw loop.
+
     Args:
-        manager (ptg.WindowManager): current window manager
-        value (str): user input tip name
+        manager (KaleManager): current window manager
+        value (str): user input tip name, or comma separated names to also show the clade holding them all
     """
-
-    # checks if input value is in alignment
-    if not viz.header_found(value):
-        tip_not_found(manager)
+    global _latest_lookup
+    _latest_lookup += 1
+    started = _latest_lookup
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    if not names:
+        manager.call_soon(tip_not_found, manager)
         return
-    
-    # updates all windows
-    for item in manager:
-        if isinstance(item, AppWindow):
-            item._update(value)
 
+    def found(future: Future) -> None:
+        if future.cancelled() or started != _latest_lookup:
+            return
+
+        # checks if every input name is in alignment
+        if future.exception() is not None or not all(future.result()):
+            tip_not_found(manager)
+            return
+
+        # updates all windows
+        for item in manager:
+            if isinstance(item, AppWindow):
+                item._update_names(names)
+
+    check = _tip_checks.submit(lambda: [viz.header_found(name) for name in names])
+    check.add_done_callback(lambda future: manager.call_soon(found, future))
+
+def watch(manager: KaleManager, seconds: float, status: ptg.Label) -> None:
+    """polls the pipeline outputs on a daemon thread, handing what changed to the draw loop, which
+    refreshes the windows showing it
+
+    A poll that goes wrong twice in a row is shown in status until a poll goes through again.
+
+    Args:
+        manager (KaleManager): current window manager
+        seconds (float): time between polls
+        status (ptg.Label): label to show poll errors in
+    """
+    watcher = viz.SourceWatcher()
+
+    def refresh(changes: dict[str, set[str] | None]) -> None:
+        for item in manager:
+            if isinstance(item, AppWindow):
+                item._refresh(changes)
+
+    def show(error: Exception | None) -> None:
+        status.value = "" if error is None else f"[ptg.alert]Watch: {type(error).__name__}: {error}"
+
+    def poll() -> None:
+        failures = 0
+        while True:
+            time.sleep(seconds)
+            error: Exception | None = None
+            try:
+                changes = watcher.poll()
+            except Exception as exc:
+                changes, error = {}, exc
+            if changes:
+                manager.call_soon(refresh, changes)
+
+            # a single failure is usually an output caught mid write, it is read again on the next poll
+            if error is None:
+                if failures >= 2:
+                    manager.call_soon(show, None)
+                failures = 0
+            else:
+                failures += 1
+                if failures >= 2:
+                    manager.call_soon(show, error)
+
+    Thread(target=poll, daemon=True).start()
+
+
+def _build_tip_index() -> viz.TipIndex:
+    """builds the tip name index, with the piece index close matches need so the first typo doesn't wait on it"""
+    index = viz.tip_index()
+    index.build_suggestions()
+    return index
 
 def main(argv: list[str] | None = None) -> None:
     """Runs the application."""
 
+    args = _process_arguments(argv)
+    if args.batch is not None:
+        batch_query(_read_tip_names(args.batch), args.format)
+        return
+
     _create_aliases()
     _configure_widgets()
 
-    #args = _process_arguments(argv)
+    global _tip_names
+    _tip_names = run_in_background(_build_tip_index)
 
-    with ptg.WindowManager() as manager:
+    with KaleManager() as manager:
         manager.layout = _define_layout()
 
         # Since header is the first defined slot, this will assign to the correct place
@@ -254,7 +724,7 @@ def main(argv: list[str] | None = None) -> None:
         # Since the second slot, body was not assigned to, we need to manually assign
         # to "footer"
         manager.add(footer, assign="footer")
-        manager.add(TreeWindow(), assign="body")
+        manager.add(TreeWindow(args), assign="body")
         manager.add(AlignmentView(), assign="lowright")
         manager.add(BlastView(), assign="lowleft")
 
@@ -264,6 +734,11 @@ def main(argv: list[str] | None = None) -> None:
             "Close window",
         )
 
+        if args.watch is not None:
+            status = ptg.Label("", parent_align=0)
+            footer += status
+            watch(manager, args.watch, status)
+
     ptg.tim.print("[!gradient(210)]Goodbye!")
 
 if __name__ == "__main__":
@@ -0,0 +1,336 @@
+#! /usr/bin/env python3
+"""times the viewer lookups and the python stages of the pipeline on made up data of growing size
+
+For every scale a dataset is written the way the pipeline leaves it (fastas/, blastout/, alignment/, tree/),
+with -fastas fasta files of -seqs sequences each, blast xml with -hits hits per file, and an alignment, stats csv and
+tree with a tip per hit. Sequences and hits are multiplied by the scale. Every operation is then timed in a
+fresh python process, so caches start empty and the peak memory belongs to that operation alone.
+
+The viewer lookups are timed twice, once reading the pipeline files and once more after pipeline.summarize()
+wrote the summary cache. Typing a tip name with a typo near its start into the input box is timed per keystroke,
+and checked against KEYSTROKE_BUDGET_MS, the exit code is 1 if it is over.
+
+usage: python benchmarks.py [-scales 1 4 16] [-fastas 4] [-seqs 1000] [-hits 50] [-lookups 200] [-keep DIR] [-json FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import Dict, List, Tuple
+
+from prettytable import PrettyTable
+
+import fake_tools
+
+# viewer functions called once per looked up tip
+LOOKUPS = ("blast_table", "header_found", "out_alignment_stats", "out_alignment")
+# every operation, in the order they are timed
+OPERATIONS = LOOKUPS + ("suggest", "gui_ize", "extract_database", "merge_fastas", "alignment_stats", "summarize")
+# name of the file listing the tips of a dataset
+TIPS_NAME = "tips.txt"
+# most time a keystroke in the input box may take on completions and close-match suggestions
+KEYSTROKE_BUDGET_MS = 1.0
+
+def random_newick(ids: List[str], rng: random.Random) -> str:
+    """builds a random, roughly balanced tree with branch lengths and sh-alrt supports
+
+    Args:
+        ids (List[str]): tip names
+        rng (random.Random): random source
+
+    Returns:
+        str: newick tree
+    """
+    nodes = [f"{id}:{rng.uniform(0.01, 1):.4f}" for id in ids]
+    rng.shuffle(nodes)
+    while len(nodes) > 2:
+        # join neighbours pairwise, like building a balanced tree from the bottom up
+        joined = [f"({nodes[i]},{nodes[i + 1]}){rng.randint(0, 100)}:{rng.uniform(0.01, 0.5):.4f}" for i in range(0, len(nodes) - 1, 2)]
+        if len(nodes) % 2:
+            joined.append(nodes[-1])
+        nodes = joined
+    return f"({','.join(nodes)});\n"
+
+def generate(path: str, fastas: int, seqs: int, hits: int, seed: int = 0) -> int:
+    """writes a made up dataset, laid out like the pipeline's output
+
+    Args:
+        path (str): directory to write to
+        fastas (int): number of fasta files (and blast outputs)
+        seqs (int): sequences per fasta
+        hits (int): blast hits per fasta, picked at random from its sequences
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        int: number of tips
+    """
+    rng = random.Random(seed)
+    for directory in ("fastas", "blastout", "alignment", "tree"):
+        os.makedirs(f"{path}/{directory}", exist_ok=True)
+    query_len = 900
+    with open(f"{path}/query.fasta", "w") as query:
+        query.write(">query\n" + "".join(rng.choices("ACGT", k=query_len)) + "\n")
+
+    tips = []
+    picked_records = []
+    for i in range(fastas):
+        name = f"F{i}"
+        records = []
+        with open(f"{path}/fastas/{name}.fasta", "w") as fasta:
+            for j in range(seqs):
+                id = f"{name}_{j}"
+                seq = "".join(rng.choices("ACGT", k=rng.randint(300, 900)))
+                records.append((id, f">{id} len={len(seq)}", seq))
+                # 60 bases per line like most fastas
+                fasta.write(f">{id} len={len(seq)}\n" + "\n".join(seq[k:k + 60] for k in range(0, len(seq), 60)) + "\n")
+        picked = rng.sample(records, min(hits, len(records)))
+        with open(f"{path}/blastout/{name}_blastout", "w") as blastout:
+            blastout.write(fake_tools.blast_xml("blastn", f"{path}/fastas/{name}.fasta", [(("query", query_len), fake_tools.score_hits(picked, query_len))]))
+        tips += [id for id, _, _ in picked]
+        picked_records += picked
+
+    with open(f"{path}/alignment/alignment_seq_stats.csv", "w") as stats:
+        stats.write("seq_name;internal_FS;internal_STOP;internal_DEL\n")
+        for id in tips:
+            stats.write(f"{id};{rng.randint(0, 3)};{rng.randint(0, 2)};{rng.randint(0, 1500)}\n")
+    # every hit placed somewhere along a gapped alignment, one line per sequence like macse writes it
+    columns = 3 * query_len
+    with open(f"{path}/alignment/alignment_NT_NoFS.fasta", "w") as alignment:
+        for id, _, seq in picked_records:
+            start = rng.randint(0, columns - len(seq))
+            alignment.write(f">{id}\n" + "-" * start + seq + "-" * (columns - start - len(seq)) + "\n")
+    with open(f"{path}/tree/alignment_NT_NoFS.fasta.treefile", "w") as tree:
+        tree.write(random_newick(tips, rng))
+    with open(f"{path}/{TIPS_NAME}", "w") as tip_file:
+        tip_file.write("\n".join(tips) + "\n")
+    return len(tips)
+
+def dir_size(path: str) -> int:
+    """total size of the files directly in a directory"""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+def max_rss_mb() -> float:
+    """peak memory of this process so far, in MB (linux reports kB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def database_outputs() -> List[Tuple[str, str]]:
+    """(blast output, fasta) of every database of the dataset in the working directory"""
+    return [(f"blastout/{os.path.splitext(name)[0]}_blastout", f"fastas/{name}") for name in sorted(os.listdir("fastas"))]
+
+def measure(operation: str, path: str, lookups: int) -> Dict[str, float]:
+    """times one operation on a dataset, meant to be run in its own process
+
+    Args:
+        operation (str): one of OPERATIONS
+        path (str): dataset directory
+        lookups (int): number of tips to look up, for the viewer lookups
+
+    Returns:
+        Dict[str, float]: cold_s (first call), warm_s (all later calls), calls (number of later calls),
+            bytes (input read, for the pipeline stages), rss_start_mb and rss_mb (peak memory before and after)
+    """
+    os.chdir(path)
+    # imported here so the import itself isn't counted in the other process
+    import outputs
+    import viz
+    import pipeline
+
+    with open(TIPS_NAME) as tip_file:
+        tips = tip_file.read().split()
+    ids = random.Random(1).sample(tips, min(lookups, len(tips)))
+    result = {"calls": 0, "warm_s": 0.0, "bytes": 0, "rss_start_mb": max_rss_mb()}
+
+    start = time.perf_counter()
+    if operation in LOOKUPS:
+        func = getattr(viz, operation)
+        func(ids[0])
+        result["cold_s"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for id in ids:
+            func(id)
+        result["warm_s"] = time.perf_counter() - start
+        result["calls"] = len(ids)
+    elif operation == "suggest":
+        # the index and its piece index are built in the background while the viewer starts
+        index = viz.tip_index()
+        index.build_suggestions()
+        result["cold_s"] = time.perf_counter() - start
+        rng = random.Random(2)
+        typed = []
+        for id in ids:
+            at = rng.randrange(min(3, len(id)))
+            typed.append(id[:at] + "x" + id[at + 1:])
+        # every keystroke shows completions, or close names once nothing starts with the text, like Input_Updater
+        start = time.perf_counter()
+        for text in typed:
+            for end in range(1, len(text) + 1):
+                if not index.complete(text[:end], limit=5):
+                    index.suggest(text[:end])
+                result["calls"] += 1
+        result["warm_s"] = time.perf_counter() - start
+    elif operation == "gui_ize":
+        # laid out and drawn the first time, like the tree window's first screen
+        view = viz.gui_ize()
+        view.width = 160
+        view.get_lines()
+        result["cold_s"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(10):
+            view = viz.gui_ize()
+            view.width = 160
+            view.get_lines()
+        result["warm_s"] = time.perf_counter() - start
+        result["calls"] = 10
+    elif operation == "extract_database":
+        # one extract task per database, like pipeline_tasks() runs them
+        for part, (output, fasta) in enumerate(database_outputs()):
+            pipeline.extract_database(output, fasta, f".bench_{part}_hits.fasta")
+        result["cold_s"] = time.perf_counter() - start
+        result["bytes"] = dir_size("fastas") + dir_size("blastout")
+    elif operation == "merge_fastas":
+        # the parts the extract tasks leave, written first and not timed
+        parts = []
+        for part, (output, fasta) in enumerate(database_outputs()):
+            parts.append(f".bench_{part}_hits.fasta")
+            pipeline.extract_database(output, fasta, parts[-1])
+        result["bytes"] = sum(os.path.getsize(part) for part in parts)
+        start = time.perf_counter()
+        pipeline.merge_fastas(parts, "bench_alignment_seqs.fasta")
+        result["cold_s"] = time.perf_counter() - start
+    elif operation == "alignment_stats":
+        alignment = "alignment/alignment_NT_NoFS.fasta"
+        outputs.write_alignment_stats(alignment, "alignment/bench_seq_stats.csv", "alignment/bench_site_stats.csv")
+        result["cold_s"] = time.perf_counter() - start
+        result["bytes"] = os.path.getsize(alignment)
+        # recounting a few tips, like after realigning them
+        start = time.perf_counter()
+        outputs.write_alignment_stats(alignment, "alignment/bench_seq_stats.csv", ids=ids[:10])
+        result["warm_s"] = time.perf_counter() - start
+        result["calls"] = 1
+    elif operation == "summarize":
+        pipeline.summarize()
+        result["cold_s"] = time.perf_counter() - start
+        result["bytes"] = dir_size("blastout")
+    else:
+        raise ValueError(f"unknown operation {operation}")
+    result["rss_mb"] = max_rss_mb()
+    return result
+
+def run_measure(operation: str, path: str, lookups: int) -> Dict[str, float]:
+    """runs measure() in a fresh python process
+
+    Args:
+        operation (str): one of OPERATIONS
+        path (str): dataset directory
+        lookups (int): number of tips to look up
+
+    Returns:
+        Dict[str, float]: measure()'s result
+    """
+    # the viewer's on disk hit index would make later cold lookups look warm
+    for leftover in (f"{path}/blastout/.kaleview_hit_index.json", f"{path}/alignment_seqs.fasta"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    cmd = [sys.executable, os.path.abspath(__file__), "-measure", operation, path, "-lookups", str(lookups)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")])))
+    # the pipeline functions print every missing header, only keep the json on the last line
+    output = subprocess.run(cmd, stdout=subprocess.PIPE, env=env, check=True).stdout.decode()
+    return json.loads(output.strip().splitlines()[-1])
+
+def report(results: List[dict]) -> str:
+    """table of benchmark results
+
+    Args:
+        results (List[dict]): results of run_measure() with the dataset's scale, sizes and operation added
+
+    Returns:
+        str: the table
+    """
+    table = PrettyTable(["scale", "fastas", "seqs", "tips", "operation", "cold ms", "warm ms/call", "calls/s", "MB/s", "rss MB", "+rss MB"])
+    table.align = "r"
+    table.align["operation"] = "l"
+    for result in results:
+        calls = result["calls"]
+        per_call = result["warm_s"] / calls if calls else None
+        table.add_row([
+            result["scale"], result["fastas"], result["seqs"], result["tips"], result["operation"],
+            f"{result['cold_s'] * 1000:.1f}",
+            "" if per_call is None else f"{per_call * 1000:.3f}",
+            "" if not per_call else f"{1 / per_call:.0f}",
+            "" if not result["bytes"] else f"{result['bytes'] / 1024 / 1024 / result['cold_s']:.1f}",
+            f"{result['rss_mb']:.0f}",
+            f"{result['rss_mb'] - result['rss_start_mb']:.0f}",
+        ])
+    return str(table)
+
+def process_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """processes command line arguments using argparse
+
+    Args:
+        argv (list[str] | None, optional): list of arguments from commandline. Defaults to None.
+
+    Returns:
+        argparse.Namespace: argparse arguments
+    """
+    parser = argparse.ArgumentParser(description="times the viewer lookups and the python stages of the pipeline on made up data")
+    parser.add_argument("-scales", type=int, nargs="+", default=[1, 4, 16], help="dataset sizes, multiply -seqs and -hits")
+    parser.add_argument("-fastas", type=int, default=4, help="number of fasta files")
+    parser.add_argument("-seqs", type=int, default=1000, help="sequences per fasta at scale 1")
+    parser.add_argument("-hits", type=int, default=50, help="blast hits per fasta at scale 1")
+    parser.add_argument("-lookups", type=int, default=200, help="number of tips looked up per viewer lookup benchmark")
+    parser.add_argument("-operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS), help="operations to time")
+    parser.add_argument("-keep", type=str, help="write the datasets here and keep them, instead of a temp directory")
+    parser.add_argument("-json", type=str, help="also write the results to this file, to compare runs")
+    parser.add_argument("-measure", nargs=2, metavar=("OPERATION", "DATASET"), help=argparse.SUPPRESS)
+    argv = argv or sys.argv[1:]
+    return parser.parse_args(args=argv)
+
+def main(argv: list[str] | None = None) -> None:
+    args = process_args(argv)
+    if args.measure:
+        operation, path = args.measure
+        print(json.dumps(measure(operation, path, args.lookups)))
+        return
+
+    root = args.keep or tempfile.mkdtemp(prefix="kaleview_bench_")
+    results = []
+    try:
+        for scale in args.scales:
+            path = os.path.abspath(f"{root}/scale_{scale}")
+            seqs, hits = args.seqs * scale, args.hits * scale
+            print(f"generating scale {scale}: {args.fastas} fastas x {seqs} sequences, {hits} hits each", file=sys.stderr)
+            tips = generate(path, args.fastas, seqs, hits, seed=scale)
+            info = {"scale": scale, "fastas": args.fastas, "seqs": seqs, "tips": tips}
+
+            for operation in args.operations:
+                print(f"  {operation}", file=sys.stderr)
+                results.append({**info, "operation": operation, **run_measure(operation, path, args.lookups)})
+            # lookups again, now that summarize() has written the summary cache
+            if "summarize" in args.operations:
+                for operation in [operation for operation in args.operations if operation in LOOKUPS]:
+                    print(f"  {operation} (summary cache)", file=sys.stderr)
+                    results.append({**info, "operation": f"{operation} (summary cache)", **run_measure(operation, path, args.lookups)})
+    finally:
+        if args.keep is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(report(results))
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(results, out, indent=1)
+
+    over = [result for result in results if result["operation"] == "suggest" and result["warm_s"] / result["calls"] * 1000 > KEYSTROKE_BUDGET_MS]
+    for result in over:
+        print(f"suggest at scale {result['scale']} ({result['tips']} tips) takes {result['warm_s'] / result['calls'] * 1000:.3f} ms per keystroke, over the {KEYSTROKE_BUDGET_MS} ms budget")
+    if over:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,303 @@
+#! /usr/bin/env python3
+"""stand ins for the external tools pipeline.py runs, to try the pipeline out without installing them
+
+`python fake_tools.py DIR` writes makeblastdb, blastn/blastp/blastx/tblastn, blast_formatter, blastdbcmd,
+java (macse) and iqtree into DIR. Put DIR first on PATH and run pipeline.py as usual. The outputs are
+made up but in the formats the pipeline and viewer read.
+
+Each call can be made to burn cpu and hold memory, so the run log has something to show:
+    FAKE_TOOLS_CPU  seconds of cpu to use per call (default 0)
+    FAKE_TOOLS_MB   megabytes of memory to hold per call (default 0)
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+from typing import Dict, List, Tuple
+
+TOOLS = ("makeblastdb", "blastn", "blastp", "blastx", "tblastn", "blast_formatter", "blastdbcmd", "java", "iqtree")
+
+def install(directory: str) -> None:
+    """writes a shell wrapper for every tool into a directory
+
+    Args:
+        directory (str): directory to write the wrappers to, made if it doesn't exist
+    """
+    os.makedirs(directory, exist_ok=True)
+    for tool in TOOLS:
+        path = f"{directory}/{tool}"
+        with open(path, "w") as wrapper:
+            wrapper.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" {tool} "$@"\n')
+        os.chmod(path, 0o755)
+
+def options(argv: List[str]) -> Dict[str, str]:
+    """reads "-flag value" pairs out of a command line, flags without a value map to ""
+
+    Args:
+        argv (List[str]): arguments
+
+    Returns:
+        Dict[str, str]: flag -> value
+    """
+    opts = {}
+    for i, arg in enumerate(argv):
+        if arg.startswith("-") and len(arg) > 1:
+            value = argv[i + 1] if i + 1 < len(argv) else ""
+            opts[arg] = "" if value.startswith("-") and len(value) > 1 else value
+    return opts
+
+def read_fasta(path: str) -> List[Tuple[str, str, str]]:
+    """reads a fasta into (id, header, sequence) tuples
+
+    Args:
+        path (str): fasta file
+
+    Returns:
+        List[Tuple[str, str, str]]: records in file order
+    """
+    records = []
+    with open(path) as fasta:
+        for line in fasta:
+            line = line.rstrip("\n")
+            if line.startswith(">"):
+                parts = line[1:].split(None, 1)
+                records.append([parts[0] if parts else "", line, []])
+            elif records:
+                records[-1][2].append(line.strip())
+    return [(id, header, "".join(seq)) for id, header, seq in records]
+
+def busy() -> None:
+    """uses the cpu and memory asked for through FAKE_TOOLS_CPU and FAKE_TOOLS_MB"""
+    held = bytearray(int(float(os.environ.get("FAKE_TOOLS_MB", 0)) * 1024 * 1024))
+    for i in range(0, len(held), 4096):
+        held[i] = 1
+    end = time.process_time() + float(os.environ.get("FAKE_TOOLS_CPU", 0))
+    while time.process_time() < end:
+        pass
+
+def score_hits(records: List[Tuple[str, str, str]], query_len: int) -> List[Tuple[str, int, float, float, int]]:
+    """makes up scores for hits on the given records, the same ones every run
+
+    Args:
+        records (List[Tuple[str, str, str]]): (id, header, sequence) of the hit sequences
+        query_len (int): length of the query
+
+    Returns:
+        List[Tuple[str, int, float, float, int]]: (hit id, hit length, bitscore, evalue, identity) for each hit, best first
+    """
+    hits = []
+    for id, _, seq in records:
+        seed = int.from_bytes(hashlib.blake2b(id.encode(), digest_size=4).digest(), "big")
+        bitscore = round(40 + seed % 4000 + (seed % 100) / 100, 2)
+        evalue = float(f"{10 ** -(seed % 50 + 6):.3g}")
+        hits.append((id, len(seq), bitscore, evalue, min(len(seq), query_len) * (70 + seed % 30) // 100))
+    hits.sort(key=lambda hit: -hit[2])
+    return hits
+
+def fake_hits(query: str, db: str, max_targets: int) -> List[Tuple[Tuple[str, int], List[Tuple[str, int, float, float, int]]]]:
+    """makes up hits of every query sequence against a database, a run of records of the database fasta picked by the query id
+
+    Args:
+        query (str): query fasta
+        db (str): database (the fasta it was made from)
+        max_targets (int): max number of hits per query
+
+    Returns:
+        List[Tuple[Tuple[str, int], List[Tuple[str, int, float, float, int]]]]: (query id, query length) and
+            the hits from score_hits() for every query, in query order
+    """
+    records = read_fasta(db)
+    results = []
+    for query_id, _, query_seq in read_fasta(query):
+        # depends only on the query, like a real search, so splitting the query doesn't change the hits
+        start = int.from_bytes(hashlib.blake2b(query_id.encode(), digest_size=4).digest(), "big") % len(records) if records else 0
+        picked = (records[start:] + records[:start])[:max_targets]
+        results.append(((query_id, len(query_seq)), score_hits(picked, len(query_seq))))
+    return results
+
+def blast_xml(program: str, db: str, iterations: List[Tuple[Tuple[str, int], List[Tuple[str, int, float, float, int]]]]) -> str:
+    """formats hits as blast xml (-outfmt 5), an iteration per query"""
+    query_id, query_len = iterations[0][0] if iterations else ("", 0)
+    out = [
+        '<?xml version="1.0"?>',
+        '<!DOCTYPE BlastOutput PUBLIC "-//NCBI//NCBI BlastOutput/EN" "http://www.ncbi.nlm.nih.gov/dtd/NCBI_BlastOutput.dtd">',
+        "<BlastOutput>",
+        f"  <BlastOutput_program>{program}</BlastOutput_program>",
+        f"  <BlastOutput_version>{program.upper()} 2.9.0+</BlastOutput_version>",
+        "  <BlastOutput_reference>fake_tools</BlastOutput_reference>",
+        f"  <BlastOutput_db>{db}</BlastOutput_db>",
+        "  <BlastOutput_query-ID>Query_1</BlastOutput_query-ID>",
+        f"  <BlastOutput_query-def>{query_id}</BlastOutput_query-def>",
+        f"  <BlastOutput_query-len>{query_len}</BlastOutput_query-len>",
+        "  <BlastOutput_param>",
+        "    <Parameters>",
+        "      <Parameters_expect>1e-05</Parameters_expect>",
+        "    </Parameters>",
+        "  </BlastOutput_param>",
+        "<BlastOutput_iterations>",
+    ]
+    for iter_num, ((query_id, query_len), hits) in enumerate(iterations, 1):
+        out += blast_xml_iteration(iter_num, query_id, query_len, hits)
+    out += [
+        "</BlastOutput_iterations>",
+        "</BlastOutput>",
+    ]
+    return "\n".join(out) + "\n"
+
+def blast_xml_iteration(iter_num: int, query_id: str, query_len: int, hits: List[Tuple[str, int, float, float, int]]) -> List[str]:
+    """lines of the <Iteration> element of one query"""
+    out = [
+        "<Iteration>",
+        f"  <Iteration_iter-num>{iter_num}</Iteration_iter-num>",
+        f"  <Iteration_query-ID>Query_{iter_num}</Iteration_query-ID>",
+        f"  <Iteration_query-def>{query_id}</Iteration_query-def>",
+        f"  <Iteration_query-len>{query_len}</Iteration_query-len>",
+        "<Iteration_hits>",
+    ]
+    for num, (id, hit_len, bitscore, evalue, identity) in enumerate(hits, 1):
+        align_len = max(identity, 1)
+        out += [
+            "<Hit>",
+            f"  <Hit_num>{num}</Hit_num>",
+            f"  <Hit_id>{id}</Hit_id>",
+            "  <Hit_def>No definition line</Hit_def>",
+            f"  <Hit_accession>{id}</Hit_accession>",
+            f"  <Hit_len>{hit_len}</Hit_len>",
+            "  <Hit_hsps>",
+            "    <Hsp>",
+            "      <Hsp_num>1</Hsp_num>",
+            f"      <Hsp_bit-score>{bitscore}</Hsp_bit-score>",
+            f"      <Hsp_score>{int(bitscore * 2)}</Hsp_score>",
+            f"      <Hsp_evalue>{evalue}</Hsp_evalue>",
+            "      <Hsp_query-from>1</Hsp_query-from>",
+            f"      <Hsp_query-to>{align_len}</Hsp_query-to>",
+            "      <Hsp_hit-from>1</Hsp_hit-from>",
+            f"      <Hsp_hit-to>{align_len}</Hsp_hit-to>",
+            "      <Hsp_query-frame>1</Hsp_query-frame>",
+            "      <Hsp_hit-frame>1</Hsp_hit-frame>",
+            f"      <Hsp_identity>{identity}</Hsp_identity>",
+            f"      <Hsp_positive>{identity}</Hsp_positive>",
+            "      <Hsp_gaps>0</Hsp_gaps>",
+            f"      <Hsp_align-len>{align_len}</Hsp_align-len>",
+            f"      <Hsp_qseq>{'A' * align_len}</Hsp_qseq>",
+            f"      <Hsp_hseq>{'A' * align_len}</Hsp_hseq>",
+            f"      <Hsp_midline>{'|' * align_len}</Hsp_midline>",
+            "    </Hsp>",
+            "  </Hit_hsps>",
+            "</Hit>",
+        ]
+    out += [
+        "</Iteration_hits>",
+        "  <Iteration_stat>",
+        "    <Statistics>",
+        f"      <Statistics_db-num>{len(hits)}</Statistics_db-num>",
+        "    </Statistics>",
+        "  </Iteration_stat>",
+        "</Iteration>",
+    ]
+    return out
+
+def blast_tab(iterations: List[Tuple[Tuple[str, int], List[Tuple[str, int, float, float, int]]]]) -> str:
+    """formats hits as tabular blast output with the std columns (-outfmt 6)"""
+    rows = []
+    for (query_id, _), hits in iterations:
+        for id, hit_len, bitscore, evalue, identity in hits:
+            align_len = max(identity, 1)
+            pident = round(100 * identity / align_len, 3)
+            rows.append("\t".join(str(value) for value in (query_id, id, pident, align_len, 0, 0, 1, align_len, 1, align_len, evalue, bitscore)))
+    return "".join(row + "\n" for row in rows)
+
+def blast_output(program: str, query: str, db: str, max_targets: int, outfmt: str) -> str:
+    """output of a blast search in one of the formats the pipeline asks for (5, 6 and 11)"""
+    if outfmt == "11":
+        # the archive just remembers the search, blast_formatter redoes it
+        return json.dumps({"program": program, "query": query, "db": db, "max_targets": max_targets}) + "\n"
+    iterations = fake_hits(query, db, max_targets)
+    if outfmt.startswith("6"):
+        return blast_tab(iterations)
+    return blast_xml(program, db, iterations)
+
+def write_copy(src: str, dst: str) -> None:
+    """copies a file, used for the made up alignments"""
+    with open(src) as file_in, open(dst, "w") as file_out:
+        file_out.write(file_in.read())
+
+def run(tool: str, argv: List[str]) -> int:
+    """does the work of one tool
+
+    Args:
+        tool (str): tool name, one of TOOLS
+        argv (List[str]): arguments the tool was called with
+
+    Returns:
+        int: exit code
+    """
+    busy()
+    opts = options(argv)
+    if tool == "makeblastdb":
+        letter = opts.get("-dbtype", "nucl")[0]
+        for end in ("in", "hr", "sq"):
+            open(f"{opts['-in']}.{letter}{end}", "w").close()
+    elif tool in ("blastn", "blastp", "blastx", "tblastn"):
+        sys.stdout.write(blast_output(tool, opts["-query"], opts["-db"], int(opts.get("-max_target_seqs", 500)), opts.get("-outfmt", "0")))
+    elif tool == "blast_formatter":
+        with open(opts["-archive"]) as archive:
+            search = json.load(archive)
+        sys.stdout.write(blast_output(search["program"], search["query"], search["db"], search["max_targets"], opts.get("-outfmt", "0")))
+    elif tool == "blastdbcmd":
+        with open(opts["-entry_batch"]) as batch:
+            wanted = {line.strip() for line in batch if line.strip()}
+        for id, header, seq in read_fasta(opts["-db"]):
+            if id in wanted:
+                sys.stdout.write(f">lcl|{header[1:]}\n{seq}\n")
+    elif tool == "java" and opts.get("-prog") == "alignSequences":
+        write_copy(opts["-seq"], opts["-out_NT"])
+        write_copy(opts["-seq"], opts["-out_AA"])
+    elif tool == "java" and opts.get("-prog") == "exportAlignment":
+        records = read_fasta(opts["-align"])
+        if "-out_stat_per_seq" in opts:
+            with open(opts["-out_stat_per_seq"], "w") as stats:
+                stats.write("seq_name;internal_FS;internal_STOP;internal_DEL\n")
+                for id, _, seq in records:
+                    stats.write(f"{id};{seq.count('!')};{seq.count('*')};{seq.count('-')}\n")
+        if "-out_stat_per_site" in opts:
+            with open(opts["-out_stat_per_site"], "w") as stats:
+                stats.write("site;A;C;G;T;gap\n")
+                for site in range(max((len(seq) for _, _, seq in records), default=0)):
+                    column = [seq[site] if site < len(seq) else "-" for _, _, seq in records]
+                    stats.write(f"{site + 1};" + ";".join(str(column.count(char)) for char in "ACGT-") + "\n")
+        for flag in ("-out_NT", "-out_AA"):
+            if opts.get(flag):
+                write_copy(opts["-align"], opts[flag])
+    elif tool == "iqtree":
+        ids = [id for id, _, _ in read_fasta(opts["-s"])]
+        prefix = opts.get("-pre") or opts["-s"]
+        # caterpillar tree with made up branch lengths and sh-alrt supports
+        newick = f"{ids[0]}:0.1" if ids else ""
+        for i, id in enumerate(ids[1:-1], 1):
+            newick = f"({newick},{id}:{0.05 * (i % 7 + 1):.2f}){50 + i * 7 % 50}:{0.01 * (i % 5 + 1):.2f}"
+        if len(ids) > 1:
+            newick = f"({newick},{ids[-1]}:0.1)"
+        with open(f"{prefix}.treefile", "w") as treefile:
+            treefile.write(newick + ";\n")
+        with open(f"{prefix}.log", "w") as log:
+            log.write(f"fake iqtree {' '.join(argv)}\n")
+    else:
+        print(f"fake {tool} doesn't know how to handle {' '.join(argv)}", file=sys.stderr)
+        return 1
+    return 0
+
+def main(argv: List[str]) -> int:
+    if len(argv) == 1 and argv[0] not in TOOLS:
+        install(argv[0])
+        print(f"fake tools written to {argv[0]}, add it to the front of PATH to use them")
+        return 0
+    if not argv or argv[0] not in TOOLS:
+        print(__doc__)
+        return 1
+    return run(argv[0], argv[1:])
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
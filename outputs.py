@@ -0,0 +1,539 @@
+#! /usr/bin/env python3
+
+"""readers of pipeline outputs shared by pipeline.py and the viewer, kept free of the viewer's dependencies"""
+
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+from xml.sax.saxutils import unescape
+import csv
+import gzip
+import mmap
+import os
+import re
+import threading
+import numpy as np
+
+# residues counted per alignment column, lower case is folded to upper case, anything else counts as a gap
+ALIGNMENT_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ*!"
+# byte -> index into ALIGNMENT_ALPHABET, len(ALIGNMENT_ALPHABET) for gaps
+_ALIGNMENT_CODES = np.full(256, len(ALIGNMENT_ALPHABET), dtype=np.uint8)
+for _code, _residue in enumerate(ALIGNMENT_ALPHABET):
+    _ALIGNMENT_CODES[_residue] = _code
+    _ALIGNMENT_CODES[ord(chr(_residue).lower())] = _code
+# sequences turned into codes at a time while counting residues, bounds memory to rows x alignment length
+ALIGNMENT_BLOCK_ROWS = 64
+# bytes of blast xml read at a time by blast_xml_matches
+BLAST_READ_CHUNK = 1 << 20
+# blast outputs are named after their database's fasta with this added
+BLASTOUT_END = "_blastout"
+# endings of xml blast output, plain or gzip compressed
+BLASTOUT_ENDS = (BLASTOUT_END, BLASTOUT_END + ".gz")
+# ending of tabular blast output
+BLAST_TAB_END = BLASTOUT_END + ".tsv"
+# columns of tabular blast output, the fixed set pipeline.blast_job asks for
+BLAST_TAB_COLUMNS = ("qseqid", "sseqid", "pident", "length", "mismatch", "gapopen", "qstart", "qend", "sstart", "send", "evalue", "bitscore")
+# numbers kept per hit by blast_summary_rows, after the hit id
+SUMMARY_HIT_COLUMNS = ("file", "query", "hit_len", "hsps", "bitscore", "evalue", "identity", "align_len")
+# sqlite cache written by pipeline.summarize
+SUMMARY_NAME = "kaleview_summary.sqlite"
+# directory of the clustering output, and the tip -> representative map in it
+CLUSTER_DIR = "cluster"
+CLUSTER_MAP_NAME = "clusters.tsv"
+# elements blast_summary_rows reads out of blast xml
+BLAST_SUMMARY_RE = re.compile(rb"<(Iteration_query-def|Hit_id|Hit_def|Hit_len|Hsp_bit-score|Hsp_evalue|Hsp_identity|Hsp_align-len)>([^<]*)</\1>|(</Hit>)")
+
+_Instance = TypeVar("_Instance")
+# (factory, path) -> the one object made for it, see shared_instance
+_shared_instances: Dict[Tuple[Callable[[str], Any], str], Any] = {}
+# reentrant, a factory may get other shared objects while it runs
+_shared_instances_lock = threading.RLock()
+
+def shared_instance(factory: Callable[[str], _Instance], path: str) -> _Instance:
+    """gets the object factory(path) made the first time it was asked for, one per factory and path for the session
+
+    Args:
+        factory (Callable[[str], _Instance]): class (or function) making the object from a path
+        path (str): file or directory the object reads
+
+    Returns:
+        _Instance: the shared object
+    """
+    key = (factory, path)
+    with _shared_instances_lock:
+        if key not in _shared_instances:
+            _shared_instances[key] = factory(path)
+        return _shared_instances[key]
+
+class CachedFile:
+    """a file kept in memory, read again once its stamp on disk changes
+
+    Subclasses read the file in _read(), called holding _lock, swapping in what they read whole so
+    lookups on other threads never see half of a reread. The stamp is the file's inode, size and mtime,
+    so a file replaced or written over within the same mtime tick is still read again.
+    """
+
+    missing_ok = False
+    """a missing file is read as empty (_read gets a None stamp) instead of raising FileNotFoundError"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.version = 0
+        """counts rereads, so caches built from the file know to update"""
+        self._stamp: Any = None
+        # lookups and the -watch poller reload from different threads
+        self._lock = threading.Lock()
+
+    def _file_stamp(self) -> Any:
+        """(inode, size, mtime) of the file, None if it's missing and missing_ok"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self.missing_ok:
+                return None
+            raise
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _read(self, stamp: Any) -> Set[str]:
+        """reads the file, called holding _lock
+
+        Args:
+            stamp (Any): the file's stamp, from _file_stamp()
+
+        Returns:
+            Set[str]: ids whose entry was added, changed or removed
+        """
+        raise NotImplementedError
+
+    def _reload_if_needed(self) -> Set[str]:
+        """rereads the file if its stamp changed since the last read
+
+        Returns:
+            Set[str]: ids whose entry was added, changed or removed by the reread
+        """
+        if self._file_stamp() == self._stamp:
+            return set()
+        with self._lock:
+            # stamped again, another thread may have reloaded while this one waited
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return set()
+            changed = self._read(stamp)
+            self._stamp = stamp
+            self.version += 1
+            return changed
+
+class AlignmentIndex(CachedFile):
+    """byte offsets of every sequence in an aligned fasta, with the file mapped into memory
+
+    The file is scanned once (and again when it is replaced or changes) for record starts, any sequence
+    or column window is then sliced straight out of the mapping. The pipeline replaces the file rather
+    than writing over it, a mapped file cut short by another process would crash the viewer. Per column
+    residue counts, used for conservation, are only worked out the first time they are asked for.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.records: Dict[str, Tuple[int, int, bool]] = {}
+        """id -> (first sequence byte, end of sequence, sequence is on a single line)"""
+        self.length = 0
+        self._data: Any = b""
+        self._profile: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _read(self, stamp: Any) -> Set[str]:
+        """maps and scans the fasta for record starts, returns the ids added or removed (a changed sequence isn't told apart)"""
+        with open(self.path, "rb") as file_handle:
+            if os.fstat(file_handle.fileno()).st_size == 0:
+                data: Any = b""
+            else:
+                data = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        records: Dict[str, Tuple[int, int, bool]] = {}
+        length = 0
+        start = 0 if data[:1] == b">" else data.find(b"\n>")
+        if start > 0:
+            start += 1
+        while start >= 0:
+            header_end = data.find(b"\n", start)
+            if header_end < 0:
+                break
+            next_start = data.find(b"\n>", header_end)
+            end = len(data) if next_start < 0 else next_start
+            seq_start = header_end + 1
+            # trailing newlines and windows line ends aren't part of the sequence
+            while end > seq_start and data[end - 1:end] in (b"\n", b"\r"):
+                end -= 1
+            single_line = data.find(b"\n", seq_start, end) < 0
+            if single_line:
+                seq_length = end - seq_start
+            else:
+                seq = data[seq_start:end]
+                seq_length = len(seq) - seq.count(b"\n") - seq.count(b"\r")
+            header = data[start + 1:header_end].decode().split()
+            if header:
+                # later records win, same as SeqStatsStore
+                records[header[0]] = (seq_start, end, single_line)
+            length = max(length, seq_length)
+            start = next_start + 1 if next_start >= 0 else -1
+        changed = records.keys() ^ self.records.keys()
+        self._data, self.records, self.length = data, records, length
+        self._profile = None
+        return changed
+
+    def __contains__(self, id: str) -> bool:
+        self._reload_if_needed()
+        return id in self.records
+
+    def __len__(self) -> int:
+        self._reload_if_needed()
+        return len(self.records)
+
+    def _sequence(self, record: Tuple[int, int, bool], start: int, end: int) -> bytes:
+        """slices columns out of one record, padded with gaps up to the alignment length"""
+        seq_start, seq_end, single_line = record
+        if single_line:
+            seq = self._data[min(seq_start + start, seq_end):min(seq_start + end, seq_end)]
+        else:
+            # wrapped sequences are only joined up one record at a time
+            seq = self._data[seq_start:seq_end].replace(b"\n", b"").replace(b"\r", b"")[start:end]
+        return seq.ljust(max(0, min(end, self.length) - start), b"-")
+
+    def sequence(self, id: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        """gets the aligned sequence of a tip, or a window of its columns
+
+        Args:
+            id (str): sequence id (tip name)
+            start (int, optional): first column, 0 based. Defaults to 0.
+            end (Optional[int], optional): column after the last one. Defaults to the alignment length.
+
+        Returns:
+            Optional[bytes]: aligned sequence, None if id is not in the alignment
+        """
+        self._reload_if_needed()
+        record = self.records.get(id)
+        if record is None:
+            return None
+        end = self.length if end is None else end
+        return self._sequence(record, max(0, start), max(start, end))
+
+    def window(self, start: int, end: int, ids: Optional[Iterable[str]] = None) -> np.ndarray:
+        """gets a block of columns for many sequences as one byte array
+
+        Args:
+            start (int): first column, 0 based
+            end (int): column after the last one
+            ids (Optional[Iterable[str]], optional): sequences to get, in order. Defaults to every sequence in file order.
+
+        Returns:
+            np.ndarray: uint8 array of sequences x columns
+        """
+        self._reload_if_needed()
+        ids = list(self.records) if ids is None else list(ids)
+        start, end = max(0, start), max(start, min(end, self.length))
+        block = np.full((len(ids), end - start), ord("-"), dtype=np.uint8)
+        for row, id in enumerate(ids):
+            record = self.records.get(id)
+            if record is not None:
+                block[row] = np.frombuffer(self._sequence(record, start, end), dtype=np.uint8)
+        return block
+
+    def profile(self) -> Tuple[np.ndarray, np.ndarray]:
+        """counts every residue in every column, worked out once per version of the file
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: counts (columns x len(ALIGNMENT_ALPHABET)) and residues (non gaps) per column
+        """
+        self._reload_if_needed()
+        profile = self._profile
+        if profile is not None:
+            return profile
+        with self._lock:
+            if self._profile is not None:
+                return self._profile
+            size = len(ALIGNMENT_ALPHABET) + 1
+            # each cell of a block is binned as column * size + code, so one bincount counts a whole block
+            column_bins = (np.arange(self.length, dtype=np.int64) * size)[None, :]
+            counts = np.zeros(self.length * size, dtype=np.int64)
+            ids = list(self.records)
+            for first in range(0, len(ids), ALIGNMENT_BLOCK_ROWS):
+                codes = _ALIGNMENT_CODES[self.window(0, self.length, ids[first:first + ALIGNMENT_BLOCK_ROWS])]
+                counts += np.bincount((codes + column_bins).ravel(), minlength=counts.size)
+            counts = counts.reshape(self.length, size)[:, :-1].astype(np.uint32)
+            self._profile = (counts, counts.sum(axis=1))
+            return self._profile
+
+    def conservation(self, id: str) -> Optional[np.ndarray]:
+        """share of the other sequences with a residue in a column that have the same residue as a tip
+
+        Args:
+            id (str): sequence id (tip name)
+
+        Returns:
+            Optional[np.ndarray]: float per column, nan where the tip has a gap or no other sequence has a residue,
+                None if id is not in the alignment
+        """
+        seq = self.sequence(id)
+        if seq is None:
+            return None
+        counts, residues = self.profile()
+        codes = _ALIGNMENT_CODES[np.frombuffer(seq, dtype=np.uint8)]
+        has_residue = codes < len(ALIGNMENT_ALPHABET)
+        # the tip itself is in the counts, leave it out
+        same = counts[np.arange(self.length), np.minimum(codes, len(ALIGNMENT_ALPHABET) - 1)].astype(np.float64) - 1
+        others = residues.astype(np.float64) - 1
+        conserved = np.full(self.length, np.nan)
+        usable = has_residue & (others > 0)
+        conserved[usable] = same[usable] / others[usable]
+        return conserved
+
+def alignment_index(path: Optional[str] = None) -> AlignmentIndex:
+    """gets the offset index of an aligned fasta, built once per session
+
+    Args:
+        path (Optional[str], optional): location of aligned fasta. Defaults to ./alignment/alignment_NT_NoFS.fasta.
+
+    Returns:
+        AlignmentIndex: index of the alignment
+    """
+    return shared_instance(AlignmentIndex, path or f"{os.getcwd()}/alignment/alignment_NT_NoFS.fasta")
+
+# per sequence stats columns, macse's exportAlignment ones except the last: its internal_DEL isn't counted the same way
+# (on example_files it's 4-19 codons over ours), so ours goes by another name
+SEQ_STATS_HEADERS = ["seq_name", "internal_FS", "internal_STOP", "internal_gap_codons"]
+# per site stats columns
+SITE_STATS_HEADERS = ["site", "A", "C", "G", "T", "gap"]
+# stop codons of the standard genetic code, each codon packed as first base << 16 | second << 8 | third
+_STOP_CODONS = np.array([first << 16 | second << 8 | third for first, second, third in (b"TAA", b"TAG", b"TGA")], dtype=np.int32)
+_GAP_CODON = ord("-") << 16 | ord("-") << 8 | ord("-")
+
+def sequence_stats(index: AlignmentIndex, ids: Optional[Iterable[str]] = None) -> Dict[str, Tuple[int, int, int]]:
+    """counts frameshifts, stop codons and all gap codons inside each sequence of a codon alignment
+
+    Codons are read in the alignment's frame, between a sequence's first and last codon that isn't all gaps.
+    A codon with a '!' in it is a frameshift, a stop codon before the last codon is an internal stop, and a
+    codon of three gaps is a gap codon. Sequences are done a block of rows at a time, all codons of a block at once.
+    The gap codons aren't macse's internal_DEL, macse counts a few more per sequence, hence internal_gap_codons.
+
+    Args:
+        index (AlignmentIndex): the alignment, with frameshifts still marked (macse's alignment_NT_withFS.fasta)
+        ids (Optional[Iterable[str]], optional): sequences to count. Defaults to every sequence.
+
+    Returns:
+        Dict[str, Tuple[int, int, int]]: id -> (internal_FS, internal_STOP, internal_gap_codons), for ids in the alignment
+    """
+    index._reload_if_needed()
+    ids = list(index.records) if ids is None else [id for id in dict.fromkeys(ids) if id in index.records]
+    # padded out to whole codons
+    length = -(-index.length // 3) * 3
+    stats = {}
+    for first in range(0, len(ids), ALIGNMENT_BLOCK_ROWS):
+        chunk = ids[first:first + ALIGNMENT_BLOCK_ROWS]
+        block = np.full((len(chunk), length), ord("-"), dtype=np.uint8)
+        block[:, :index.length] = index.window(0, index.length, chunk)
+        if (block >= ord("a")).any():
+            block = np.where((block >= ord("a")) & (block <= ord("z")), block - 32, block)
+        codons = block.reshape(len(chunk), -1, 3)
+        packed = codons[..., 0].astype(np.int32) << 16 | codons[..., 1].astype(np.int32) << 8 | codons[..., 2]
+        gap = packed == _GAP_CODON
+        frameshift = (codons == ord("!")).any(axis=2)
+        stop = (packed == _STOP_CODONS[0]) | (packed == _STOP_CODONS[1]) | (packed == _STOP_CODONS[2])
+
+        filled = ~gap
+        start = filled.argmax(axis=1)
+        end = filled.shape[1] - 1 - filled[:, ::-1].argmax(axis=1)
+        columns = np.arange(filled.shape[1])[None, :]
+        inside = (columns >= start[:, None]) & (columns <= end[:, None]) & filled.any(axis=1)[:, None]
+        frameshifts = np.count_nonzero(frameshift & inside, axis=1)
+        stops = np.count_nonzero(stop & inside & (columns < end[:, None]), axis=1)
+        deletions = np.count_nonzero(gap & inside, axis=1)
+        for row, id in enumerate(chunk):
+            stats[id] = (int(frameshifts[row]), int(stops[row]), int(deletions[row]))
+    return stats
+
+def site_stats(index: AlignmentIndex) -> np.ndarray:
+    """counts the bases and gaps in every column of an alignment
+
+    Args:
+        index (AlignmentIndex): the alignment
+
+    Returns:
+        np.ndarray: columns x (A, C, G, T, gap) counts, gap counts anything that isn't a residue
+    """
+    counts, residues = index.profile()
+    bases = counts[:, [ALIGNMENT_ALPHABET.index(base) for base in b"ACGT"]]
+    return np.column_stack([bases, len(index) - residues]).astype(np.int64)
+
+def write_alignment_stats(alignment: str, out_stat_per_seq: str, out_stat_per_site: Optional[str] = None, ids: Optional[Iterable[str]] = None) -> None:
+    """writes the per sequence (and per site) stats csvs of an alignment, laid out like macse's exportAlignment ones
+
+    Args:
+        alignment (str): location of the alignment, with frameshifts still marked
+        out_stat_per_seq (str): per sequence csv to write
+        out_stat_per_site (Optional[str], optional): per site csv to write. Defaults to None, not written.
+        ids (Optional[Iterable[str]], optional): only recount these sequences, keeping the other rows of an existing
+            out_stat_per_seq. Defaults to None, every sequence is counted.
+    """
+    index = alignment_index(alignment)
+    ids = None if ids is None else list(ids)
+    rows: Dict[str, List[str]] = {}
+    if ids is not None and os.path.exists(out_stat_per_seq):
+        with open(out_stat_per_seq, "r", newline="") as file_handle:
+            reader = csv.reader(file_handle, delimiter=";")
+            # a csv from macse itself counts deletions its own way, everything is counted again
+            if next(reader, None) == SEQ_STATS_HEADERS:
+                rows = {line[0]: line for line in reader if line}
+            else:
+                ids = None
+        # sequences no longer in the alignment lose their row
+        for id in ids or ():
+            if id not in index:
+                rows.pop(id, None)
+    for id, counts in sequence_stats(index, ids).items():
+        rows[id] = [id, *map(str, counts)]
+
+    with open(out_stat_per_seq + ".tmp", "w", newline="") as file_handle:
+        writer = csv.writer(file_handle, delimiter=";", lineterminator="\n")
+        writer.writerow(SEQ_STATS_HEADERS)
+        writer.writerows(rows.values())
+    os.replace(out_stat_per_seq + ".tmp", out_stat_per_seq)
+
+    if out_stat_per_site is not None:
+        with open(out_stat_per_site + ".tmp", "w", newline="") as file_handle:
+            writer = csv.writer(file_handle, delimiter=";", lineterminator="\n")
+            writer.writerow(SITE_STATS_HEADERS)
+            for site, counts in enumerate(site_stats(index).tolist(), 1):
+                writer.writerow([site, *counts])
+        os.replace(out_stat_per_site + ".tmp", out_stat_per_site)
+
+def blast_hit_id(raw_id: str, raw_desc: str) -> str:
+    """recreates the hit id SearchIO gives a blast-xml hit from its raw Hit_id/ Hit_def text
+
+    Args:
+        raw_id (str): text of the Hit_id element
+        raw_desc (str): text of the Hit_def element
+
+    Returns:
+        str: hit id as reported by SearchIO
+    """
+    # blast generated ids hide the real id at the start of the definition line
+    line = raw_desc if raw_id.startswith("gnl|BL_ORD_ID|") else raw_id
+    parts = line.split(None, 1)
+    return parts[0] if parts else line
+
+def blast_xml_matches(handle: BinaryIO, pattern: re.Pattern) -> Iterator[re.Match]:
+    """finds every match of a pattern in blast xml, reading BLAST_READ_CHUNK bytes at a time
+
+    Chunks are only searched up to their last line end, blast writes every element the pipeline
+    looks for on a line of its own, so memory stays at a chunk however big the output is.
+
+    Args:
+        handle (BinaryIO): open blast xml (decompressed)
+        pattern (re.Pattern): bytes pattern matching within a line
+
+    Yields:
+        re.Match: matches, in file order
+    """
+    rest = b""
+    while True:
+        chunk = handle.read(BLAST_READ_CHUNK)
+        if not chunk:
+            break
+        data = rest + chunk
+        cut = data.rfind(b"\n") + 1
+        yield from pattern.finditer(data, 0, cut)
+        rest = data[cut:]
+    yield from pattern.finditer(rest)
+
+def open_blastout(path: str) -> BinaryIO:
+    """opens a blast output for reading, decompressing it if it was gzipped
+
+    Args:
+        path (str): location of blast output
+
+    Returns:
+        BinaryIO: binary file handle
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def used_blast_outputs(names: Iterable[str]) -> Dict[str, str]:
+    """picks the blast output read for each database out of a blastout listing, xml over tabular
+
+    Args:
+        names (Iterable[str]): file names in blastout/
+
+    Returns:
+        Dict[str, str]: database (its fasta's name without the extension) -> name of its xml output,
+            or of its tabular output if it has no xml output
+    """
+    used: Dict[str, str] = {}
+    for name in sorted(names):
+        for end in BLASTOUT_ENDS + (BLAST_TAB_END,):
+            if name.endswith(end):
+                database = name[:-len(end)]
+                if database not in used or used[database].endswith(BLAST_TAB_END):
+                    used[database] = name
+                break
+    return used
+
+def _add_summary(best: Dict[Tuple[str, str], list], hit_id: str, name: str, query: str, hit_len: Optional[int], bitscore: float, evalue: float, identity: int, align_len: int) -> None:
+    """counts an hsp into its hit's row of best, keeping the numbers of the best scoring hsp"""
+    row = best.get((hit_id, query))
+    if row is None:
+        best[(hit_id, query)] = [hit_id, name, query, hit_len, 1, bitscore, evalue, identity, align_len]
+        return
+    row[4] += 1
+    if bitscore > row[5]:
+        row[5:] = [bitscore, evalue, identity, align_len]
+
+def blast_xml_summary_rows(name: str, matches: Iterable[re.Match]) -> List[Tuple]:
+    """gets the best hsp numbers of every hit in blast xml, from BLAST_SUMMARY_RE matches
+
+    Args:
+        name (str): blast output the xml is from
+        matches (Iterable[re.Match]): BLAST_SUMMARY_RE matches, in file order, of a whole output
+            or just a hit with the start of its <Iteration>
+
+    Returns:
+        List[Tuple]: (hit id, *SUMMARY_HIT_COLUMNS) per hit and query, numbers taken from the hit's best scoring hsp
+    """
+    best: Dict[Tuple[str, str], list] = {}
+    values: Dict[bytes, str] = {}
+    query = ""
+    for match in matches:
+        tag, text, hit_close = match.groups()
+        if hit_close is not None:
+            values = {}
+            continue
+        text = unescape(text.decode())
+        if tag == b"Iteration_query-def":
+            query = text
+        elif tag == b"Hsp_align-len":
+            # last number in each hsp, so the whole hsp has been read
+            _add_summary(best, blast_hit_id(values.get(b"Hit_id", ""), values.get(b"Hit_def", "")), name, query, int(values[b"Hit_len"]), float(values[b"Hsp_bit-score"]), float(values[b"Hsp_evalue"]), int(values[b"Hsp_identity"]), int(text))
+        else:
+            values[tag] = text
+    return [tuple(row) for row in best.values()]
+
+def blast_summary_rows(path: str) -> List[Tuple]:
+    """gets the best hsp numbers of every hit in a blast output, xml or tabular
+
+    Args:
+        path (str): location of blast output
+
+    Returns:
+        List[Tuple]: (hit id, *SUMMARY_HIT_COLUMNS) per hit and query, numbers taken from the hit's best
+            scoring hsp, hit_len is None for tabular output
+    """
+    name = os.path.basename(path)
+    if not path.endswith(BLAST_TAB_END):
+        with open_blastout(path) as handle:
+            return blast_xml_summary_rows(name, blast_xml_matches(handle, BLAST_SUMMARY_RE))
+
+    best: Dict[Tuple[str, str], list] = {}
+    with open(path, "r") as file_handle:
+        for line in file_handle:
+            if line.startswith("#") or not line.strip():
+                continue
+            fields = dict(zip(BLAST_TAB_COLUMNS, line.rstrip("\n").split("\t")))
+            length = int(fields["length"])
+            _add_summary(best, fields["sseqid"], name, fields["qseqid"], None, float(fields["bitscore"]), float(fields["evalue"]), round(float(fields["pident"]) * length / 100), length)
+    return [tuple(row) for row in best.values()]
@@ -2,19 +2,66 @@
 
 import os
 import argparse
+import contextlib
+import csv
+import hashlib
+import json
+import re
+import sqlite3
+import glob
+import gzip
+import multiprocessing
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from xml.sax.saxutils import unescape
 
-from Bio import SearchIO
-from Bio import SeqIO
+import numpy as np
+from Bio import Phylo
+from prettytable import PrettyTable
 
-from typing import Union, List, Set, Tuple
+import outputs
+from outputs import BLASTOUT_END, BLASTOUT_ENDS, BLAST_TAB_END, BLAST_TAB_COLUMNS, CLUSTER_DIR, CLUSTER_MAP_NAME, SUMMARY_NAME, blast_summary_rows, open_blastout, used_blast_outputs
+
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional, Union, List, Set, Tuple
 
 
 # valid fasta endings
 FASTA_ENDS = (".fasta",".fa",".fas")
 # valid sequence types
 FASTA_TYPES = ('nucl','prot') 
+# valid tabular output modes
+TABULAR_MODES = ("also", "only")
+# pipeline stages, in the order they run
+STAGES = ("makeblastdb", "blast", "extract", "cluster", "macse", "iqtree", "summarize")
+# name of the stage manifest kept in the working directory
+MANIFEST_NAME = "pipeline_manifest.json"
+# json lines log of stage, task and external command timings, appended to every run
+RUN_LOG_NAME = "pipeline_runs.jsonl"
+# representatives aligned instead of every hit, written into CLUSTER_DIR next to the tip -> representative map the viewer reads
+CLUSTER_SEQS_NAME = "alignment_reps.fasta"
+# k-mer length, number of minhashes and lsh bands (of CLUSTER_HASHES // CLUSTER_BANDS hashes) of the cluster sketches
+CLUSTER_KMER = 21
+CLUSTER_HASHES = 128
+CLUSTER_BANDS = 32
+# nucleotide -> 2 bit code, 4 for anything that can't be in a k-mer
+_NUCLEOTIDE_CODES = np.full(256, 4, dtype=np.uint64)
+for _code, _bases in enumerate((b"Aa", b"Cc", b"Gg", b"TtUu")):
+    for _base in _bases:
+        _NUCLEOTIDE_CODES[_base] = _code
+# multipliers (odd) and offsets of the minhash functions, fixed so sketches are the same every run
+_SKETCH_RNG = np.random.default_rng(21)
+_SKETCH_A = _SKETCH_RNG.integers(0, 2 ** 63, CLUSTER_HASHES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_SKETCH_B = _SKETCH_RNG.integers(0, 2 ** 63, CLUSTER_HASHES, dtype=np.uint64)
+# numbers of an iteration in blast xml, renumbered when joining query shards
+_BLAST_ITERATION_NUMBER_RE = re.compile(rb"<(Iteration_iter-num|Iteration_query-ID)>(?:Query_)?(\d+)</\1>")
+# hit id and hsp score elements of blast xml, enough to pick hits without parsing the whole file
+_BLAST_HIT_RE = re.compile(rb"<Hit_id>([^<]*)</Hit_id>|<Hit_def>([^<]*)</Hit_def>|<Hsp_bit-score>([^<]*)</Hsp_bit-score>|<Hsp_evalue>([^<]*)</Hsp_evalue>|(</Hit>)")
 
 def add_to_name(file: str, addition: str) -> str:
     """adds extension to original filename before last "." in name
@@ -45,42 +92,250 @@ def remove_extension(file: str) -> str:
     return outfile
 
 
-def run_make_blast_database(fastas: str, type: str) -> None:
-    """uses makeblastdb to create blast formatted database from fasta file(s) in input directory
+def link_or_copy(src: str, dst: str) -> None:
+    """hardlinks src to dst, copying instead if a hardlink can't be made (eg. different filesystems)
 
     Args:
-        fastas (str): location of fasta file(s)
-        type (str): type of fasta file(s) (nucl/prot)
+        src (str): file to link
+        dst (str): location of new link/ copy
     """
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
 
-    # run makeblastdb for each file in directory
-    for entry in os.scandir(fastas):
-        if entry.is_file() and entry.name.endswith(FASTA_ENDS):
-                makeblastdb_cmd = f"makeblastdb -in {entry.path} -parse_seqids -dbtype {type}".split(" ")
-                subprocess.run(makeblastdb_cmd)
+class RunLog:
+    """timings of the stages, tasks and external commands of a pipeline run
 
-    # make a directory to put output
-    bdb = f"{os.getcwd()}/blastdb"
-    os.makedirs(bdb, exist_ok=True)
+    Records are kept in memory for summary() and, if a path is given, appended to a json lines file
+    as they come in, so a run that crashes still leaves its timings behind.
 
-    # files to blastdb: copy if fasta, move if blastdb files
-    for entry in os.scandir(fastas):
-        if entry.is_file():
-            if not entry.name.endswith(FASTA_ENDS):
-                os.rename(entry.path, f"{bdb}/{entry.name}")
-                continue
-            copy_fastas_cmd = f"cp ./{entry.path} {bdb}/".split(" ")
-            subprocess.run(copy_fastas_cmd)
+    Args:
+        path (Optional[str], optional): json lines file to append to, None to only keep records in memory. Defaults to RUN_LOG_NAME.
+    """
+    def __init__(self, path: Optional[str] = RUN_LOG_NAME):
+        self.path = path
+        self.run = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.started = time.perf_counter()
+        self.records: List[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: dict) -> None:
+        """keeps a record, appending it to the log file tagged with the run it's from"""
+        with self._lock:
+            self.records.append(record)
+            if self.path is not None:
+                with open(self.path, "a") as log:
+                    log.write(json.dumps({"run": self.run, **record}) + "\n")
+
+    def commands(self, task: str) -> List[dict]:
+        """records of the external commands a task ran"""
+        return [record for record in self.records if record["type"] == "command" and record["task"] == task]
+
+    def summary(self) -> str:
+        """table of every task and stage of the run, with wall time, cpu time, cpu use (cpu/ wall, how many
+        cpus were kept busy) and the peak memory of the biggest command
+
+        Returns:
+            str: the table
+        """
+        table = PrettyTable(["stage", "task", "status", "wall s", "cpu s", "cpu use", "peak rss MB"])
+        table.align = "r"
+        table.align["stage"] = table.align["task"] = table.align["status"] = "l"
+        stages = [record for record in self.records if record["type"] == "stage"]
+        for stage in sorted(stages, key=lambda record: STAGES.index(record["stage"])):
+            for record in self.records:
+                if record["type"] == "task" and record["stage"] == stage["stage"]:
+                    table.add_row(self._row(record["stage"], record["task"], record))
+            table.add_row(self._row(stage["stage"], "(stage)", stage), divider=True)
+        return f"{table}\ntotal wall time {time.perf_counter() - self.started:.1f}s, run log in {self.path}"
+
+    @staticmethod
+    def _row(stage: str, task: str, record: dict) -> List[str]:
+        wall, cpu = record.get("wall_s"), record.get("cpu_s")
+        if wall is None:
+            return [stage, task, record["status"], "", "", "", ""]
+        use = f"{cpu / wall:.1f}x" if wall > 0 else ""
+        rss = record.get("max_rss_mb")
+        return [stage, task, record["status"], f"{wall:.2f}", f"{cpu:.2f}", use, "" if rss is None else f"{rss:.0f}"]
 
-def run_blast(query: str, qtype: str, ftype: str, threads: int, maxseqs: int) -> None:
-    """performs blast using run_make_blast_database output and querry input
+# log that commands, tasks and stages are recorded to, None when nothing is being recorded
+_run_log: Optional[RunLog] = None
+# task and stage the current thread is working on, to tag command records with
+_context = threading.local()
+
+def set_run_log(log: Optional[RunLog]) -> None:
+    """starts (or with None stops) recording timings
 
     Args:
-        query (str): fasta sequence to use as a blast querry
-        qtype (str): type of querry sequence (nucl/ prot), used to decide which blast to use
-        ftype (str): type of fasta sequences in blast database, used to decide which blast to use
-        threads (int): threads the blast subprocess is allowed to use
-        maxseqs (int): max target sequences in each blast
+        log (Optional[RunLog]): log to record to
+    """
+    global _run_log
+    _run_log = log
+
+def log_record(record: dict) -> None:
+    """adds a record to the run log, if one is being kept, tagged with the task the calling thread is running
+
+    Args:
+        record (dict): record, its own "task"/ "stage" keys win over the thread's
+    """
+    if _run_log is not None:
+        _run_log.add({"task": getattr(_context, "task", None), "stage": getattr(_context, "stage", None), **record})
+
+def wait_logged(proc: subprocess.Popen, started: float) -> int:
+    """waits for a command with wait4, which gives the child's own cpu time and peak memory, and logs it
+
+    Any pipes of the command have to be read to the end first.
+
+    Args:
+        proc (subprocess.Popen): running command
+        started (float): time.perf_counter() from just before it was started
+
+    Returns:
+        int: exit code (negative signal number if it was killed, like subprocess)
+    """
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    cmd = [str(arg) for arg in proc.args]
+    log_record({
+        "type": "command",
+        "program": os.path.basename(cmd[0]),
+        "cmd": " ".join(cmd),
+        "wall_s": time.perf_counter() - started,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        # linux reports ru_maxrss in kB
+        "max_rss_mb": usage.ru_maxrss / 1024,
+        "exit": proc.returncode,
+    })
+    return proc.returncode
+
+def run_logged(cmd: List[str], **kwargs) -> int:
+    """subprocess.run() that logs the command's timings, for commands without pipes
+
+    Args:
+        cmd (List[str]): command to run
+        **kwargs: passed on to subprocess.Popen
+
+    Returns:
+        int: exit code
+    """
+    started = time.perf_counter()
+    with subprocess.Popen(cmd, **kwargs) as proc:
+        return wait_logged(proc, started)
+
+def blast_database_current(fasta: str, db: str, type: str) -> bool:
+    """checks if the blast database made from a fasta is newer than the fasta
+
+    Args:
+        fasta (str): source fasta file
+        db (str): blast database name (path of the fasta inside blastdb)
+        type (str): type of fasta file (nucl/prot)
+
+    Returns:
+        bool: if every database file exists and is newer than the fasta
+    """
+    letter = type[0]
+    db_files = glob.glob(f"{glob.escape(db)}.{letter}*")
+    # index (or alias file for large databases split into volumes) must exist
+    if not any(name.endswith((f".{letter}in", f".{letter}al")) for name in db_files):
+        return False
+    fasta_mtime = os.stat(fasta).st_mtime
+    return all(os.stat(name).st_mtime >= fasta_mtime for name in db_files)
+
+def make_blast_database(db: str, type: str) -> Tuple[int, str]:
+    """runs makeblastdb for a single fasta
+
+    Args:
+        db (str): fasta to make into a blast database, database files are written next to it
+        type (str): type of fasta file (nucl/prot)
+
+    Returns:
+        Tuple[int, str]: exit code of makeblastdb and its stderr output
+    """
+    makeblastdb_cmd = f"makeblastdb -in {db} -parse_seqids -dbtype {type}".split(" ")
+    started = time.perf_counter()
+    with subprocess.Popen(makeblastdb_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as proc:
+        stderr = proc.stderr.read()
+        returncode = wait_logged(proc, started)
+    return returncode, stderr.decode(errors="replace")
+
+def stream_to_file(cmd: List[str], outfile: str) -> Tuple[int, str]:
+    """runs a command, streaming its stdout to disk
+
+    Output goes to a temp file next to outfile that is only renamed into place if the
+    command succeeds, so a crash never leaves a partial result behind.
+
+    Args:
+        cmd (List[str]): command to run
+        outfile (str): file to write stdout to, gzip compressed if it ends with ".gz"
+
+    Returns:
+        Tuple[int, str]: exit code of the command and its stderr output
+    """
+    tmp = outfile + ".tmp"
+    with open(tmp, "wb") as file, tempfile.TemporaryFile() as err:
+        if outfile.endswith(".gz"):
+            started = time.perf_counter()
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err) as proc:
+                with gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6) as compressed:
+                    shutil.copyfileobj(proc.stdout, compressed)
+                returncode = wait_logged(proc, started)
+        else:
+            returncode = run_logged(cmd, stdout=file, stderr=err)
+        err.seek(0)
+        stderr = err.read().decode(errors="replace")
+
+    if returncode != 0:
+        # don't leave an empty or stale result behind for a failed database
+        os.remove(tmp)
+        if os.path.exists(outfile):
+            os.remove(outfile)
+    else:
+        os.replace(tmp, outfile)
+    return returncode, stderr
+
+def blast_database(blast_cmd: List[str], outputs: List[Tuple[List[str], str]]) -> Tuple[int, str]:
+    """runs a single blast job and writes each requested output format to its own file
+
+    A single format is streamed straight from blast. For more than one format the search is run
+    once into a blast archive (-outfmt 11), which blast_formatter then turns into each format.
+
+    Args:
+        blast_cmd (List[str]): blast command to run, without -outfmt
+        outputs (List[Tuple[List[str], str]]): (-outfmt arguments, file to write to) for every format wanted
+
+    Returns:
+        Tuple[int, str]: exit code of the first failing step (0 if all succeeded) and its stderr output
+    """
+    if len(outputs) == 1:
+        outfmt, outfile = outputs[0]
+        return stream_to_file(blast_cmd + outfmt, outfile)
+
+    archive = outputs[0][1] + ".asn"
+    returncode, stderr = stream_to_file(blast_cmd + ["-outfmt", "11"], archive)
+    try:
+        for outfmt, outfile in outputs:
+            if returncode != 0:
+                break
+            returncode, stderr = stream_to_file(["blast_formatter", "-archive", archive] + outfmt, outfile)
+    finally:
+        if os.path.exists(archive):
+            os.remove(archive)
+    return returncode, stderr
+
+def blast_program(qtype: str, ftype: str) -> str:
+    """decides which blast to use (blastn, blastp, blastx, tblastn)
+
+    Args:
+        qtype (str): type of querry sequence (nucl/ prot)
+        ftype (str): type of fasta sequences in blast database (nucl/ prot)
+
+    Returns:
+        str: name of the blast program
     """
 
     # determine blast type to use (blastn, blastp, blastx, tblastn)
@@ -107,113 +362,1153 @@ def run_blast(query: str, qtype: str, ftype: str, threads: int, maxseqs: int) ->
     elif types == ("prot", "prot"):
         blast_type += "blastp"
 
-    # for every fasta file within the blast database
-    bdb = f"{os.getcwd()}/blastdb"
-    for entry in os.scandir(bdb):
-        if entry.is_file() and entry.name.endswith(FASTA_ENDS):
-            print(f"blasting {entry.name}")
-
-            # run and save blast output (XML format) to new file ending with "_blastout"
-            blast_cmd = blast_type + f" -query {query} -db {entry.path} -outfmt 5 -max_target_seqs {maxseqs} -evalue 0.00001 -num_threads {threads}"
-            result = subprocess.run(blast_cmd.split(" "), stdout=subprocess.PIPE)
-            new_outfile = remove_extension(entry.name) + "_blastout"
-            with open(new_outfile, 'w') as file:
-                file.write(result.stdout.decode("ascii"))
-    
-    # make a directory to put output
+    return blast_type
+
+def split_query(query: str, shards: int, out_dir: Optional[str] = None) -> List[str]:
+    """splits a query fasta into consecutive shards holding about the same number of residues each
+
+    Records keep their order, so joining the blast output of the shards in order gives the same
+    order as blasting the whole query at once. Remove the shards with remove_query_shards() once
+    the blasts are merged.
+
+    Args:
+        query (str): query fasta
+        shards (int): number of shards wanted
+        out_dir (Optional[str], optional): directory to write the shards to. Defaults to None (a new temporary directory).
+
+    Returns:
+        List[str]: shard fastas, fewer than asked for if some would be empty, just the query if it isn't split
+    """
+    records: List[List[bytes]] = []
+    with open(query, "rb") as fasta:
+        for line in fasta:
+            if line.startswith(b">"):
+                records.append([line])
+            elif records:
+                records[-1].append(line)
+    if shards <= 1 or len(records) <= 1:
+        return [query]
+
+    # each record goes to the shard its middle residue falls in
+    sizes = [max(1, sum(len(line.strip()) for line in record[1:])) for record in records]
+    total = sum(sizes)
+    groups: List[List[List[bytes]]] = [[] for _ in range(shards)]
+    done = 0
+    for record, size in zip(records, sizes):
+        groups[min(shards - 1, int((done + size / 2) * shards / total))].append(record)
+        done += size
+
+    if out_dir is None:
+        out_dir = tempfile.mkdtemp(prefix="query_shards_")
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(f"{glob.escape(out_dir)}/shard_*.fasta"):
+        os.remove(old)
+    paths = []
+    for group in groups:
+        if not group:
+            continue
+        path = f"{out_dir}/shard_{len(paths)}.fasta"
+        with open(path, "wb") as shard:
+            for record in group:
+                for line in record:
+                    shard.write(line if line.endswith(b"\n") else line + b"\n")
+        paths.append(path)
+    return paths
+
+def remove_query_shards(query: str, queries: List[str]) -> None:
+    """removes the shards split_query() wrote, and their directory if nothing else is left in it
+
+    Args:
+        query (str): query fasta that was split
+        queries (List[str]): split_query() output
+    """
+    shards = [path for path in queries if path != query]
+    for path in shards:
+        if os.path.isfile(path):
+            os.remove(path)
+    if shards:
+        try:
+            os.rmdir(os.path.dirname(shards[0]))
+        except OSError:
+            pass
+
+def blast_shard_file(outfile: str, shard: int) -> str:
+    """name of the output of one query shard, shards are never compressed
+
+    Args:
+        outfile (str): blast output the shard is part of
+        shard (int): shard number
+
+    Returns:
+        str: shard output file
+    """
+    if outfile.endswith(".gz"):
+        outfile = outfile[:-len(".gz")]
+    return f"{outfile}.shard{shard}"
+
+def merge_blast_xml(parts: List[str], outfile: str) -> None:
+    """joins the xml output of consecutive query shards into one blast output, as if the query was blasted whole
+
+    The header and footer come from the first shard, the iterations of every shard follow each other
+    and are renumbered to keep counting up.
+
+    Args:
+        parts (List[str]): xml output of each shard, in shard order
+        outfile (str): merged output, gzip compressed if it ends with ".gz"
+    """
+    tmp = outfile + ".tmp"
+    offset = 0
+    tail = b""
+    with open(tmp, "wb") as file, (gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6) if outfile.endswith(".gz") else contextlib.nullcontext(file)) as out:
+        for i, part in enumerate(parts):
+            with open(part, "rb") as handle:
+                data = handle.read()
+            end = data.rfind(b"</BlastOutput_iterations>")
+            if end < 0:
+                raise ValueError(f"{part} is not complete blast xml")
+            start = data.find(b"<Iteration>")
+            start = end if start < 0 else start
+            if i == 0:
+                out.write(data[:start])
+                tail = data[end:]
+
+            def renumber(match: re.Match) -> bytes:
+                tag, number = match.group(1), int(match.group(2))
+                prefix = b"Query_" if tag == b"Iteration_query-ID" else b""
+                return b"<%s>%s%d</%s>" % (tag, prefix, number + offset, tag)
+
+            out.write(_BLAST_ITERATION_NUMBER_RE.sub(renumber, data[start:end]))
+            offset += data.count(b"<Iteration>", start, end)
+        out.write(tail)
+    os.replace(tmp, outfile)
+
+def finish_blast_shards(outputs: List[Tuple[List[str], str]], shards: int, ok: bool = True) -> None:
+    """merges the outputs of every query shard of a database, then removes the shard outputs
+
+    Args:
+        outputs (List[Tuple[List[str], str]]): outputs of the whole query, from blast_job()
+        shards (int): number of shards
+        ok (bool, optional): if every shard finished, if not nothing is merged and the outputs of
+            an earlier run are removed too, like a failed unsharded blast. Defaults to True.
+    """
+    try:
+        for _, outfile in outputs:
+            parts = [blast_shard_file(outfile, shard) for shard in range(shards)]
+            if not ok:
+                if os.path.exists(outfile):
+                    os.remove(outfile)
+            elif outfile.endswith(BLAST_TAB_END):
+                # tabular rows have no numbering, shards just follow each other
+                tmp = outfile + ".tmp"
+                with open(tmp, "wb") as out:
+                    for part in parts:
+                        with open(part, "rb") as handle:
+                            shutil.copyfileobj(handle, out)
+                os.replace(tmp, outfile)
+            else:
+                merge_blast_xml(parts, outfile)
+    finally:
+        for _, outfile in outputs:
+            for shard in range(shards):
+                if os.path.exists(blast_shard_file(outfile, shard)):
+                    os.remove(blast_shard_file(outfile, shard))
+
+def blast_job(query: str, blast_type: str, db: str, maxseqs: int, threads: int, compress: bool = False, tabular: Optional[str] = None, shard: Optional[int] = None) -> Tuple[List[str], List[Tuple[List[str], str]]]:
+    """builds the blast command and output files for one database, removing output left in other formats by an earlier run
+
+    Args:
+        query (str): fasta sequence to use as a blast querry
+        blast_type (str): blast program, from blast_program()
+        db (str): blast database (path of the fasta inside blastdb)
+        maxseqs (int): max target sequences
+        threads (int): threads blast is allowed to use
+        compress (bool, optional): gzip the xml output. Defaults to False.
+        tabular (Optional[str], optional): "also" to write tabular output (ends with "_blastout.tsv")
+            next to the XML, "only" to write just the tabular output. Defaults to None (XML only).
+        shard (Optional[int], optional): number of the query shard being blasted, its outputs go to
+            blast_shard_file()s for finish_blast_shards() to merge. Defaults to None (whole query).
+
+    Returns:
+        Tuple[List[str], List[Tuple[List[str], str]]]: blast command and outputs, to pass to blast_database()
+    """
     blastout = f"{os.getcwd()}/blastout"
     os.makedirs(blastout, exist_ok=True)
 
-    # move file to blastout directory
-    for entry in os.scandir(os.getcwd()):
-        if entry.is_file() and entry.name.endswith("_blastout"):
-            os.rename(entry.path, f"{blastout}/{entry.name}")
+    # run and save blast output (XML format) to new file ending with "_blastout"
+    blast_cmd = blast_type + f" -query {query} -db {db} -max_target_seqs {maxseqs} -evalue 0.00001 -num_threads {threads}"
+    new_outfile = f"{blastout}/{remove_extension(os.path.basename(db))}"
+
+    outputs = []
+    if tabular != "only":
+        outputs.append((["-outfmt", "5"], new_outfile + (BLASTOUT_ENDS[1] if compress else BLASTOUT_END)))
+    if tabular is not None:
+        outputs.append((["-outfmt", "6 " + " ".join(BLAST_TAB_COLUMNS)], new_outfile + BLAST_TAB_END))
+    if shard is not None:
+        return blast_cmd.split(" "), [(outfmt, blast_shard_file(outfile, shard)) for outfmt, outfile in outputs]
+
+    # drop output left in other formats by an earlier run so the database isn't read twice
+    for end in BLASTOUT_ENDS + (BLAST_TAB_END,):
+        if new_outfile + end not in [outfile for _, outfile in outputs] and os.path.exists(new_outfile + end):
+            os.remove(new_outfile + end)
+    return blast_cmd.split(" "), outputs
 
-def find_fastas(ids: Union[List[str], Set[str], Tuple[str]], loc: str) -> None:
-    """takes in a collection of sequence headers, and generates a new fasta file with all sequences associated with the headers
+def fasta_id(header: bytes) -> str:
+    """gets the sequence id from a raw fasta header line, the same id SeqIO gives the record
 
     Args:
-        ids (Union[list[str], set[str], tuple[str]]): collection of sequence headers
-        loc (str): location of fastas
+        header (bytes): header line including the leading ">"
+
+    Returns:
+        str: sequence id
     """
+    parts = header[1:].split(None, 1)
+    return parts[0].decode() if parts else ""
 
-    unused_ids = list(ids)
-    used_ids = []
-    with open("alignment_seqs.fasta", "w") as fasta_out:
-        for entry in os.scandir(loc):
-                if not entry.is_file() or not entry.name.endswith(FASTA_ENDS):
-                            continue
-                for record in SeqIO.parse(entry.path, "fasta"):
+def copy_fasta_records(lines: Iterable[bytes], wanted: Set[str], found: Set[str], fasta_out: BinaryIO) -> None:
+    """copies records with wanted ids straight through to an output fasta, without building SeqRecords
 
-                    if record.id in ids:
-                        SeqIO.write(record, fasta_out, "fasta")
-                        unused_ids.remove(record.id)
-                        used_ids.append(record.id)
-                    elif record.id in used_ids:
-                        print(f"duplicate sequence with header {record.id} ignored")
-    if len(unused_ids) > 0:
-        for item in used_ids:
-            print(f"No sequence found for header {item}")
+    Stops reading as soon as every wanted id has been found.
 
-def create_fasta(loc: str) -> None:
-    """takes the xml outputs of run_blast(), concatinates the sequences into fastas, then concatentates the fastas into one overall fasta for alignment
+    Args:
+        lines (Iterable[bytes]): lines of a fasta file
+        wanted (Set[str]): ids to copy
+        found (Set[str]): ids already copied, updated in place
+        fasta_out (BinaryIO): output fasta
+    """
+    remaining = wanted - found
+    copying = False
+    for line in lines:
+        if line.startswith(b">"):
+            if not remaining:
+                return
+            id = fasta_id(line)
+            copying = id in remaining
+            if copying:
+                remaining.discard(id)
+                found.add(id)
+            elif id in found and id in wanted:
+                print(f"duplicate sequence with header {id} ignored")
+        if copying:
+            fasta_out.write(line if line.endswith(b"\n") else line + b"\n")
+
+def fetch_from_blastdb(ids: Set[str], db: str, found: Set[str], fasta_out: BinaryIO) -> None:
+    """copies sequences out of a blast database made with -parse_seqids using blastdbcmd
 
     Args:
-        loc (str): location of fastas
+        ids (Set[str]): ids to fetch
+        db (str): blast database name
+        found (Set[str]): ids already copied, updated in place
+        fasta_out (BinaryIO): output fasta
     """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as batch:
+        batch.write("\n".join(sorted(ids - found)) + "\n")
+        batch.flush()
+        blastdbcmd_cmd = f"blastdbcmd -db {db} -entry_batch {batch.name}".split(" ")
+        started = time.perf_counter()
+        with subprocess.Popen(blastdbcmd_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as proc:
+            # blastdbcmd marks local ids with "lcl|", strip it so headers match the blast hit ids
+            lines = (b">" + line[5:] if line.startswith(b">lcl|") else line for line in proc.stdout)
+            copy_fasta_records(lines, ids, found, fasta_out)
+            # reading can stop early, don't leave blastdbcmd blocked on a full pipe
+            proc.stdout.close()
+            wait_logged(proc, started)
 
-    # for each blast output xml, get the names of sequences that had hsps (really inefficient probably)
-    seq_ids = set()
-    blastout = f"{os.getcwd()}/blastout"
-    for entry in os.scandir(blastout):
-        if entry.is_file() and entry.name.endswith("_blastout"):
-            for qresult in SearchIO.read(entry.path, "blast-xml"):
-                seq_ids.add(qresult.id)
-    find_fastas(seq_ids, loc)
+def _hsp_passes(evalue: float, bitscore: float, max_evalue: Optional[float], min_bitscore: Optional[float]) -> bool:
+    """checks an hsp against the e-value and bitscore cutoffs, None means no cutoff"""
+    return (max_evalue is None or evalue <= max_evalue) and (min_bitscore is None or bitscore >= min_bitscore)
 
-def run_macse(macse_location: str) -> None:
-    """uses output of create_fasta() to create initial alignment of sequences
+def blast_tab_ids(path: str, max_evalue: Optional[float] = None, min_bitscore: Optional[float] = None) -> Set[str]:
+    """gets the subject ids out of a tabular (-outfmt 6) blast output
 
     Args:
-        macse_location (str): location of macse jar file
+        path (str): location of tabular blast output
+        max_evalue (Optional[float], optional): only keep hits with an hsp at or below this e-value. Defaults to None.
+        min_bitscore (Optional[float], optional): only keep hits with an hsp at or above this bitscore. Defaults to None.
+
+    Returns:
+        Set[str]: subject sequence ids
+    """
+    column = BLAST_TAB_COLUMNS.index("sseqid")
+    evalue_column = BLAST_TAB_COLUMNS.index("evalue")
+    bitscore_column = BLAST_TAB_COLUMNS.index("bitscore")
+    ids = set()
+    with open(path, "r") as file_handle:
+        for line in file_handle:
+            if line.startswith("#") or not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if _hsp_passes(float(fields[evalue_column]), float(fields[bitscore_column]), max_evalue, min_bitscore):
+                ids.add(fields[column])
+    return ids
+
+def blast_xml_ids(path: str, max_evalue: Optional[float] = None, min_bitscore: Optional[float] = None) -> Set[str]:
+    """gets the hit ids out of a blast xml output, for every query in it
+
+    Only the Hit_id/ Hit_def and hsp score elements are pulled out with a byte level scan of the
+    output, read a chunk at a time, no Hit/ HSP objects are built.
+
+    Args:
+        path (str): location of blast xml output (may be gzipped)
+        max_evalue (Optional[float], optional): only keep hits with an hsp at or below this e-value. Defaults to None.
+        min_bitscore (Optional[float], optional): only keep hits with an hsp at or above this bitscore. Defaults to None.
+
+    Returns:
+        Set[str]: hit sequence ids
+    """
+    ids = set()
+    raw_id = raw_desc = ""
+    bitscore = 0.0
+    keep = False
+    with open_blastout(path) as handle:
+        for match in outputs.blast_xml_matches(handle, _BLAST_HIT_RE):
+            hit_id, hit_desc, hsp_bitscore, hsp_evalue, hit_close = match.groups()
+            if hit_id is not None:
+                raw_id = unescape(hit_id.decode())
+                keep = False
+            elif hit_desc is not None:
+                raw_desc = unescape(hit_desc.decode())
+            elif hsp_bitscore is not None:
+                bitscore = float(hsp_bitscore)
+            elif hsp_evalue is not None:
+                # e-value comes after the bitscore in each hsp, so both are known here
+                keep = keep or _hsp_passes(float(hsp_evalue), bitscore, max_evalue, min_bitscore)
+            elif hit_close is not None:
+                if keep:
+                    ids.add(outputs.blast_hit_id(raw_id, raw_desc))
+                raw_id = raw_desc = ""
+    return ids
+
+def blast_output_ids(path: str, max_evalue: Optional[float] = None, min_bitscore: Optional[float] = None) -> Set[str]:
+    """gets the hit ids out of a blast output, xml or tabular
+
+    Args:
+        path (str): location of blast output
+        max_evalue (Optional[float], optional): only keep hits with an hsp at or below this e-value. Defaults to None.
+        min_bitscore (Optional[float], optional): only keep hits with an hsp at or above this bitscore. Defaults to None.
+
+    Returns:
+        Set[str]: hit sequence ids
+    """
+    if path.endswith(BLAST_TAB_END):
+        return blast_tab_ids(path, max_evalue, min_bitscore)
+    return blast_xml_ids(path, max_evalue, min_bitscore)
+
+def extract_database(blast_output: str, fasta: str, out: str, from_blastdb: bool = False, max_evalue: Optional[float] = None, min_bitscore: Optional[float] = None) -> None:
+    """writes the hit sequences of a single database's blast output to their own fasta, for merge_fastas()
+
+    Args:
+        blast_output (str): blast output (xml or tabular) of the database
+        fasta (str): fasta the database was made from
+        out (str): fasta to write
+        from_blastdb (bool, optional): fetch sequences from blastdb/ with blastdbcmd instead of reading the fasta. Defaults to False.
+        max_evalue (Optional[float], optional): only keep hits with an hsp at or below this e-value. Defaults to None.
+        min_bitscore (Optional[float], optional): only keep hits with an hsp at or above this bitscore. Defaults to None.
+    """
+    ids = blast_output_ids(blast_output, max_evalue, min_bitscore)
+    found: Set[str] = set()
+    # written under a temporary name, so a crashed extract doesn't leave a part merge_fastas() would pick up
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as fasta_out:
+        if from_blastdb:
+            fetch_from_blastdb(ids, f"{os.getcwd()}/blastdb/{os.path.basename(fasta)}", found, fasta_out)
+        else:
+            with open(fasta, "rb") as fasta_in:
+                copy_fasta_records(fasta_in, ids, found, fasta_out)
+    os.replace(tmp, out)
+    for item in sorted(ids - found):
+        print(f"No sequence found for header {item}")
+
+def extract_blastout(blastout: str, fasta: str, out: str, from_blastdb: bool = False, max_evalue: Optional[float] = None, min_bitscore: Optional[float] = None) -> None:
+    """runs extract_database() on the database's blast output used_blast_outputs() picks, its xml output if there is one
+
+    Args:
+        blastout (str): location of blast outputs
+        fasta (str): fasta the database was made from
+        out (str): fasta to write
+        from_blastdb (bool, optional): fetch sequences from blastdb/ with blastdbcmd instead of reading the fasta. Defaults to False.
+        max_evalue (Optional[float], optional): only keep hits with an hsp at or below this e-value. Defaults to None.
+        min_bitscore (Optional[float], optional): only keep hits with an hsp at or above this bitscore. Defaults to None.
+    """
+    names = os.listdir(blastout) if os.path.isdir(blastout) else []
+    output = used_blast_outputs(names).get(remove_extension(os.path.basename(fasta)))
+    if output is None:
+        raise RuntimeError(f"no blast output for {os.path.basename(fasta)}")
+    extract_database(f"{blastout}/{output}", fasta, out, from_blastdb, max_evalue, min_bitscore)
+
+def merge_fastas(parts: List[str], out: str = "alignment_seqs.fasta") -> None:
+    """concatenates the fastas written by extract_database() into the one fasta used for alignment
+
+    Sequences found in more than one database are only kept the first time. The parts are removed afterwards.
+
+    Args:
+        parts (List[str]): fastas to merge, in order
+        out (str, optional): merged fasta. Defaults to "alignment_seqs.fasta".
+    """
+    found: Set[str] = set()
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as fasta_out:
+        for part in parts:
+            copying = False
+            with open(part, "rb") as fasta_in:
+                for line in fasta_in:
+                    if line.startswith(b">"):
+                        id = fasta_id(line)
+                        copying = id not in found
+                        found.add(id)
+                    if copying:
+                        fasta_out.write(line if line.endswith(b"\n") else line + b"\n")
+    os.replace(tmp, out)
+    for part in parts:
+        os.remove(part)
+
+def alignment_seqs_file() -> str:
+    """location of merge_fastas()' output, which macse_align() moves into alignment/
+
+    Returns:
+        str: path of alignment_seqs.fasta
+    """
+    if os.path.exists("alignment_seqs.fasta"):
+        return "alignment_seqs.fasta"
+    return f"{os.getcwd()}/alignment/alignment_seqs.fasta"
+
+def read_fasta_records(path: str) -> List[Tuple[str, bytes, bytes]]:
+    """reads every record of a fasta as raw bytes
+
+    Args:
+        path (str): fasta to read
+
+    Returns:
+        List[Tuple[str, bytes, bytes]]: id, record as written (header and sequence lines), upper case sequence
+    """
+    records = []
+    with open(path, "rb") as fasta_in:
+        for line in fasta_in:
+            if line.startswith(b">"):
+                records.append((fasta_id(line), [line if line.endswith(b"\n") else line + b"\n"]))
+            elif records:
+                records[-1][1].append(line if line.endswith(b"\n") else line + b"\n")
+    return [(id, b"".join(lines), b"".join(line.strip() for line in lines[1:]).upper()) for id, lines in records]
+
+def kmer_sketch(seq: bytes, k: int = CLUSTER_KMER) -> Optional[np.ndarray]:
+    """minhash sketch of the k-mers of a nucleotide sequence, k-mers with anything but ACGT in them are left out
+
+    The share of equal entries in two sketches estimates the jaccard similarity of their k-mer sets.
+
+    Args:
+        seq (bytes): nucleotide sequence
+        k (int, optional): k-mer length, at most 32. Defaults to CLUSTER_KMER.
+
+    Returns:
+        Optional[np.ndarray]: CLUSTER_HASHES minimum hash values, None if the sequence has no k-mers
+    """
+    codes = _NUCLEOTIDE_CODES[np.frombuffer(seq, dtype=np.uint8)]
+    count = len(codes) - k + 1
+    if count < 1:
+        return None
+    bad = np.concatenate([[0], np.cumsum(codes > 3)])
+    usable = bad[k:] == bad[:-k]
+    if not usable.any():
+        return None
+    # each k-mer packed into 2 bits a base
+    kmers = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        kmers = (kmers << np.uint64(2)) | (codes[offset:offset + count] & np.uint64(3))
+    kmers = np.unique(kmers[usable])
+    sketch = np.full(CLUSTER_HASHES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    # a block of k-mers at a time, hashes x k-mers would get big for long sequences
+    for start in range(0, len(kmers), 4096):
+        hashed = _SKETCH_A[:, None] * kmers[None, start:start + 4096] + _SKETCH_B[:, None]
+        hashed ^= hashed >> np.uint64(29)
+        sketch = np.minimum(sketch, hashed.min(axis=1))
+    return sketch
+
+def cluster_records(records: List[Tuple[str, bytes]], similarity: float) -> Dict[str, Tuple[str, str, float]]:
+    """groups identical and near identical sequences, each group is stood for by one representative
+
+    Identical sequences are found by hash, the first one in the fasta is kept. The rest are grouped greedily,
+    longest first: a sequence joins the most similar representative whose estimated k-mer similarity is at
+    least similarity, or becomes a representative itself. Only representatives sharing a band of the minhash
+    sketch (locality sensitive hashing) are compared, so it doesn't compare every pair.
+
+    Args:
+        records (List[Tuple[str, bytes]]): id and sequence of every record
+        similarity (float): lowest estimated jaccard similarity of k-mers to group sequences, 1 only groups identical ones
+
+    Returns:
+        Dict[str, Tuple[str, str, float]]: id -> representative id, how it matched ("representative", "identical" or
+            "similar") and the estimated similarity
+    """
+    clusters: Dict[str, Tuple[str, str, float]] = {}
+    unique: List[Tuple[str, bytes]] = []
+    by_hash: Dict[bytes, str] = {}
+    for id, seq in records:
+        representative = by_hash.setdefault(hashlib.blake2b(seq, digest_size=16).digest(), id)
+        if representative == id:
+            unique.append((id, seq))
+            clusters[id] = (id, "representative", 1.0)
+        else:
+            clusters[id] = (representative, "identical", 1.0)
+    if similarity >= 1:
+        return clusters
+
+    rows = CLUSTER_HASHES // CLUSTER_BANDS
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    sketches: List[np.ndarray] = []
+    names: List[str] = []
+    # longest first, so a group's representative is its longest sequence
+    for id, seq in sorted(unique, key=lambda record: -len(record[1])):
+        sketch = kmer_sketch(seq)
+        if sketch is None:
+            continue
+        bands = [(band, sketch[band * rows:(band + 1) * rows].tobytes()) for band in range(CLUSTER_BANDS)]
+        best, best_similarity = None, similarity
+        for candidate in sorted({candidate for band in bands for candidate in buckets.get(band, ())}):
+            estimate = float(np.count_nonzero(sketches[candidate] == sketch)) / CLUSTER_HASHES
+            if estimate >= best_similarity:
+                best, best_similarity = candidate, estimate
+        if best is not None:
+            clusters[id] = (names[best], "similar", best_similarity)
+            continue
+        for band in bands:
+            buckets.setdefault(band, []).append(len(names))
+        sketches.append(sketch)
+        names.append(id)
+
+    # copies of a sequence that joined another group follow it there
+    for id, (representative, match, _) in clusters.items():
+        if match == "identical" and clusters[representative][1] == "similar":
+            clusters[id] = (clusters[representative][0], "similar", clusters[representative][2])
+    return clusters
+
+def cluster_sequences(similarity: float, seqs: Optional[str] = None, out_dir: Optional[str] = None) -> None:
+    """writes the representatives of merge_fastas()' output for alignment, with a map of every tip to its representative
+
+    Args:
+        similarity (float): lowest estimated k-mer similarity of grouped sequences, see cluster_records()
+        seqs (Optional[str], optional): fasta to cluster. Defaults to alignment_seqs_file().
+        out_dir (Optional[str], optional): directory to write to. Defaults to ./cluster.
+    """
+    seqs = seqs or alignment_seqs_file()
+    out_dir = out_dir or f"{os.getcwd()}/{CLUSTER_DIR}"
+    os.makedirs(out_dir, exist_ok=True)
+    records = read_fasta_records(seqs)
+    clusters = cluster_records([(id, seq) for id, _, seq in records], similarity)
+
+    with open(f"{out_dir}/{CLUSTER_SEQS_NAME}.tmp", "wb") as fasta_out:
+        for id, record, _ in records:
+            if clusters[id][0] == id:
+                fasta_out.write(record)
+    with open(f"{out_dir}/{CLUSTER_MAP_NAME}.tmp", "w", newline="") as map_out:
+        writer = csv.writer(map_out, delimiter="\t")
+        writer.writerow(["tip", "representative", "match", "similarity"])
+        for id, _, _ in records:
+            representative, match, estimate = clusters[id]
+            writer.writerow([id, representative, match, f"{estimate:.3f}"])
+    os.replace(f"{out_dir}/{CLUSTER_SEQS_NAME}.tmp", f"{out_dir}/{CLUSTER_SEQS_NAME}")
+    os.replace(f"{out_dir}/{CLUSTER_MAP_NAME}.tmp", f"{out_dir}/{CLUSTER_MAP_NAME}")
+
+    kept = len({representative for representative, _, _ in clusters.values()})
+    identical = sum(1 for _, match, _ in clusters.values() if match == "identical")
+    print(f"clustered {len(records)} sequences into {kept} representatives ({identical} identical, {len(records) - kept - identical} similar)")
+
+def run_checked(cmd: str) -> None:
+    """runs a command, raising if it fails
+
+    Args:
+        cmd (str): command, split on spaces
+
+    Raises:
+        RuntimeError: the command exited with a non-zero exit code
     """
-    
-    macse_cmd = f"java -jar {macse_location} -prog alignSequences -seq alignment_seqs.fasta -out_NT alignment_NT_withFS.fasta -out_AA alignment_AA_withFS.fasta"
-    subprocess.run(macse_cmd.split(" "))
+    returncode = run_logged(cmd.split(" "))
+    if returncode != 0:
+        raise RuntimeError(f"{cmd.split(' ')[0]} exited with code {returncode}")
 
-    # run this first to have stats before macse removes frameshifts and stop codons for use in tree creation
-    macse_info_cmd = f"java -jar {macse_location} -prog exportAlignment -align alignment_NT_withFS -out_stat_per_seq alignment_seq_stats.csv -out_stat_per_site alignment_frequencies_stats.csv"
-    subprocess.run(macse_info_cmd.split(" "))
+def run_checked_to(cmd: str, outputs: List[str]) -> None:
+    """runs a command with run_checked() that writes each output under its name + ".tmp", moving them into
+    place once it worked
 
-    # run this second, reason above
-    macse_export_cmd = f"java -jar {macse_location} -prog exportAlignment -align alignment_NT_withFS.fasta -codonForInternalStop NNN -codonForInternalFS - -charForRemainingFS - -out_NT alignment_NT_NoFS.fasta -out_AA alignment_AA_NoFS.fasta -"
-    subprocess.run(macse_export_cmd.split(" "))
+    The viewer maps the alignment into memory, a file written over in place while mapped would crash it,
+    a replaced one leaves the old mapping readable.
+
+    Args:
+        cmd (str): command, split on spaces, writing to the ".tmp" names
+        outputs (List[str]): final output locations
+
+    Raises:
+        RuntimeError: the command exited with a non-zero exit code
+    """
+    try:
+        run_checked(cmd)
+    except RuntimeError:
+        for path in outputs:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        raise
+    for path in outputs:
+        os.replace(path + ".tmp", path)
 
-    # create alignment directory and move all macse files into it
+def macse_align(macse_location: str, seqs: Optional[str] = None) -> None:
+    """aligns the output of merge_fastas() with macse, then moves the sequences into alignment/
+
+    Args:
+        macse_location (str): location of macse jar file
+        seqs (Optional[str], optional): fasta to align instead, eg. cluster_sequences()' representatives, left where it is. Defaults to None.
+    """
     alignment = f"{os.getcwd()}/alignment"
     os.makedirs(alignment, exist_ok=True)
-    for entry in os.scandir(os.getcwd()):
-        if entry.is_file() and entry.name.startswith("alignment"):
-            os.rename(entry.path, f"{alignment}/{entry.name}")
+    nt, aa = f"{alignment}/alignment_NT_withFS.fasta", f"{alignment}/alignment_AA_withFS.fasta"
+    if seqs is not None:
+        run_checked_to(f"java -jar {macse_location} -prog alignSequences -seq {seqs} -out_NT {nt}.tmp -out_AA {aa}.tmp", [nt, aa])
+        return
+    # sequences were moved into alignment/ if macse already ran once
+    seqs = alignment_seqs_file()
+    run_checked_to(f"java -jar {macse_location} -prog alignSequences -seq {seqs} -out_NT {nt}.tmp -out_AA {aa}.tmp", [nt, aa])
+    if seqs != f"{alignment}/alignment_seqs.fasta":
+        os.replace(seqs, f"{alignment}/alignment_seqs.fasta")
+
+def alignment_stats(ids: Optional[Iterable[str]] = None) -> None:
+    """writes per sequence and per site stats of the alignment, before frameshifts and stop codons are removed
+
+    Counted straight from the alignment by outputs.write_alignment_stats(), instead of another macse (jvm) run.
+
+    Args:
+        ids (Optional[Iterable[str]], optional): only recount these sequences' rows. Defaults to None, every sequence.
+    """
+    alignment = f"{os.getcwd()}/alignment"
+    outputs.write_alignment_stats(f"{alignment}/alignment_NT_withFS.fasta", f"{alignment}/alignment_seq_stats.csv", f"{alignment}/alignment_frequencies_stats.csv", ids)
+
+def macse_export(macse_location: str) -> None:
+    """exports the alignment with frameshifts and stop codons removed, for use in tree creation
+
+    Args:
+        macse_location (str): location of macse jar file
+    """
+    alignment = f"{os.getcwd()}/alignment"
+    nt, aa = f"{alignment}/alignment_NT_NoFS.fasta", f"{alignment}/alignment_AA_NoFS.fasta"
+    run_checked_to(f"java -jar {macse_location} -prog exportAlignment -align {alignment}/alignment_NT_withFS.fasta -codonForInternalStop NNN -codonForInternalFS - -charForRemainingFS - -out_NT {nt}.tmp -out_AA {aa}.tmp -", [nt, aa])
 
 def run_IQ_tree(threads: str) -> None:
-    """runs the iqtree command
+    """runs the iqtree command, writing its output into tree/
 
     Args:
         threads (str): number of strings to allow iqtree to use
     """
-    # creates and runs the iqtree command
-    IQ_tree_cmd = f"iqtree -s {os.getcwd()}/alignment/alignment_NT_NoFS.fasta -m GTR -alrt 1000 -nt {threads} -redo"
-    subprocess.run(IQ_tree_cmd.split(" "))
-
-    # creates tree directory and moves all files generated from the iqtree program there
     tree = f"{os.getcwd()}/tree"
     os.makedirs(tree, exist_ok=True)
-    for entry in os.scandir(f"{os.getcwd()}/alignment"):
-        print(entry.name)
-        if entry.is_file() and not entry.name.endswith((".fasta", ".csv")):
-            os.rename(entry.path, f"{tree}/{entry.name}")
 
+    # creates and runs the iqtree command
+    IQ_tree_cmd = f"iqtree -s {os.getcwd()}/alignment/alignment_NT_NoFS.fasta -m GTR -alrt 1000 -nt {threads} -redo -pre {tree}/alignment_NT_NoFS.fasta"
+    run_checked(IQ_tree_cmd)
+
+
+def summarize(out: str = SUMMARY_NAME) -> None:
+    """writes a sqlite cache holding everything the viewer shows for each tip
+
+    Holds each tip's alignment stats row, the best hsp numbers of each of its blast hits,
+    and its position in the tree, so the viewer can answer every lookup with one indexed read.
+    Missing pipeline outputs are skipped.
+
+    Args:
+        out (str, optional): location of the cache file. Defaults to SUMMARY_NAME.
+    """
+    tmp = out + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    db.executescript(
+        """
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE tips (name TEXT PRIMARY KEY, stats TEXT, tree_order INTEGER, root_distance REAL);
+        CREATE TABLE hits (name TEXT, file TEXT, query TEXT, hit_len INTEGER, hsps INTEGER, bitscore REAL, evalue REAL, identity INTEGER, align_len INTEGER);
+        """
+    )
+
+    tips: Dict[str, list] = {}
+
+    # alignment stats, rows kept as json lists in csv column order
+    stats = f"{os.getcwd()}/alignment/alignment_seq_stats.csv"
+    if os.path.exists(stats):
+        with open(stats, "r", newline="") as file_handle:
+            reader = csv.reader(file_handle, delimiter=";")
+            headers = next(reader, [])
+            db.execute("INSERT INTO meta VALUES ('stats_headers', ?)", (json.dumps(headers),))
+            for line in reader:
+                if line:
+                    tips.setdefault(line[0], [None, None, None])[0] = json.dumps(line)
+
+    # tree position, top to bottom order of the tips and their distance from the root
+    treefile = f"{os.getcwd()}/tree/alignment_NT_NoFS.fasta.treefile"
+    if os.path.exists(treefile):
+        tree = Phylo.read(treefile, "newick")
+        depths = tree.depths()
+        for order, clade in enumerate(tree.get_terminals()):
+            tip = tips.setdefault(clade.name, [None, None, None])
+            tip[1], tip[2] = order, depths[clade]
+
+    db.executemany("INSERT INTO tips VALUES (?, ?, ?, ?)", ((name, *tip) for name, tip in tips.items()))
+
+    # best hsp of every hit, xml preferred over tabular output of the same database
+    blastout = f"{os.getcwd()}/blastout"
+    names = os.listdir(blastout) if os.path.isdir(blastout) else []
+    for name in sorted(used_blast_outputs(names).values()):
+        db.executemany("INSERT INTO hits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", blast_summary_rows(f"{blastout}/{name}"))
+    # every blast output there was, the viewer stops using the cache once one is added or removed
+    outputs_seen = [name for name in names if name.endswith(BLASTOUT_ENDS) or name.endswith(BLAST_TAB_END)]
+    db.execute("INSERT INTO meta VALUES ('blast_files', ?)", (json.dumps(sorted(outputs_seen)),))
+
+    db.execute("CREATE INDEX hits_name ON hits (name)")
+    db.commit()
+    db.close()
+    os.replace(tmp, out)
+
+class StageManifest:
+    """record of each pipeline stage's input hashes, parameters and outputs
+
+    Lets a re-run skip stages whose inputs and parameters haven't changed and whose
+    outputs are still there. File hashes are cached by inode, size and mtime, so
+    unchanged (or hardlinked) files are only hashed once.
+    """
+
+    def __init__(self, path: str = MANIFEST_NAME) -> None:
+        self.path = path
+        self.stages: Dict[str, dict] = {}
+        self._hashes: Dict[str, str] = {}
+        try:
+            with open(path, "r") as file_handle:
+                saved = json.load(file_handle)
+            self.stages, self._hashes = saved["stages"], saved["hashes"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self) -> None:
+        """writes manifest to disk, through a temp file so a crash never leaves half a manifest"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as file_handle:
+            json.dump({"stages": self.stages, "hashes": self._hashes}, file_handle, indent=1)
+        os.replace(tmp, self.path)
+
+    def file_hash(self, path: str) -> str:
+        """hashes a file's content, reusing the hash if the file hasn't changed
+
+        Args:
+            path (str): file to hash
+
+        Returns:
+            str: hex digest of the file content
+        """
+        stat = os.stat(path)
+        key = f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+        if key not in self._hashes:
+            digest = hashlib.blake2b()
+            with open(path, "rb") as file_handle:
+                for chunk in iter(lambda: file_handle.read(1 << 20), b""):
+                    digest.update(chunk)
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+    def fingerprint(self, paths: Iterable[str]) -> List[List[str]]:
+        """hashes a set of files, by file name so moved files still match
+
+        Args:
+            paths (Iterable[str]): files to hash, missing files are left out
+
+        Returns:
+            List[List[str]]: sorted [file name, hash] pairs
+        """
+        return sorted([os.path.basename(path), self.file_hash(path)] for path in paths if os.path.isfile(path))
+
+    def is_current(self, stage: str, inputs: List[str], params: dict, outputs: List[str]) -> bool:
+        """checks if a stage already ran with the same inputs and parameters, and its outputs are unchanged
+
+        Args:
+            stage (str): stage name
+            inputs (List[str]): stage input files
+            params (dict): parameters that change the stage's output
+            outputs (List[str]): stage output files
+
+        Returns:
+            bool: if the stage can be skipped
+        """
+        recorded = self.stages.get(stage)
+        if recorded is None or recorded["params"] != params or len(outputs) == 0:
+            return False
+        return recorded["inputs"] == self.fingerprint(inputs) and recorded["outputs"] == self.fingerprint(outputs)
+
+    def record(self, stage: str, inputs: List[List[str]], params: dict, outputs: List[str]) -> None:
+        """records a finished stage and saves the manifest
+
+        Args:
+            stage (str): stage name
+            inputs (List[List[str]]): fingerprint() of the stage inputs, taken when the stage started
+            params (dict): parameters that change the stage's output
+            outputs (List[str]): stage output files
+        """
+        self.stages[stage] = {"inputs": inputs, "params": params, "outputs": self.fingerprint(outputs)}
+        self.save()
+
+    def forget(self, stage: str) -> None:
+        """drops a stage's record, so it reruns next time"""
+        if self.stages.pop(stage, None) is not None:
+            self.save()
+
+def dir_files(path: str, ends: Union[str, Tuple[str, ...]] = "") -> List[str]:
+    """lists files in a directory, empty if it doesn't exist
+
+    Args:
+        path (str): directory
+        ends (Union[str, Tuple[str, ...]], optional): only list files with these endings. Defaults to "" (all files).
+
+    Returns:
+        List[str]: file paths
+    """
+    if not os.path.isdir(path):
+        return []
+    return [entry.path for entry in os.scandir(path) if entry.is_file() and entry.name.endswith(ends)]
+
+class Task:
+    """a piece of pipeline work for run_tasks(), fails by raising
+
+    Args:
+        name (str): unique name, used in dependencies and messages
+        stage (str): pipeline stage the task is part of
+        func (Callable[[], Any]): work to do
+        deps (Iterable[str], optional): names of tasks that have to finish first. Defaults to ().
+        cpus (int, optional): cpus the task uses out of the shared budget. Defaults to 1.
+        in_process (bool, optional): run func in a separate process, for python heavy work (func has to be picklable). Defaults to False.
+        after_failed (bool, optional): still run once deps are finished if some of them failed or were skipped,
+            for tasks that gather what the deps that worked made. Defaults to False.
+    """
+    def __init__(self, name: str, stage: str, func: Callable[[], Any], deps: Iterable[str] = (), cpus: int = 1, in_process: bool = False, after_failed: bool = False):
+        self.name = name
+        self.stage = stage
+        self.func = func
+        self.deps = list(deps)
+        self.cpus = max(1, cpus)
+        self.in_process = in_process
+        self.after_failed = after_failed
+
+def run_in_process_logged(func: Callable[[], Any], task: str, stage: str) -> Tuple[List[dict], float, Optional[Exception]]:
+    """runs a task in a worker process of run_tasks(), handing back what it logged for the parent's run log
+
+    Args:
+        func (Callable[[], Any]): work to do
+        task (str): name of the task
+        stage (str): stage of the task
+
+    Returns:
+        Tuple[List[dict], float, Optional[Exception]]: records of the commands it ran, cpu time of the
+            worker, and the exception it failed with if it did
+    """
+    set_run_log(RunLog(None))
+    _context.task, _context.stage = task, stage
+    cpu = time.process_time()
+    error = None
+    try:
+        func()
+    except Exception as exception:
+        error = exception
+    return _run_log.records, time.process_time() - cpu, error
+
+def run_tasks(tasks: List[Task], cpus: int, on_stage_done: Optional[Callable[[str, bool], None]] = None, on_stage_start: Optional[Callable[[str], None]] = None) -> List[str]:
+    """runs each task as soon as the tasks it depends on have finished, without going over a shared cpu budget
+
+    Ready tasks are started in the order given. A ready task that doesn't fit in the free cpus holds back the
+    tasks after it, so big tasks (eg. iqtree) aren't starved by small ones. Dependencies on tasks not in the
+    list are treated as already done. Anything depending on a failed task is skipped, unless it was made with
+    after_failed. Tasks and stages are timed into the run log, if one was started with set_run_log().
+
+    Args:
+        tasks (List[Task]): tasks to run
+        cpus (int): cpus shared by the running tasks, a task asking for more gets all of them
+        on_stage_done (Optional[Callable[[str, bool], None]], optional): called with a stage name and whether
+            all of its tasks succeeded, once its last task is done. Defaults to None.
+        on_stage_start (Optional[Callable[[str], None]], optional): called with a stage name right before its
+            first task starts. Defaults to None.
+
+    Raises:
+        ValueError: the dependencies have a cycle
+
+    Returns:
+        List[str]: names of tasks that failed or were skipped
+    """
+    cpus = max(1, cpus)
+    by_name = {task.name: task for task in tasks}
+    waiting = {task.name: {dep for dep in task.deps if dep in by_name} for task in tasks}
+    dependents: Dict[str, List[str]] = {}
+    for name, deps in waiting.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(name)
+    stage_left: Dict[str, int] = {}
+    for task in tasks:
+        stage_left[task.stage] = stage_left.get(task.stage, 0) + 1
+    stage_ok = {stage: True for stage in stage_left}
+    stage_started: Set[str] = set()
+    stage_tasks: Dict[str, List[dict]] = {stage: [] for stage in stage_left}
+    failed: List[str] = []
+    # task name -> [start, end, python cpu seconds], filled in by call()
+    times: Dict[str, List[float]] = {}
+    run_started = _run_log.started if _run_log is not None else time.perf_counter()
+
+    def finish(task: Task, status: str) -> None:
+        if status != "ok":
+            failed.append(task.name)
+            stage_ok[task.stage] = False
+
+        # timings of the task, with the cpu time and peak memory of the commands it ran
+        record = {"type": "task", "task": task.name, "stage": task.stage, "status": status}
+        if task.name in times:
+            start, end, cpu = times[task.name]
+            commands = _run_log.commands(task.name) if _run_log is not None else []
+            record.update({
+                "start_s": start - run_started,
+                "wall_s": end - start,
+                "cpu_s": cpu + sum(command["cpu_s"] for command in commands),
+                "max_rss_mb": max((command["max_rss_mb"] for command in commands), default=None),
+                "cpus": min(task.cpus, cpus),
+            })
+        log_record(record)
+        stage_tasks[task.stage].append(record)
+
+        stage_left[task.stage] -= 1
+        if stage_left[task.stage] > 0:
+            return
+        ran = [record for record in stage_tasks[task.stage] if "wall_s" in record]
+        stage_record = {"type": "stage", "task": None, "stage": task.stage, "status": "ok" if stage_ok[task.stage] else "failed"}
+        if ran:
+            stage_record.update({
+                "start_s": min(record["start_s"] for record in ran),
+                "wall_s": max(record["start_s"] + record["wall_s"] for record in ran) - min(record["start_s"] for record in ran),
+                "cpu_s": sum(record["cpu_s"] for record in ran),
+                "max_rss_mb": max((record["max_rss_mb"] for record in ran if record["max_rss_mb"] is not None), default=None),
+            })
+        log_record(stage_record)
+        if on_stage_done is not None:
+            on_stage_done(task.stage, stage_ok[task.stage])
+
+    def skip_dependents(name: str) -> None:
+        for dependent in dependents.get(name, []):
+            if dependent in waiting and by_name[dependent].after_failed:
+                waiting[dependent].discard(name)
+            elif dependent in waiting:
+                del waiting[dependent]
+                print(f"skipping {dependent}, {name} did not finish")
+                finish(by_name[dependent], "skipped")
+                skip_dependents(dependent)
+
+    def call(task: Task, processes: ProcessPoolExecutor) -> None:
+        times[task.name] = [time.perf_counter(), 0.0, 0.0]
+        try:
+            if task.in_process:
+                records, cpu, error = processes.submit(run_in_process_logged, task.func, task.name, task.stage).result()
+                times[task.name][2] = cpu
+                for record in records:
+                    log_record(record)
+                if error is not None:
+                    raise error
+            else:
+                _context.task, _context.stage = task.name, task.stage
+                cpu = time.thread_time()
+                try:
+                    task.func()
+                finally:
+                    times[task.name][2] = time.thread_time() - cpu
+                    _context.task = _context.stage = None
+        finally:
+            times[task.name][1] = time.perf_counter()
+
+    free = cpus
+    running: Dict[Future, Tuple[Task, int]] = {}
+    # processes are started from the scheduler's threads, which isn't safe to fork from
+    with ThreadPoolExecutor(max_workers=cpus) as threads, ProcessPoolExecutor(max_workers=cpus, mp_context=multiprocessing.get_context("forkserver")) as processes:
+        while waiting or running:
+            for task in tasks:
+                if task.name not in waiting or waiting[task.name]:
+                    continue
+                need = min(task.cpus, cpus)
+                if need > free:
+                    break
+                del waiting[task.name]
+                free -= need
+                if task.stage not in stage_started:
+                    stage_started.add(task.stage)
+                    if on_stage_start is not None:
+                        on_stage_start(task.stage)
+                running[threads.submit(call, task, processes)] = (task, need)
+
+            if not running:
+                raise ValueError(f"tasks can't be started, dependency cycle between {', '.join(sorted(waiting))}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, need = running.pop(future)
+                free += need
+                try:
+                    future.result()
+                except Exception as error:
+                    print(f"{task.name} failed: {error}")
+                    finish(task, "failed")
+                    skip_dependents(task.name)
+                    continue
+                for dependent in dependents.get(task.name, []):
+                    if dependent in waiting:
+                        waiting[dependent].discard(task.name)
+                finish(task, "ok")
+    return failed
+
+def pipeline_tasks(args: argparse.Namespace, stages: Iterable[str]) -> List[Task]:
+    """the pipeline as a graph of tasks, per database for the blast steps, for run_tasks()
+
+    Args:
+        args (argparse.Namespace): argparse arguments
+        stages (Iterable[str]): stages to make tasks for, tasks of other stages are assumed to be done
+
+    Returns:
+        List[Task]: tasks, upstream ones first
+    """
+    stages = set(stages)
+    cwd = os.getcwd()
+    bdb = f"{cwd}/blastdb"
+    blastout = f"{cwd}/blastout"
+    fastas = sorted(entry.name for entry in os.scandir(args.fastas) if entry.is_file() and entry.name.endswith(FASTA_ENDS))
+    blast_type = blast_program(args.qtype, args.ftype)
+    queries = split_query(args.q, args.shards) if "blast" in stages else [args.q]
+    blast_threads = max(1, args.t // max(1, min(args.jobs, len(fastas) * len(queries) or 1)))
+
+    def build_database(name: str) -> None:
+        db = f"{bdb}/{name}"
+        link_or_copy(f"{args.fastas}/{name}", db)
+        if blast_database_current(f"{args.fastas}/{name}", db, args.ftype):
+            print(f"blast database for {name} is up to date, skipping")
+            return
+        returncode, stderr = make_blast_database(db, args.ftype)
+        if returncode != 0:
+            raise RuntimeError(f"makeblastdb exited with code {returncode}: {stderr.strip()}")
+        print(f"made blast database for {name}")
+
+    def blast(name: str, query: str = args.q, shard: Optional[int] = None) -> None:
+        print(f"blasting {name}" if shard is None else f"blasting {name}, query shard {shard + 1} of {len(queries)}")
+        blast_cmd, outputs = blast_job(query, blast_type, f"{bdb}/{name}", args.max_targets, blast_threads, args.compress, args.tabular, shard)
+        returncode, stderr = blast_database(blast_cmd, outputs)
+        if returncode != 0:
+            raise RuntimeError(f"blast exited with code {returncode}: {stderr.strip()}")
+        if shard is None:
+            print(f"finished blasting {name}")
+        else:
+            finished_shards.add((name, shard))
+
+    def merge_shards(name: str) -> None:
+        # runs after failed or skipped shards too, so the outputs of an earlier run are removed like an unsharded blast does
+        _, outputs = blast_job(args.q, blast_type, f"{bdb}/{name}", args.max_targets, blast_threads, args.compress, args.tabular)
+        missing = [shard for shard in range(len(queries)) if (name, shard) not in finished_shards]
+        finish_blast_shards(outputs, len(queries), not missing)
+        if missing:
+            raise RuntimeError(f"{len(missing)} of {len(queries)} query shards did not finish")
+        print(f"finished blasting {name}")
+
+    def merge_hits() -> None:
+        # only the databases whose extract finished are merged, the others are listed in the summary
+        done = [part for part in parts if os.path.isfile(part)]
+        if not done:
+            raise RuntimeError("no database's hits were extracted")
+        missing = [name for name, part in zip(fastas, parts) if part not in done]
+        if missing:
+            print(f"merging hits without {', '.join(missing)}")
+        merge_fastas(done)
+
+    # (fasta, shard) of the shard blasts that worked, added to from the task threads
+    finished_shards: Set[Tuple[str, int]] = set()
+    tasks = []
+    parts = []
+    for name in fastas:
+        if "makeblastdb" in stages:
+            os.makedirs(bdb, exist_ok=True)
+            tasks.append(Task(f"makeblastdb {name}", "makeblastdb", partial(build_database, name)))
+        if "blast" in stages and len(queries) == 1:
+            tasks.append(Task(f"blast {name}", "blast", partial(blast, name), [f"makeblastdb {name}"], blast_threads))
+        elif "blast" in stages:
+            # every shard is its own job, merged under the name the unsharded blast has so later tasks don't care
+            shard_tasks = [f"blast {name} shard {shard}" for shard in range(len(queries))]
+            for shard, query in enumerate(queries):
+                tasks.append(Task(shard_tasks[shard], "blast", partial(blast, name, query, shard), [f"makeblastdb {name}"], blast_threads))
+            tasks.append(Task(f"blast {name}", "blast", partial(merge_shards, name), shard_tasks, after_failed=True))
+        if "extract" in stages:
+            part = f"{cwd}/.{remove_extension(name)}_hits.fasta"
+            # a part left by an earlier run would be merged even if this run's extract fails
+            if os.path.isfile(part):
+                os.remove(part)
+            parts.append(part)
+            extract = partial(extract_blastout, blastout, f"{args.fastas}/{name}", part, args.from_blastdb, args.max_evalue, args.min_bitscore)
+            tasks.append(Task(f"extract {name}", "extract", extract, [f"blast {name}"], in_process=True))
+    if "blast" in stages and len(queries) > 1:
+        shard_tasks = [f"blast {name} shard {shard}" for name in fastas for shard in range(len(queries))]
+        tasks.append(Task("remove query shards", "blast", partial(remove_query_shards, args.q, queries), shard_tasks, after_failed=True))
+    if "extract" in stages:
+        tasks.append(Task("merge hits", "extract", merge_hits, [f"extract {name}" for name in fastas], after_failed=True))
+    clustered = None if args.cluster is None else f"{cwd}/{CLUSTER_DIR}/{CLUSTER_SEQS_NAME}"
+    if "cluster" in stages:
+        tasks.append(Task("cluster", "cluster", partial(cluster_sequences, args.cluster), ["merge hits"], in_process=True))
+    if "macse" in stages:
+        tasks.append(Task("macse align", "macse", partial(macse_align, args.a, clustered), ["merge hits", "cluster"]))
+        # the export and the stats only read the alignment, so they run side by side
+        tasks.append(Task("macse export", "macse", partial(macse_export, args.a), ["macse align"]))
+        tasks.append(Task("alignment stats", "macse", alignment_stats, ["macse align"]))
+    if "iqtree" in stages:
+        tasks.append(Task("iqtree", "iqtree", partial(run_IQ_tree, args.t), ["macse export"], args.t))
+    if "summarize" in stages:
+        # summarize() skips missing outputs, so it still runs for the databases that worked
+        tasks.append(Task("summarize", "summarize", summarize, ["iqtree", "alignment stats"] + [f"blast {name}" for name in fastas], after_failed=True))
+    return tasks
+
+def stage_files(args: argparse.Namespace) -> Dict[str, Tuple[Callable[[], List[str]], dict, Callable[[], List[str]]]]:
+    """inputs, parameters and outputs of every pipeline stage
+
+    Args:
+        args (argparse.Namespace): argparse arguments
+
+    Returns:
+        Dict[str, Tuple[Callable[[], List[str]], dict, Callable[[], List[str]]]]: stage name ->
+            (function listing inputs, parameters, function listing outputs)
+    """
+    cwd = os.getcwd()
+    blast_outputs = lambda: dir_files(f"{cwd}/blastout", BLASTOUT_ENDS + (BLAST_TAB_END,))
+    return {
+        "makeblastdb": (
+            lambda: dir_files(args.fastas, FASTA_ENDS),
+            {"ftype": args.ftype},
+            lambda: dir_files(f"{cwd}/blastdb"),
+        ),
+        "blast": (
+            lambda: [args.q] + dir_files(f"{cwd}/blastdb", FASTA_ENDS),
+            {"qtype": args.qtype, "ftype": args.ftype, "max_targets": args.max_targets, "compress": args.compress, "tabular": args.tabular},
+            blast_outputs,
+        ),
+        "extract": (
+            lambda: blast_outputs() + dir_files(args.fastas, FASTA_ENDS),
+            {"from_blastdb": args.from_blastdb, "max_evalue": args.max_evalue, "min_bitscore": args.min_bitscore},
+            lambda: [alignment_seqs_file()],
+        ),
+        "cluster": (
+            lambda: [alignment_seqs_file()],
+            {"similarity": args.cluster, "kmer": CLUSTER_KMER, "hashes": CLUSTER_HASHES, "bands": CLUSTER_BANDS},
+            lambda: dir_files(f"{cwd}/{CLUSTER_DIR}"),
+        ),
+        "macse": (
+            lambda: [alignment_seqs_file() if args.cluster is None else f"{cwd}/{CLUSTER_DIR}/{CLUSTER_SEQS_NAME}", args.a],
+            {},
+            lambda: [path for path in dir_files(f"{cwd}/alignment") if not path.endswith("alignment_seqs.fasta")],
+        ),
+        "iqtree": (
+            lambda: [f"{cwd}/alignment/alignment_NT_NoFS.fasta"],
+            {},
+            lambda: dir_files(f"{cwd}/tree"),
+        ),
+        "summarize": (
+            lambda: [f"{cwd}/alignment/alignment_seq_stats.csv", f"{cwd}/tree/alignment_NT_NoFS.fasta.treefile"] + blast_outputs(),
+            {},
+            lambda: [f"{cwd}/{SUMMARY_NAME}"],
+        ),
+    }
 
 def process_args(argv: list[str] | None = None) -> argparse.Namespace:
     """processes command line arguments using argparse
@@ -232,19 +1527,91 @@ def process_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser.add_argument("-max_targets", type=int, default=10, help="max number of target seqs while running blast")
     parser.add_argument("-a", "-alignemnt", type=str, help="location of macse jar file, if not given, script will stop after blast output")
     parser.add_argument("-t", "-threads", type=int, default=1, help="number of threads to allow subprocesses to use")
+    parser.add_argument("-compress", action="store_true", help="gzip blast xml output")
+    parser.add_argument("-tabular", choices=TABULAR_MODES, help="also write tabular blast output next to the xml, or only write tabular output")
+    parser.add_argument("-from_blastdb", action="store_true", help="fetch hit sequences from blastdb/ with blastdbcmd instead of rereading the fastas")
+    parser.add_argument("-max_evalue", type=float, help="only align hits with an hsp at or below this e-value")
+    parser.add_argument("-min_bitscore", type=float, help="only align hits with an hsp at or above this bitscore")
+    parser.add_argument("-cluster", type=float, metavar="SIMILARITY", help="only align one representative of hits that are identical, or whose estimated k-mer similarity (0-1) is at least SIMILARITY, tips are mapped to their representative in cluster/clusters.tsv")
+    parser.add_argument("-from_stage", choices=STAGES, help="rerun from this stage on even if earlier results are current, earlier stages are not run")
+    parser.add_argument("-until_stage", choices=STAGES, help="stop after this stage")
+    parser.add_argument("-jobs", type=int, default=1, help="number of blast jobs (databases, or query shards of databases) to run at the same time, threads are split between them")
+    parser.add_argument("-shards", type=int, default=1, help="split a query fasta with many sequences into this many shards of about the same number of residues, blasted as separate jobs")
     argv = argv or sys.argv[1:]
     args = parser.parse_args(args=argv)
+    if args.cluster is not None and not 0 < args.cluster <= 1:
+        parser.error(f"argument -cluster: {args.cluster} is not a similarity in (0, 1]")
     return args
 
 def main(argv: list[str] | None = None) -> None:
     args = process_args(argv)
 
-    run_make_blast_database(args.fastas, args.ftype)
-    run_blast(args.q, args.qtype, args.ftype, args.threads, args.max_targets)
-    create_fasta(args.fastas)
-    if args.a is not None:
-        run_macse(args.a)
-        run_IQ_tree(args.t)
+    stages = stage_files(args)
+    manifest = StageManifest()
+
+    first = STAGES.index(args.from_stage) if args.from_stage else 0
+    last = STAGES.index(args.until_stage) if args.until_stage else len(STAGES) - 1
+    selected = [stage for i, stage in enumerate(STAGES) if first <= i <= last]
+    # alignment and tree need the macse jar
+    if args.a is None:
+        selected = [stage for stage in selected if stage not in ("macse", "iqtree")]
+    if args.cluster is None:
+        selected = [stage for stage in selected if stage != "cluster"]
+
+    # skip up to date stages, everything after the first stage that runs has to run too as its inputs will change
+    to_run = []
+    for stage in selected:
+        inputs, params, outputs = stages[stage]
+        if not to_run and args.from_stage is None and manifest.is_current(stage, inputs(), params, outputs()):
+            print(f"{stage} is up to date, skipping")
+            continue
+        to_run.append(stage)
+    if not to_run:
+        return
+
+    # a stage that crashes part way stays unrecorded
+    for stage in to_run:
+        manifest.forget(stage)
+
+    # stage -> fingerprint of its inputs when its first task started, so inputs changed while it ran don't get recorded
+    snapshots: Dict[str, List[List[str]]] = {}
+
+    def stage_started(stage: str) -> None:
+        inputs, _, _ = stages[stage]
+        snapshots[stage] = manifest.fingerprint(inputs())
+
+    def stage_done(stage: str, ok: bool) -> None:
+        # per database tasks let a stage start before the one before it is done, so the files that stage
+        # went on to make are taken into the snapshots of the stages that started early
+        made = set(os.path.basename(path) for path in stages[stage][2]())
+        for later, snapshot in snapshots.items():
+            if later == stage:
+                continue
+            paths = [path for path in stages[later][0]() if os.path.basename(path) in made]
+            refreshed = dict((name, digest) for name, digest in snapshot)
+            refreshed.update((name, digest) for name, digest in manifest.fingerprint(paths))
+            snapshots[later] = sorted([name, digest] for name, digest in refreshed.items())
+        snapshot = snapshots.pop(stage, None)
+        if not ok:
+            print(f"{stage} did not finish, not marking it as done")
+            return
+        _, params, outputs = stages[stage]
+        manifest.record(stage, snapshot, params, outputs())
+
+    log = RunLog()
+    set_run_log(log)
+    try:
+        failed = run_tasks(pipeline_tasks(args, to_run), args.t, stage_done, stage_started)
+    finally:
+        set_run_log(None)
+    print(log.summary())
+    if failed:
+        print(f"{len(failed)} tasks failed or were skipped: {', '.join(failed)}")
+        # per database tasks are named "<step> <fasta>", shards "<step> <fasta> shard <n>"
+        databases = [os.path.basename(path) for path in dir_files(args.fastas, FASTA_ENDS)]
+        broken = [name for name in databases if any(task.split(" shard ")[0] in (f"makeblastdb {name}", f"blast {name}", f"extract {name}") for task in failed)]
+        if broken:
+            print(f"databases left out: {', '.join(broken)}")
 
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file
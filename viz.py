@@ -1,59 +1,1101 @@
 #! /usr/bin/env python3
 
-from typing import List
+from typing import Any, Callable, Container, Dict, Iterable, List, Optional, Set, Tuple
 import pytermgui as ptg
 from Bio import Phylo, SearchIO, AlignIO
+from Bio.SearchIO import Hit
 from prettytable import PrettyTable
+from xml.sax.saxutils import unescape
+import bisect
+import collections
 import contextlib
+import difflib
 import os
 import io
 import csv
+import gzip
+import heapq
+import json
+import mmap
 import re
+import sqlite3
+import threading
+import warnings
+import numpy as np
 
-def out_phylo() -> str:
+from outputs import AlignmentIndex, CachedFile, BLASTOUT_ENDS, BLAST_SUMMARY_RE, BLAST_TAB_COLUMNS, BLAST_TAB_END, CLUSTER_DIR, CLUSTER_MAP_NAME, SUMMARY_HIT_COLUMNS, SUMMARY_NAME, alignment_index, blast_hit_id, blast_xml_summary_rows, shared_instance, used_blast_outputs
+
+# tabular columns that hold numbers, everything else stays a string
+BLAST_TAB_NUMERIC = {"pident": float, "length": int, "mismatch": int, "gapopen": int, "qstart": int, "qend": int, "sstart": int, "send": int, "evalue": float, "bitscore": float}
+# name of the on disk hit index kept inside the blastout directory
+BLAST_INDEX_NAME = ".kaleview_hit_index.json"
+# bump when the layout of the index file changes so old indexes get rebuilt
+BLAST_INDEX_VERSION = 1
+# tags needed to locate a <Hit> element and the <Iteration> it belongs to
+_BLAST_TAG_RE = re.compile(rb"<(Iteration|Iteration_hits|Hit)>|(</Hit>)|<Hit_id>([^<]*)</Hit_id>|<Hit_def>([^<]*)</Hit_def>")
+# closes the elements left open when a single hit is cut out of a blast xml file
+_BLAST_XML_FOOTER = b"\n</Iteration_hits>\n</Iteration>\n</BlastOutput_iterations>\n</BlastOutput>\n"
+# most ids put in a single sqlite query, under sqlite's bound variable limit
+SQLITE_CHUNK = 500
+
+_trees: Dict[str, Tuple[int, object]] = {}
+
+def tree_file() -> str:
+    """location of the iqtree treefile the viewer shows
+
+    Returns:
+        str: path of the treefile
+    """
+    return f"{os.getcwd()}/tree/alignment_NT_NoFS.fasta.treefile"
+
+def load_tree(path: Optional[str] = None):
+    """reads in phylogenetic tree, parsing it only once per change of the treefile
+
+    Args:
+        path (Optional[str], optional): location of newick tree. Defaults to tree_file().
+
+    Returns:
+        Bio.Phylo.BaseTree.Tree: parsed tree
+    """
+    path = path or tree_file()
+    mtime = os.stat(path).st_mtime_ns
+    cached = _trees.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, Phylo.read(path, "newick"))
+        _trees[path] = cached
+    return cached[1]
+
+# internal node labels iqtree writes, sh-alrt support first, then ultrafast bootstrap if it was run
+_SUPPORT_RE = re.compile(r"^(\d+(?:\.\d+)?)(?:/\d+(?:\.\d+)?)*$")
+# line pieces of the drawn tree, keyed by the sides they connect (up, down, left, right)
+_TREE_JUNCTIONS = {
+    (False, False, False, False): " ", (False, False, True, True): "\u2500", (True, True, False, False): "\u2502",
+    (False, True, False, True): "\u250c", (True, False, False, True): "\u2514", (False, True, True, False): "\u2510",
+    (True, False, True, False): "\u2518", (True, True, False, True): "\u251c", (True, True, True, False): "\u2524",
+    (False, True, True, True): "\u252c", (True, False, True, True): "\u2534", (True, True, True, True): "\u253c",
+    (False, False, False, True): "\u2500", (False, False, True, False): "\u2500",
+    (True, False, False, False): "\u2502", (False, True, False, False): "\u2502",
+}
+_TREE_JUNCTIONS = {sides: ord(char) for sides, char in _TREE_JUNCTIONS.items()}
+
+def _support(clade) -> Optional[float]:
+    """support value of an internal node, from its confidence or an iqtree "alrt/ufboot" label"""
+    if clade.confidence is not None:
+        return float(clade.confidence)
+    match = _SUPPORT_RE.match(clade.name or "")
+    return float(match.group(1)) if match else None
+
+class TreeLayout:
+    """row and column positions of every node of a tree, worked out without recursion
+
+    Nodes are kept in preorder, so a clade is the run of nodes from its own index to index + size.
+    Clades can be collapsed by support or depth, a collapsed clade takes a single row.
+    """
+
+    def __init__(self, tree) -> None:
+        clades: List[Any] = []
+        parents: List[int] = []
+        stack = [(tree.root, -1)]
+        while stack:
+            clade, parent = stack.pop()
+            parents.append(parent)
+            clades.append(clade)
+            stack.extend((child, len(clades) - 1) for child in reversed(clade.clades))
+        count = len(clades)
+        self.parents = parents
+        self.children: List[List[int]] = [[] for _ in range(count)]
+        for node in range(1, count):
+            self.children[parents[node]].append(node)
+        self.names = [clade.name for clade in clades]
+        self.support = [None if not clade.clades else _support(clade) for clade in clades]
+        # same distances as Bio.Phylo's tree.depths(), a missing branch length counts as 0
+        self.distance = [float(tree.root.branch_length or 0)] * count
+        self.level = [0] * count
+        for node in range(1, count):
+            parent = parents[node]
+            self.distance[node] = self.distance[parent] + float(clades[node].branch_length or 0)
+            self.level[node] = self.level[parent] + 1
+        self.size = [1] * count
+        self.tips_below = [0 if clade.clades else 1 for clade in clades]
+        for node in range(count - 1, 0, -1):
+            self.size[parents[node]] += self.size[node]
+            self.tips_below[parents[node]] += self.tips_below[node]
+        self.tips = [node for node in range(count) if not self.children[node]]
+        self.tip_nodes = {self.names[node]: node for node in reversed(self.tips) if self.names[node]}
+        self.collapsed: Set[int] = set()
+        self.arrange()
+
+    def collapse(self, min_support: Optional[float] = None, max_depth: Optional[int] = None) -> None:
+        """collapses every clade with support below min_support or more than max_depth nodes below the root
+
+        Args:
+            min_support (Optional[float], optional): sh-alrt support a clade needs to stay open. Defaults to None, no support limit.
+            max_depth (Optional[int], optional): deepest level of open clades. Defaults to None, no depth limit.
+        """
+        collapsed = set()
+        for node in range(1, len(self.parents)):
+            if not self.children[node]:
+                continue
+            if max_depth is not None and self.level[node] >= max_depth:
+                collapsed.add(node)
+            elif min_support is not None and self.support[node] is not None and self.support[node] < min_support:
+                collapsed.add(node)
+        self.collapsed = collapsed
+        self.arrange()
+
+    def expand_to(self, node: int) -> bool:
+        """opens every collapsed clade holding a node
+
+        Args:
+            node (int): node index
+
+        Returns:
+            bool: if any clade was opened
+        """
+        opened = False
+        parent = self.parents[node]
+        while parent >= 0:
+            if parent in self.collapsed:
+                self.collapsed.discard(parent)
+                opened = True
+            parent = self.parents[parent]
+        if opened:
+            self.arrange()
+        return opened
+
+    def arrange(self) -> None:
+        """gives a row to every tip and collapsed clade, and puts internal nodes between their first and last child"""
+        visible = []
+        row_of: Dict[int, int] = {}
+        node = 0
+        count = len(self.parents)
+        while node < count:
+            visible.append(node)
+            if not self.children[node] or node in self.collapsed:
+                row_of[node] = len(row_of)
+                # skip everything inside a collapsed clade
+                node += self.size[node]
+            else:
+                node += 1
+        leaves = len(row_of)
+        for node in reversed(visible):
+            if node not in row_of:
+                children = self.children[node]
+                row_of[node] = (row_of[children[0]] + row_of[children[-1]]) // 2
+        self.visible = visible
+        self.row_of = row_of
+        self.rows = leaves
+        self.leaf_rows = [node for node in visible if not self.children[node] or node in self.collapsed]
+        self._grids: Dict[int, Tuple[np.ndarray, List[int], List[str]]] = {}
+
+    def label(self, node: int) -> str:
+        """text drawn after a tip or collapsed clade"""
+        if node not in self.collapsed:
+            return self.names[node] or ""
+        # in preorder a clade starts down its first children and ends on its last tip
+        first, last = node, node + self.size[node] - 1
+        while self.children[first]:
+            first = self.children[first][0]
+        support = self.support[node]
+        support = "" if support is None else f", support {support:g}"
+        return f"+ {self.tips_below[node]} tips ({self.names[first] or '?'} .. {self.names[last] or '?'}{support})"
+
+    def grid(self, width: int) -> Tuple[np.ndarray, List[int], List[str]]:
+        """draws the branches of the visible nodes for a width, kept until the width or collapsed clades change
+
+        Args:
+            width (int): columns for branches and labels together
+
+        Returns:
+            Tuple[np.ndarray, List[int], List[str]]: code points of the branches (rows x columns), and the column
+                each row's label starts at and the label, for every row
+        """
+        if width in self._grids:
+            return self._grids[width]
+        labels = [self.label(node) for node in self.leaf_rows]
+        label_width = min(max((len(label) for label in labels), default=0) + 1, max(width // 3, 1))
+        columns = max(width - label_width, 2)
+        # branch lengths scaled to the columns, unit lengths for trees without any
+        depth = self.distance if max(self.distance) > 0 else self.level
+        base, scale = depth[0], (columns - 1) / max(max(depth[node] for node in self.visible) - depth[0], 1e-12)
+        column_of: Dict[int, int] = {}
+        for node in self.visible:
+            column = round((depth[node] - base) * scale)
+            parent = self.parents[node]
+            if parent >= 0:
+                # every branch at least one column long
+                column = max(column, column_of[parent] + 1)
+            column_of[node] = min(column, columns - 1)
+
+        junctions = _TREE_JUNCTIONS
+        grid = np.full((self.rows, columns), junctions[False, False, False, False], dtype=np.uint32)
+        for node in self.visible:
+            row, column = self.row_of[node], column_of[node]
+            parent = self.parents[node]
+            if parent >= 0:
+                grid[row, column_of[parent] + 1:column + 1] = junctions[False, False, True, True]
+            children = [] if node in self.collapsed else self.children[node]
+            if not children:
+                continue
+            child_rows = [self.row_of[child] for child in children]
+            top, bottom = child_rows[0], child_rows[-1]
+            grid[top:bottom + 1, column] = junctions[True, True, False, False]
+            for joined in set(child_rows) | {row}:
+                grid[joined, column] = junctions[joined > top, joined < bottom, joined == row and parent >= 0, joined in child_rows]
+        starts = [column_of[node] + 2 for node in self.leaf_rows]
+        self._grids = {width: (grid, starts, labels)}
+        return self._grids[width]
+
+    def render_row(self, row: int, width: int) -> str:
+        """draws one row of the tree, cropped and padded to the width"""
+        grid, starts, labels = self.grid(width)
+        # rows are numbered in the same order as leaf_rows
+        line = grid[row].tobytes().decode("utf-32-le")[:starts[row] - 1] + " " + labels[row]
+        return line[:width].ljust(width)
+
+_tree_layouts: Dict[str, Tuple[object, TreeLayout]] = {}
+
+def tree_layout(path: Optional[str] = None) -> TreeLayout:
+    """gets the layout of a treefile, worked out once per change of the treefile
+
+    Args:
+        path (Optional[str], optional): location of newick tree. Defaults to tree_file().
+
+    Returns:
+        TreeLayout: layout of the tree
+    """
+    path = path or tree_file()
+    tree = load_tree(path)
+    cached = _tree_layouts.get(path)
+    if cached is None or cached[0] is not tree:
+        cached = (tree, TreeLayout(tree))
+        _tree_layouts[path] = cached
+    return cached[1]
+
+class TreeIndex:
+    """constant time ancestry, common ancestor and clade queries on a tree
+
+    Nodes are numbered in preorder like TreeLayout, so a clade is the run of nodes from its own number to
+    number + size. Common ancestors come from the shallowest node of an euler tour between the two nodes,
+    looked up in a sparse table of minimums. Clade values are added up from prefix sums over the tips in order.
+    """
+
+    def __init__(self, layout: TreeLayout) -> None:
+        self.layout = layout
+        count = len(layout.parents)
+        self.end = np.arange(count) + np.array(layout.size)
+        """first node after each clade"""
+        is_tip = np.array([not children for children in layout.children])
+        self.tips = np.flatnonzero(is_tip)
+        # tips before each node, so the tips of a clade are self.tips[before[node]:before[end[node]]]
+        self.before = np.concatenate([[0], np.cumsum(is_tip)])
+
+        # euler tour: every node, and its parent again after each child's clade, without recursion
+        euler = [0]
+        first = [0] * count
+        next_child = [0] * count
+        stack = [0]
+        while stack:
+            node = stack[-1]
+            if next_child[node] < len(layout.children[node]):
+                child = layout.children[node][next_child[node]]
+                next_child[node] += 1
+                first[child] = len(euler)
+                euler.append(child)
+                stack.append(child)
+            else:
+                stack.pop()
+                if stack:
+                    euler.append(stack[-1])
+        self.euler = np.array(euler)
+        self.first = first
+        self._levels = np.array(layout.level)[self.euler]
+        # table[k][i] is the position of the shallowest node in euler[i:i + 2 ** k]
+        self._table = [np.arange(len(euler))]
+        while 2 ** len(self._table) <= len(euler):
+            previous, half = self._table[-1], 2 ** (len(self._table) - 1)
+            left, right = previous[:-half], previous[half:]
+            self._table.append(np.where(self._levels[left] <= self._levels[right], left, right))
+        self._stats: Optional[Tuple[tuple, List[str], np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def node(self, tip: str) -> Optional[int]:
+        """node of a tip name, None if it isn't in the tree"""
+        return self.layout.tip_nodes.get(tip)
+
+    def is_ancestor(self, ancestor: int, node: int) -> bool:
+        """if node is in the clade of ancestor (a node is in its own clade)"""
+        return ancestor <= node < self.end[ancestor]
+
+    def lca(self, a: int, b: int) -> int:
+        """closest common ancestor of two nodes
+
+        Args:
+            a (int): node
+            b (int): node
+
+        Returns:
+            int: deepest node holding both
+        """
+        start, stop = sorted((self.first[a], self.first[b]))
+        level = (stop - start + 1).bit_length() - 1
+        left, right = self._table[level][start], self._table[level][stop - 2 ** level + 1]
+        return int(self.euler[left if self._levels[left] <= self._levels[right] else right])
+
+    def clade(self, tips: Iterable[str]) -> Optional[int]:
+        """smallest clade holding every tip, a single tip gives the clade of it and its sisters
+
+        Args:
+            tips (Iterable[str]): tip names
+
+        Returns:
+            Optional[int]: node of the clade, None if a tip isn't in the tree
+        """
+        nodes = [self.node(tip) for tip in tips]
+        if not nodes or None in nodes:
+            return None
+        clade = nodes[0]
+        for node in nodes[1:]:
+            clade = self.lca(clade, node)
+        if clade == nodes[0] and len(set(nodes)) == 1:
+            clade = max(self.layout.parents[clade], 0)
+        return clade
+
+    def tip_range(self, node: int) -> Tuple[int, int]:
+        """first and last + 1 position of a clade's tips in self.tips"""
+        return int(self.before[node]), int(self.before[self.end[node]])
+
+    def clade_tips(self, node: int) -> List[str]:
+        """names of the tips in a clade, top to bottom
+
+        Args:
+            node (int): clade node
+
+        Returns:
+            List[str]: tip names
+        """
+        start, stop = self.tip_range(node)
+        return [self.layout.names[tip] or "" for tip in self.tips[start:stop]]
+
+    def _stat_table(self, store: "SeqStatsStore") -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """numeric stats of every tip in tip order, with prefix sums and counts, rebuilt when the csv is reloaded"""
+        store._reload_if_needed()
+        # the store itself is held, so its identity can't be handed to a new one
+        if self._stats is None or self._stats[0] != (store, store.version):
+            headers = store.headers[1:]
+            values = np.full((len(self.tips), len(headers)), np.nan)
+            for position, tip in enumerate(self.tips):
+                row = store.rows.get(self.layout.names[tip] or "")
+                if row is not None:
+                    values[position] = [_as_number(value) for value in row[1:len(headers) + 1]] + [np.nan] * (len(headers) + 1 - len(row))
+            present = ~np.isnan(values)
+            zeros = np.zeros((1, len(headers)))
+            sums = np.concatenate([zeros, np.cumsum(np.where(present, values, 0), axis=0)])
+            counts = np.concatenate([zeros, np.cumsum(present, axis=0)])
+            self._stats = ((store, store.version), headers, values, sums, counts)
+        return self._stats[1:]
+
+    def clade_stats(self, node: int, store: "SeqStatsStore") -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """adds up every stats column over the tips of a clade
+
+        Args:
+            node (int): clade node
+            store (SeqStatsStore): stats of the tips
+
+        Returns:
+            Tuple[List[str], Dict[str, np.ndarray]]: stats column names, and count (tips with a value), sum, mean,
+                min and max per column (nan where no tip has a value)
+        """
+        headers, values, sums, counts = self._stat_table(store)
+        start, stop = self.tip_range(node)
+        count = counts[stop] - counts[start]
+        total = sums[stop] - sums[start]
+        block = values[start:stop]
+        present = count > 0
+        result = {"count": count, "sum": np.where(present, total, np.nan), "mean": np.full(len(headers), np.nan)}
+        result["mean"][present] = total[present] / count[present]
+        result["min"] = np.where(present, np.min(np.where(np.isnan(block), np.inf, block), axis=0, initial=np.inf), np.nan)
+        result["max"] = np.where(present, np.max(np.where(np.isnan(block), -np.inf, block), axis=0, initial=-np.inf), np.nan)
+        return headers, result
+
+def _as_number(value: str) -> float:
+    """a stats csv value as a float, nan if it isn't a number"""
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+_tree_indexes: Dict[str, Tuple[TreeLayout, TreeIndex]] = {}
+
+def tree_index(path: Optional[str] = None) -> TreeIndex:
+    """gets the topology index of a treefile, built once per change of the treefile
+
+    Args:
+        path (Optional[str], optional): location of newick tree. Defaults to tree_file().
+
+    Returns:
+        TreeIndex: index of the tree
+    """
+    path = path or tree_file()
+    layout = tree_layout(path)
+    cached = _tree_indexes.get(path)
+    if cached is None or cached[0] is not layout:
+        cached = (layout, TreeIndex(layout))
+        _tree_indexes[path] = cached
+    return cached[1]
+
+def out_phylo(path: Optional[str] = None, column_width: int = 200) -> str:
     """reads in phylogenetic tree input and outputs ascii tree
 
+    Args:
+        path (Optional[str], optional): location of newick tree. Defaults to tree_file().
+        column_width (int, optional): width of the ascii tree. Defaults to 200.
+
     Returns:
         str: ascii tree representation of phylogenetic tree input
     """
-    tree = Phylo.read(f"{os.getcwd()}/tree/alignment_NT_NoFS.fasta.treefile", "newick")
-    #who tf wants a function that could return a string to just print straight to stdout???
-    # catches the stdout ascii tree and stores as string
-    f = io.StringIO()
-    with contextlib.redirect_stdout(f):
-        Phylo.draw_ascii(tree, column_width=200)
-    output = f.getvalue()
-    return output
+    layout = tree_layout(path)
+    return "".join(layout.render_row(row, column_width).rstrip() + "\n" for row in range(layout.rows))
+
+class TreeView(ptg.Widget):
+    """tree widget that only draws the rows that fit in its window, at the window's width
+
+    Drawing cost depends on the number of visible rows, not the number of tips.
+    """
+
+    def __init__(self, layout: TreeLayout, **attrs: Any) -> None:
+        super().__init__(**attrs)
+        self.layout = layout
+        self.rows = 20
+        """Number of rows shown, set by the window holding the widget."""
+        self.offset = 0
+        self.selected: Optional[int] = None
+
+    def scroll(self, amount: int) -> bool:
+        """moves the visible rows
+
+        Args:
+            amount (int): rows to move by, negative moves up
 
-def gui_ize(tree: str = out_phylo()) -> ptg.Container:
-    """takes in out_phylo() ascii tree and outputs in Container format
+        Returns:
+            bool: if the view moved
+        """
+        offset = max(0, min(self.offset + amount, self.layout.rows - self.rows))
+        moved = offset != self.offset
+        self.offset = offset
+        return moved
+
+    def jump_to(self, tip: str) -> bool:
+        """centers the view on a tip and highlights its row, opening collapsed clades it is in
+
+        Args:
+            tip (str): tip name
+
+        Returns:
+            bool: if tip was found in the tree
+        """
+        node = self.layout.tip_nodes.get(tip)
+        if node is None and cluster_map().get(tip) is not None:
+            # left out of the tree by clustering, show its representative
+            node = self.layout.tip_nodes.get(cluster_map().get(tip)[0])
+        if node is None:
+            return False
+        self.layout.expand_to(node)
+        self.selected = node
+        self.offset = 0
+        self.scroll(self.layout.row_of[node] - self.rows // 2)
+        return True
+
+    def on_scroll_up(self, _: ptg.MouseEvent) -> bool:
+        return self.scroll(-3)
+
+    def on_scroll_down(self, _: ptg.MouseEvent) -> bool:
+        return self.scroll(3)
+
+    def get_lines(self) -> List[str]:
+        """renders only the visible rows, drawn for the widget's width"""
+        width = max(self.width, 1)
+        selected_row = self.layout.row_of.get(self.selected) if self.selected is not None else None
+        lines = []
+        for row in range(self.offset, min(self.layout.rows, self.offset + self.rows)):
+            line = self.layout.render_row(row, width)
+            if row == selected_row:
+                line = f"\x1b[7m{line}\x1b[0m"
+            lines.append(line)
+        return lines
+
+def gui_ize(path: Optional[str] = None, min_support: Optional[float] = None, max_depth: Optional[int] = None) -> TreeView:
+    """lays out the treefile and outputs it as a TreeView widget
 
     Args:
-        tree (str, optional): ascii tree. Defaults to out_phylo().
+        path (Optional[str], optional): location of newick tree. Defaults to tree_file().
+        min_support (Optional[float], optional): collapse clades with lower sh-alrt support. Defaults to None.
+        max_depth (Optional[int], optional): collapse clades deeper than this many nodes below the root. Defaults to None.
 
     Returns:
-        ptg.Container: _description_
+        TreeView: scrollable tree widget
     """
-    # split tree by before/ after tip label (assuming tip label starts with lower/upper alphabet)
-    lines = []
-    for line in tree.split("\n"):
-        pattern = r'(^[^a-zA-Z]+)' 
-        lines.append(re.split(pattern, line))
+    layout = TreeLayout(load_tree(path))
+    if min_support is not None or max_depth is not None:
+        layout.collapse(min_support, max_depth)
+    return TreeView(layout)
 
-    #TODO potentially fix button and/or make simplier to get rid of regex/ button functionality
-    cont = ptg.Container()
-    for line in lines:
-        if line[-1] != "":
-            temp = ptg.Splitter(
-                #ptg.Label("".join(line[0:len(line) - 1]), parent_align=0),
-                ptg.Label("".join(line), parent_align=0),
-                #ptg.Button(line[-1], parent_align=0)
-            )
-        else:
-            temp = ptg.Label("".join(line), parent_align=0)
-        cont._add_widget(temp)
+def _scan_blast_bytes(data: bytes) -> Tuple[int, Dict[str, List[int]]]:
+    """finds the byte offsets of every <Hit> element in blast xml content
+
+    Args:
+        data (bytes): blast xml content (bytes or mmap)
+
+    Returns:
+        Tuple[int, Dict[str, List[int]]]: offset where the first <Iteration> starts, and a dict of
+            hit id -> [iteration start, end of <Iteration_hits> tag, hit start, hit end]
+    """
+    hits: Dict[str, List[int]] = {}
+    header_end = 0
+    iter_start = iter_hits_end = hit_start = 0
+    raw_id = raw_desc = ""
+    first = True
+    for match in _BLAST_TAG_RE.finditer(data):
+        tag, hit_close, hit_id, hit_desc = match.groups()
+        if tag == b"Iteration":
+            iter_start = match.start()
+            if first:
+                header_end = iter_start
+                first = False
+        elif tag == b"Iteration_hits":
+            iter_hits_end = match.end()
+        elif tag == b"Hit":
+            hit_start = match.start()
+            raw_id = raw_desc = ""
+        elif hit_id is not None:
+            raw_id = unescape(hit_id.decode())
+        elif hit_desc is not None:
+            raw_desc = unescape(hit_desc.decode())
+        elif hit_close is not None:
+            # first hit with a given id wins, same as scanning the file in order
+            hits.setdefault(blast_hit_id(raw_id, raw_desc), [iter_start, iter_hits_end, hit_start, match.end()])
+    return header_end, hits
+
+def scan_blast_hits(path: str) -> Tuple[int, Dict[str, List[int]]]:
+    """scans a blast xml file for the byte offsets of every <Hit> element without parsing it
+
+    Offsets of gzipped outputs are offsets into the decompressed xml.
+
+    Args:
+        path (str): location of blast xml file
+
+    Returns:
+        Tuple[int, Dict[str, List[int]]]: offset where the first <Iteration> starts, and a dict of
+            hit id -> [iteration start, end of <Iteration_hits> tag, hit start, hit end]
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as file_handle:
+            return _scan_blast_bytes(file_handle.read())
+    with open(path, "rb") as file_handle:
+        if os.fstat(file_handle.fileno()).st_size == 0:
+            return 0, {}
+        with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _scan_blast_bytes(data)
+
+@contextlib.contextmanager
+def _blast_bytes(path: str):
+    """opens a blast xml file as bytes, mapped into memory, or decompressed for gzipped outputs
+
+    Args:
+        path (str): location of blast xml file
+
+    Yields:
+        bytes or mmap: the (decompressed) xml
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as file_handle:
+            yield file_handle.read()
+        return
+    with open(path, "rb") as file_handle:
+        if os.fstat(file_handle.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+class BlastHitIndex:
+    """on disk index of hit id -> (blastout file, byte offset of <Hit> element)
+
+    The index is saved next to the blast outputs and each file's entry is checked against
+    its mtime and size, so only new or changed files are rescanned.
+    """
+
+    def __init__(self, blastout: str) -> None:
+        self.blastout = blastout
+        self.path = os.path.join(blastout, BLAST_INDEX_NAME)
+        self.files: Dict[str, dict] = {}
+        self.hits: Dict[str, Tuple[str, List[int]]] = {}
+        self.version = 0
+        """counts changes to hits, so caches built from them know to update"""
+        # lookups and the -watch poller refresh from different threads
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """reads saved index from disk if there is a usable one"""
+        try:
+            with open(self.path, "r") as file_handle:
+                saved = json.load(file_handle)
+        except (OSError, ValueError):
+            return
+        if saved.get("version") == BLAST_INDEX_VERSION:
+            self.files = saved["files"]
+            self._rebuild_hits()
+
+    def _save(self) -> None:
+        """writes index to disk, through a temp file so a crash never leaves half an index"""
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as file_handle:
+                json.dump({"version": BLAST_INDEX_VERSION, "files": self.files}, file_handle)
+            os.replace(tmp, self.path)
+        except OSError:
+            # read only results directory, index just stays in memory
+            pass
+
+    def _rebuild_hits(self) -> None:
+        """flattens per file entries into a single hit id lookup"""
+        self.hits = {}
+        self.version += 1
+        for name in sorted(self.files):
+            for hit_id, offsets in self.files[name]["hits"].items():
+                self.hits.setdefault(hit_id, (name, offsets))
+
+    def _index_file(self, entry: os.DirEntry) -> None:
+        """(re)scans a single blast output file
+
+        Args:
+            entry (os.DirEntry): blast output file
+        """
+        stat = entry.stat()
+        header_end, hits = scan_blast_hits(entry.path)
+        self.files[entry.name] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "header": header_end, "hits": hits}
+
+    def _is_current(self, name: str, stat: os.stat_result) -> bool:
+        saved = self.files.get(name)
+        return saved is not None and saved["mtime"] == stat.st_mtime_ns and saved["size"] == stat.st_size
+
+    def _update_hits(self, names: Set[str], old: Dict[str, dict]) -> Set[str]:
+        """updates the hit id lookup for the hits of changed files only, keeping the first file (sorted by name)
+        that has a hit as the one it is looked up in, same as _rebuild_hits()
+
+        Args:
+            names (Set[str]): added, changed and removed files
+            old (Dict[str, dict]): entries the changed and removed files had before
+
+        Returns:
+            Set[str]: hit ids that were in the changed files, before or after
+        """
+        ids: Set[str] = set()
+        for name in names:
+            if name in old:
+                ids.update(old[name]["hits"])
+            if name in self.files:
+                ids.update(self.files[name]["hits"])
+        for hit_id in ids:
+            owner = self.hits.pop(hit_id, (None,))[0]
+            candidates = [name for name in names if name in self.files and hit_id in self.files[name]["hits"]]
+            if owner is not None and (owner not in names or owner in candidates):
+                candidates.append(owner)
+            elif owner is not None:
+                # the file it was looked up in lost it, an unchanged file may still have it
+                candidates.extend(name for name in self.files if name not in names and hit_id in self.files[name]["hits"])
+            if candidates:
+                name = min(candidates)
+                self.hits[hit_id] = (name, self.files[name]["hits"][hit_id])
+        return ids
+
+    def refresh(self) -> Set[str]:
+        """rescans any blast output that was added or changed since the index was made, drops removed ones
+
+        Each output's mtime and size is checked, so one written over in place is picked up too. Costs a
+        directory listing and a stat per output when nothing changed.
+
+        Returns:
+            Set[str]: hit ids of the added, changed and removed files
+        """
+        if not os.path.isdir(self.blastout):
+            return set()
+        with self._lock:
+            old: Dict[str, dict] = {}
+            seen = set()
+            for entry in os.scandir(self.blastout):
+                if entry.is_file() and entry.name.endswith(BLASTOUT_ENDS):
+                    seen.add(entry.name)
+                    if not self._is_current(entry.name, entry.stat()):
+                        old[entry.name] = self.files.get(entry.name, {"hits": {}})
+                        self._index_file(entry)
+            for name in set(self.files) - seen:
+                old[name] = self.files.pop(name)
+            if len(old) == 0:
+                return set()
+            ids = self._update_hits(set(old), old)
+            self.version += 1
+            self._save()
+            return ids
+
+    def lookup(self, id: str) -> Optional[Hit]:
+        """finds and parses the single hit with the given id
+
+        Args:
+            id (str): hit id (tip name)
+
+        Returns:
+            Optional[Hit]: SearchIO Hit, None if id is not in any blast output
+        """
+        self.refresh()
+        found = self.hits.get(id)
+        if found is None:
+            return None
+        name, offsets = found
+        path = os.path.join(self.blastout, name)
+
+        iter_start, iter_hits_end, hit_start, hit_end = offsets
+        # gzip handles seek by decompressing forward, plain files seek directly
+        with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as file_handle:
+            header = file_handle.read(self.files[name]["header"])
+            file_handle.seek(iter_start)
+            iteration = file_handle.read(iter_hits_end - iter_start)
+            file_handle.seek(hit_start)
+            hit = file_handle.read(hit_end - hit_start)
+
+        # cut down document holding the preamble, the hit's iteration and the hit itself
+        qresult = SearchIO.read(io.BytesIO(header + iteration + b"\n" + hit + _BLAST_XML_FOOTER), "blast-xml")
+        return qresult[0]
+
+    def summaries(self, ids: Iterable[str]) -> Dict[str, List[tuple]]:
+        """gets the best hsp numbers of many hits, reading each blast output they're in once
+
+        Args:
+            ids (Iterable[str]): hit ids (tip names)
+
+        Returns:
+            Dict[str, List[tuple]]: hit id -> rows in SUMMARY_HIT_COLUMNS order, for ids found in an xml output
+        """
+        self.refresh()
+        grouped: Dict[str, List[str]] = {}
+        for id in ids:
+            found = self.hits.get(id)
+            if found is not None:
+                grouped.setdefault(found[0], []).append(id)
+
+        summaries: Dict[str, List[tuple]] = {}
+        for name, wanted in grouped.items():
+            with _blast_bytes(os.path.join(self.blastout, name)) as data:
+                for id in wanted:
+                    iter_start, iter_hits_end, hit_start, hit_end = self.files[name]["hits"][id]
+                    # the hit with the start of its iteration, for the query name
+                    xml = bytes(data[iter_start:iter_hits_end]) + bytes(data[hit_start:hit_end])
+                    summaries[id] = [row[1:] for row in blast_xml_summary_rows(name, BLAST_SUMMARY_RE.finditer(xml))]
+        return summaries
+
+def blast_index(blastout: Optional[str] = None) -> BlastHitIndex:
+    """gets the hit index for a blastout directory, built once per session
+
+    Args:
+        blastout (Optional[str], optional): location of blast outputs. Defaults to ./blastout.
+
+    Returns:
+        BlastHitIndex: index of all hits in the directory
+    """
+    return shared_instance(BlastHitIndex, blastout or f"{os.getcwd()}/blastout")
+
+class BlastTabTable(CachedFile):
+    """the tabular blast outputs in a directory loaded into one columnar table
+
+    Databases with xml output are read from that instead, like the summary cache and the pipeline's extract
+    step do, their tabular output is left out.
+
+    Each column is a NumPy array (plus a "file" column naming the output a row came from),
+    so filtering by subject id, e-value and bitscore is one vectorized pass. Outputs that are
+    added or changed are parsed again when the table is next used, the rest are kept as read.
+    """
+
+    def __init__(self, blastout: str) -> None:
+        super().__init__(blastout)
+        self.blastout = blastout
+        self.columns: Dict[str, np.ndarray] = {}
+        self._tables: Dict[str, np.ndarray] = {}
+        """file name -> its rows, as read, so only changed files are parsed again"""
+        self._empty()
+
+    def __len__(self) -> int:
+        self._reload_if_needed()
+        return len(self.columns["sseqid"])
+
+    def _empty(self) -> None:
+        columns = {name: np.array([], dtype=BLAST_TAB_NUMERIC.get(name, str)) for name in BLAST_TAB_COLUMNS}
+        columns["file"] = np.array([], dtype=str)
+        self.columns = columns
+
+    def _file_stamp(self) -> Dict[str, Tuple[int, int]]:
+        """mtime and size of every tabular output of a database without xml output"""
+        stamps = {}
+        if os.path.isdir(self.blastout):
+            entries = {entry.name: entry for entry in os.scandir(self.blastout) if entry.is_file()}
+            for name in used_blast_outputs(entries).values():
+                if name.endswith(BLAST_TAB_END):
+                    stat = entries[name].stat()
+                    stamps[name] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _read(self, stamps: Dict[str, Tuple[int, int]]) -> Set[str]:
+        """parses the outputs whose stamps changed and joins every output's rows, returns the subject ids of changed outputs"""
+        ids: Set[str] = set()
+        for name in set(self._tables) - set(stamps):
+            ids.update(self._tables.pop(name)[:, BLAST_TAB_COLUMNS.index("sseqid")].tolist())
+        for name in sorted(stamps):
+            if stamps[name] == (self._stamp or {}).get(name):
+                continue
+            if name in self._tables:
+                ids.update(self._tables.pop(name)[:, BLAST_TAB_COLUMNS.index("sseqid")].tolist())
+            if stamps[name][1] == 0:
+                continue
+            with warnings.catch_warnings():
+                # outputs of queries without hits only have comment lines
+                warnings.simplefilter("ignore", UserWarning)
+                table = np.loadtxt(os.path.join(self.blastout, name), dtype=str, delimiter="\t", comments="#", ndmin=2)
+            if table.shape[1] < len(BLAST_TAB_COLUMNS):
+                # only comment lines (or a cut off file), nothing to add
+                continue
+            self._tables[name] = table[:, :len(BLAST_TAB_COLUMNS)]
+            ids.update(self._tables[name][:, BLAST_TAB_COLUMNS.index("sseqid")].tolist())
+        names = sorted(self._tables)
+        if len(names) == 0:
+            self._empty()
+            return ids
+        table = np.concatenate([self._tables[name] for name in names])
+        # swapped in whole, select() on another thread never sees columns of different lengths
+        columns = {name: table[:, i].astype(BLAST_TAB_NUMERIC.get(name, str)) for i, name in enumerate(BLAST_TAB_COLUMNS)}
+        columns["file"] = np.concatenate([np.full(len(self._tables[name]), name) for name in names])
+        self.columns = columns
+        return ids
+
+    def select(self, sseqid: Optional[str] = None, max_evalue: Optional[float] = None, min_bitscore: Optional[float] = None) -> np.ndarray:
+        """finds rows matching every given filter
+
+        Args:
+            sseqid (Optional[str], optional): subject (tip) id. Defaults to None.
+            max_evalue (Optional[float], optional): largest e-value to keep. Defaults to None.
+            min_bitscore (Optional[float], optional): smallest bitscore to keep. Defaults to None.
+
+        Returns:
+            np.ndarray: indices of matching rows, best bitscore first
+        """
+        self._reload_if_needed()
+        mask = np.ones(len(self), dtype=bool)
+        if sseqid is not None:
+            mask &= self.columns["sseqid"] == sseqid
+        if max_evalue is not None:
+            mask &= self.columns["evalue"] <= max_evalue
+        if min_bitscore is not None:
+            mask &= self.columns["bitscore"] >= min_bitscore
+        rows = np.flatnonzero(mask)
+        return rows[np.argsort(-self.columns["bitscore"][rows], kind="stable")]
+
+    def rows(self, indices: np.ndarray) -> List[List]:
+        """gets rows of the table
+
+        Args:
+            indices (np.ndarray): row indices, usually from select()
+
+        Returns:
+            List[List]: one list of values per row, in BLAST_TAB_COLUMNS order
+        """
+        return [[self.columns[name][i].item() for name in BLAST_TAB_COLUMNS] for i in indices]
+
+    def summaries(self, ids: Iterable[str]) -> Dict[str, List[tuple]]:
+        """gets the best hsp numbers of every hit of many subject ids in one pass over the table
+
+        Args:
+            ids (Iterable[str]): subject ids (tip names)
+
+        Returns:
+            Dict[str, List[tuple]]: subject id -> rows in SUMMARY_HIT_COLUMNS order (hit_len is None, tabular
+                output doesn't have it), best bitscore first
+        """
+        self._reload_if_needed()
+        rows = np.flatnonzero(np.isin(self.columns["sseqid"], list(ids)))
+        rows = rows[np.argsort(-self.columns["bitscore"][rows], kind="stable")]
+        best: Dict[Tuple[str, str, str], list] = {}
+        for i in rows:
+            sseqid, file, query = self.columns["sseqid"][i].item(), self.columns["file"][i].item(), self.columns["qseqid"][i].item()
+            row = best.get((sseqid, file, query))
+            if row is not None:
+                row[3] += 1
+                continue
+            length = self.columns["length"][i].item()
+            identity = round(self.columns["pident"][i].item() * length / 100)
+            best[(sseqid, file, query)] = [file, query, None, 1, self.columns["bitscore"][i].item(), self.columns["evalue"][i].item(), identity, length]
+        summaries: Dict[str, List[tuple]] = {}
+        for (sseqid, _, _), row in best.items():
+            summaries.setdefault(sseqid, []).append(tuple(row))
+        return summaries
+
+def blast_tab(blastout: Optional[str] = None) -> BlastTabTable:
+    """gets the table of tabular blast outputs for a blastout directory, built once per session
+
+    Args:
+        blastout (Optional[str], optional): location of blast outputs. Defaults to ./blastout.
+
+    Returns:
+        BlastTabTable: table of all tabular blast output in the directory
+    """
+    return shared_instance(BlastTabTable, blastout or f"{os.getcwd()}/blastout")
+
+class SummaryCache:
+    """read only view of the per tip summary cache pipeline.summarize writes
+
+    Every lookup is a single indexed read. The cache is only used while it is newer than
+    the pipeline outputs it was made from, and the blast outputs are the ones it was made from.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._mtime: Optional[int] = None
+        # lookups come from several background threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _blast_files() -> List[str]:
+        """names of the blast outputs, xml and tabular"""
+        blastout = f"{os.getcwd()}/blastout"
+        if not os.path.isdir(blastout):
+            return []
+        # the files themselves, not blastout/, the viewer writes its hit index there
+        return sorted(name for name in os.listdir(blastout) if name.endswith(BLASTOUT_ENDS) or name.endswith(BLAST_TAB_END))
+
+    def _sources(self) -> List[str]:
+        return [
+            f"{os.getcwd()}/alignment/alignment_seq_stats.csv",
+            tree_file(),
+        ] + [f"{os.getcwd()}/blastout/{name}" for name in self._blast_files()]
+
+    def usable(self) -> bool:
+        """checks the cache exists, is newer than every pipeline output it summarizes, and was made
+        from the blast outputs there are now
+
+        Returns:
+            bool: if the cache can be used for lookups
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        for source in self._sources():
+            if os.path.exists(source) and os.stat(source).st_mtime_ns > mtime:
+                return False
+        if mtime != self._mtime:
+            with self._lock:
+                if self._db is not None:
+                    self._db.close()
+                self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+                self._mtime = mtime
+        # a removed output is newer than nothing, the cache keeps the list it was made from
+        saved = self._query("SELECT value FROM meta WHERE key = 'blast_files'")
+        return bool(saved) and json.loads(saved[0][0]) == self._blast_files()
+
+    def _query(self, sql: str, args: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def stats(self, id: str) -> Optional[Tuple[List[str], List[str]]]:
+        """gets the alignment stats row of a tip
+
+        Args:
+            id (str): tip name
+
+        Returns:
+            Optional[Tuple[List[str], List[str]]]: csv headers and the tip's row, None if the tip has no stats
+        """
+        rows = self._query("SELECT stats FROM tips WHERE name = ? AND stats IS NOT NULL", (id,))
+        if len(rows) == 0:
+            return None
+        return self.stats_headers(), json.loads(rows[0][0])
+
+    def stats_headers(self) -> List[str]:
+        """gets the headers of the alignment stats csv
 
-    return(cont)
+        Returns:
+            List[str]: csv headers, empty if the pipeline had no stats to cache
+        """
+        headers = self._query("SELECT value FROM meta WHERE key = 'stats_headers'")
+        return json.loads(headers[0][0]) if headers else []
+
+    def tree_position(self, id: str) -> Optional[Tuple[int, float]]:
+        """gets a tip's top to bottom order in the tree and its distance from the root
+
+        Args:
+            id (str): tip name
+
+        Returns:
+            Optional[Tuple[int, float]]: tree order and root distance, None if the tip is not in the tree
+        """
+        rows = self._query("SELECT tree_order, root_distance FROM tips WHERE name = ? AND tree_order IS NOT NULL", (id,))
+        return rows[0] if rows else None
+
+    def hits(self, id: str) -> List[tuple]:
+        """gets the best hsp numbers of every blast hit of a tip
+
+        Args:
+            id (str): tip name
+
+        Returns:
+            List[tuple]: rows in SUMMARY_HIT_COLUMNS order, best bitscore first
+        """
+        return self._query(f"SELECT {', '.join(SUMMARY_HIT_COLUMNS)} FROM hits WHERE name = ? ORDER BY bitscore DESC", (id,))
+
+    def tips_many(self, ids: List[str]) -> Dict[str, Tuple[Optional[List[str]], Optional[int], Optional[float]]]:
+        """gets the stats row and tree position of many tips, a query per SQLITE_CHUNK tips
+
+        Args:
+            ids (List[str]): tip names
+
+        Returns:
+            Dict[str, Tuple[Optional[List[str]], Optional[int], Optional[float]]]: tip name -> (stats row,
+                tree order, root distance), for tips in the cache
+        """
+        tips = {}
+        for i in range(0, len(ids), SQLITE_CHUNK):
+            chunk = ids[i:i + SQLITE_CHUNK]
+            sql = f"SELECT name, stats, tree_order, root_distance FROM tips WHERE name IN ({', '.join('?' * len(chunk))})"
+            for name, stats, order, distance in self._query(sql, tuple(chunk)):
+                tips[name] = (json.loads(stats) if stats is not None else None, order, distance)
+        return tips
+
+    def hits_many(self, ids: List[str]) -> Dict[str, List[tuple]]:
+        """gets the blast hits of many tips, a query per SQLITE_CHUNK tips
+
+        Args:
+            ids (List[str]): tip names
+
+        Returns:
+            Dict[str, List[tuple]]: tip name -> rows in SUMMARY_HIT_COLUMNS order, best bitscore first
+        """
+        hits: Dict[str, List[tuple]] = {}
+        for i in range(0, len(ids), SQLITE_CHUNK):
+            chunk = ids[i:i + SQLITE_CHUNK]
+            sql = f"SELECT name, {', '.join(SUMMARY_HIT_COLUMNS)} FROM hits WHERE name IN ({', '.join('?' * len(chunk))}) ORDER BY name, bitscore DESC"
+            for row in self._query(sql, tuple(chunk)):
+                hits.setdefault(row[0], []).append(tuple(row[1:]))
+        return hits
+
+def summary_cache(path: Optional[str] = None) -> Optional[SummaryCache]:
+    """gets the summary cache if the pipeline wrote one and it is up to date
+
+    Args:
+        path (Optional[str], optional): location of the cache. Defaults to ./kaleview_summary.sqlite.
+
+    Returns:
+        Optional[SummaryCache]: the cache, None if there is no usable cache
+    """
+    cache = shared_instance(SummaryCache, path or f"{os.getcwd()}/{SUMMARY_NAME}")
+    return cache if cache.usable() else None
 
 def blast_table(id: str) -> ptg.Label:
     """outputs blast stats in a Label
@@ -64,50 +1106,245 @@ def blast_table(id: str) -> ptg.Label:
     Returns:
         ptg.Label: string table of blast statistics within a Label
     """
-    # for each blast output xml, get the names of sequences that had hsps (really inefficient probably)
-    seq_ids = set()
-    blastout = f"{os.getcwd()}/blastout"
-    for entry in os.scandir(blastout):
-        if entry.is_file() and entry.name.endswith("_blastout"):
-            qresult = SearchIO.read(entry.path, "blast-xml")
-            for hit in qresult:
-                if hit.id == id:
-                    ret = ptg.Label(str(hit))
-                    return ret
-                    #TODO potentially use other output format that includes more stats
-                    # ptg.Container()
-                    # print(f"{hit.id}, {hit.seq_len}")
-                    # for hsp in hit:
-                    #     print(f"{hsp.bitscore}, {hsp.evalue}")
-                    #     print(hsp.hit)
-                    #     print(hsp.aln_span)
-                    #     print(hsp.gap_num)
-                    #     print(hsp.ident_num)
-
-                    #     print(hsp.hit.seq)
-                    #     print(hsp.aln_annotation["similarity"])
-                    #     print(hsp.query.seq)
-                # for hsp in hit:
-                #     print(hsp)
-                # for hit in qresult:
-                #     print(hit)
-                # seq_ids.add(qresult.id)
-
-#TODO for use in future if alignment view is implemented
-#
-# def out_alignment(id: str) -> ptg.Container:
-#     """outputs macse alignment of tip sequence vs query sequence in a container
-
-#     Args:
-#         id (str): valid tip name
-
-#     Returns:
-#         ptg.Container: string of macse alignment  within a container
-#     """
-#     alignment = AlignIO.read(f"{os.getcwd()}/alignment/alignment_NT_NoFS.fasta", "fasta")
-#     for record in alignment:
-#         if record.id == id:
-#             print(record.seq)
+    # seek straight to the hit through the index instead of parsing every blast output
+    hit = blast_index().lookup(id)
+    if hit is not None:
+        ret = ptg.Label(str(hit))
+        return ret
+        #TODO potentially use other output format that includes more stats
+        # ptg.Container()
+        # print(f"{hit.id}, {hit.seq_len}")
+        # for hsp in hit:
+        #     print(f"{hsp.bitscore}, {hsp.evalue}")
+        #     print(hsp.hit)
+        #     print(hsp.aln_span)
+        #     print(hsp.gap_num)
+        #     print(hsp.ident_num)
+
+        #     print(hsp.hit.seq)
+        #     print(hsp.aln_annotation["similarity"])
+        #     print(hsp.query.seq)
+
+    # no xml output for this hit, fall back to the summary cache, then the tabular output
+    cache = summary_cache()
+    if cache is not None:
+        hits = cache.hits(id)
+        if len(hits) > 0:
+            tab = PrettyTable()
+            tab.field_names = SUMMARY_HIT_COLUMNS
+            tab.add_rows(hits)
+            return ptg.Label(str(tab))
+
+    table = blast_tab()
+    rows = table.select(sseqid=id)
+    if len(rows) > 0:
+        tab = PrettyTable()
+        tab.field_names = BLAST_TAB_COLUMNS
+        tab.add_rows(table.rows(rows))
+        return ptg.Label(str(tab))
+
+# conservation drawn from empty (none of the other sequences agree) to full (all agree)
+CONSERVATION_BARS = " \u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+class AlignmentStrip(ptg.Widget):
+    """one tip's aligned sequence under a column ruler, with its conservation drawn below it
+
+    Only the columns that fit in the widget are sliced out of the alignment, scrolling moves along the columns.
+    """
+
+    label_width = 6
+
+    def __init__(self, id: str, index: AlignmentIndex, conservation: np.ndarray, **attrs: Any) -> None:
+        super().__init__(**attrs)
+        self.id = id
+        self.index = index
+        self.conservation = conservation
+        residues = np.flatnonzero(~np.isnan(conservation))
+        self.offset = int(residues[0]) if len(residues) else 0
+        """First column shown, starts at the tip's first residue."""
+
+    def _columns(self) -> int:
+        return max(self.width - self.label_width, 1)
+
+    def scroll(self, amount: int) -> bool:
+        """moves the visible columns
+
+        Args:
+            amount (int): columns to move by, negative moves left
+
+        Returns:
+            bool: if the view moved
+        """
+        offset = max(0, min(self.offset + amount, self.index.length - self._columns()))
+        moved = offset != self.offset
+        self.offset = offset
+        return moved
+
+    def on_scroll_up(self, _: ptg.MouseEvent) -> bool:
+        return self.scroll(-10)
+
+    def on_scroll_down(self, _: ptg.MouseEvent) -> bool:
+        return self.scroll(10)
+
+    def get_lines(self) -> List[str]:
+        """renders the ruler, sequence and conservation of the visible columns"""
+        columns = self._columns()
+        start, end = self.offset, min(self.offset + columns, self.index.length)
+        # column numbers are 1 based, marked every 10 columns
+        ruler = ""
+        for column in range(start, end):
+            if len(ruler) <= column - start and column % 10 == 0:
+                ruler += str(column + 1)
+            elif len(ruler) <= column - start:
+                ruler += " "
+        seq = (self.index.sequence(self.id, start, end) or b"").decode()
+        window = self.conservation[start:end]
+        levels = np.where(np.isnan(window), 0, np.ceil(np.nan_to_num(window) * (len(CONSERVATION_BARS) - 1))).astype(int)
+        bars = "".join(CONSERVATION_BARS[level] for level in levels)
+        label = self.label_width
+        return [
+            " " * label + ruler[:columns],
+            "seq".ljust(label) + seq,
+            "cons".ljust(label) + bars,
+        ]
+
+def out_alignment(id: str) -> ptg.Container:
+    """outputs the macse alignment of a tip with its conservation against the other aligned sequences
+
+    Args:
+        id (str): valid tip name
+
+    Returns:
+        ptg.Container: summary and scrollable alignment strip in a container
+    """
+    index = alignment_index()
+    id = resolve_tip(id)
+    conservation = index.conservation(id)
+    if conservation is None:
+        return ptg.Container(ptg.Label(f"[ptg.alert]{id} is not in {os.path.basename(index.path)}"))
+    residues = int(np.count_nonzero(~np.isnan(conservation)))
+    mean = float(np.nanmean(conservation)) if residues else 0.0
+    summary = ptg.Label(f"{len(index)} seqs x {index.length} columns, {residues} residues, mean conservation {mean:.2f}")
+    return ptg.Container(summary, AlignmentStrip(id, index, conservation))
+
+class SeqStatsStore(CachedFile):
+    """in memory copy of the macse per sequence stats csv, keyed by sequence id
+
+    The csv is read once and only read again when it changes on disk.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.headers: List[str] = []
+        self.rows: Dict[str, List[str]] = {}
+
+    def _read(self, stamp: Any) -> Set[str]:
+        """reads the csv, returns the ids whose row was added, changed or removed"""
+        headers: List[str] = []
+        rows: Dict[str, List[str]] = {}
+        with open(self.path, "r", newline="") as file_handle:
+            reader = csv.reader(file_handle, delimiter=";")
+            headers = next(reader, [])
+            for line in reader:
+                if line:
+                    # later rows win, same as the old full scan did
+                    rows[line[0]] = line
+        changed = {id for id in rows.keys() | self.rows.keys() if rows.get(id) != self.rows.get(id)}
+        self.headers, self.rows = headers, rows
+        return changed
+
+    def get(self, id: str) -> Optional[List[str]]:
+        """gets the stats row for a sequence
+
+        Args:
+            id (str): sequence id (tip name)
+
+        Returns:
+            Optional[List[str]]: csv row, None if id is not in the csv
+        """
+        self._reload_if_needed()
+        return self.rows.get(id)
+
+    def __contains__(self, id: str) -> bool:
+        self._reload_if_needed()
+        return id in self.rows
+
+def seq_stats(path: Optional[str] = None) -> SeqStatsStore:
+    """gets the stats store for a macse stats csv, built once per session
+
+    Args:
+        path (Optional[str], optional): location of stats csv. Defaults to ./alignment/alignment_seq_stats.csv.
+
+    Returns:
+        SeqStatsStore: stats store of the csv
+    """
+    return shared_instance(SeqStatsStore, path or f"{os.getcwd()}/alignment/alignment_seq_stats.csv")
+
+class ClusterMap(CachedFile):
+    """in memory copy of the cluster stage's tip -> representative map, reread when it changes on disk
+
+    A missing map (the pipeline ran without -cluster) maps nothing.
+    """
+
+    missing_ok = True
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.rows: Dict[str, Tuple[str, str, float]] = {}
+
+    def _read(self, stamp: Any) -> Set[str]:
+        """reads the map, returns the tips whose row was added, changed or removed"""
+        rows: Dict[str, Tuple[str, str, float]] = {}
+        if stamp is not None:
+            with open(self.path, "r", newline="") as file_handle:
+                reader = csv.reader(file_handle, delimiter="\t")
+                next(reader, None)
+                for line in reader:
+                    if len(line) >= 4:
+                        rows[line[0]] = (line[1], line[2], float(line[3]))
+        changed = {id for id in rows.keys() | self.rows.keys() if rows.get(id) != self.rows.get(id)}
+        self.rows = rows
+        return changed
+
+    def get(self, id: str) -> Optional[Tuple[str, str, float]]:
+        """gets the representative of a tip
+
+        Args:
+            id (str): tip name
+
+        Returns:
+            Optional[Tuple[str, str, float]]: representative, how it matched ("representative", "identical" or "similar")
+                and the estimated k-mer similarity, None if the tip isn't in the map
+        """
+        self._reload_if_needed()
+        return self.rows.get(id)
+
+def cluster_map(path: Optional[str] = None) -> ClusterMap:
+    """gets the cluster map, built once per session
+
+    Args:
+        path (Optional[str], optional): location of the map. Defaults to ./cluster/clusters.tsv.
+
+    Returns:
+        ClusterMap: tip -> representative map
+    """
+    return shared_instance(ClusterMap, path or f"{os.getcwd()}/{CLUSTER_DIR}/{CLUSTER_MAP_NAME}")
+
+def resolve_tip(id: str) -> str:
+    """name the alignment and tree know a tip by, its representative if the cluster stage left it out of the alignment
+
+    Tips with alignment stats of their own keep their name, so a map left from an earlier clustered run is ignored.
+
+    Args:
+        id (str): tip name
+
+    Returns:
+        str: tip name to look up in the alignment and tree
+    """
+    if _stats_found(id):
+        return id
+    cluster = cluster_map().get(id)
+    return cluster[0] if cluster is not None else id
 
 def out_alignment_stats(id: str) -> ptg.Container:
     """outputs macse alignment stats for given id
@@ -118,19 +1355,27 @@ def out_alignment_stats(id: str) -> ptg.Container:
     Returns:
         ptg.Container: table of alignment stats in a Container
     """
-    # grab the correct sequence data
-    headers: List[str]
-    data: List[str]
-    with open(f"{os.getcwd()}/alignment/alignment_seq_stats.csv", "r", newline="") as file_handle:
-        reader = csv.reader(file_handle, delimiter=";")
-        first = True
-        for line in reader:
-            if first:
-                headers = line
-                first = False
-            if line[0] == id:
-                data = line
-        
+    # tips left out of the alignment by clustering show their representative's stats
+    representative = resolve_tip(id)
+    note = None
+    if representative != id:
+        _, match, similarity = cluster_map().get(id)
+        note = ptg.Label(f"{id} is not aligned, showing its representative {representative} ({match}, similarity {similarity:g})")
+        id = representative
+
+    # grab the correct sequence data, from the summary cache if there is one
+    cache = summary_cache()
+    found = cache.stats(id) if cache is not None else None
+    if found is not None:
+        headers, data = found
+        position = cache.tree_position(id)
+        if position is not None:
+            headers = headers + ["tree_order", "root_distance"]
+            data = data + [position[0], round(position[1], 6)]
+    else:
+        store = seq_stats()
+        headers, data = store.headers, store.get(id)
+
     # make the table
     tab = PrettyTable()
     tab.field_names = headers
@@ -140,23 +1385,509 @@ def out_alignment_stats(id: str) -> ptg.Container:
     ret = ptg.Container(
         ptg.Label(str(tab))
     )
+    if note is not None:
+        ret.set_widgets([note, ptg.Label(str(tab))])
     return ret
 
+def out_clade_stats(ids: List[str]) -> ptg.Container:
+    """outputs the macse alignment stats added up over the smallest clade holding the given tips
+
+    Args:
+        ids (List[str]): valid tip names, a single tip shows the clade of it and its sisters
+
+    Returns:
+        ptg.Container: clade summary and table of stats in a Container
+    """
+    index = tree_index()
+    node = index.clade([resolve_tip(id) for id in ids])
+    if node is None:
+        return ptg.Container(ptg.Label("[ptg.alert]Tip not in the tree"))
+    headers, stats = index.clade_stats(node, seq_stats())
+    tips = index.clade_tips(node)
+
+    tab = PrettyTable()
+    tab.field_names = ["stat", "tips", "sum", "mean", "min", "max"]
+    for i, header in enumerate(headers):
+        tab.add_row([header, int(stats["count"][i])] + [
+            "" if np.isnan(stats[name][i]) else f"{stats[name][i]:.6g}" for name in ("sum", "mean", "min", "max")
+        ])
+
+    shown = ", ".join(tips[:5]) + (f" and {len(tips) - 5} more" if len(tips) > 5 else "")
+    return ptg.Container(
+        ptg.Label(f"clade of {', '.join(ids)}: {len(tips)} tips ({shown})"),
+        ptg.Label(str(tab)),
+    )
+
 def header_found(id: str) -> bool:
     """checks if tip label input is within the alignment files, use before updating windows
 
+    Tips left out of the alignment by clustering are found through their representative.
+
     Args:
         id (str): input tip name
 
     Returns:
         bool: if tip name was found within alignment files
     """
-    with open(f"{os.getcwd()}/alignment/alignment_seq_stats.csv", "r", newline="") as file_handle:
-        reader = csv.reader(file_handle, delimiter=";")
-        for line in reader:
-            if line[0] == id:
-                return True
-        return False
+    return _stats_found(resolve_tip(id))
+
+def _stats_found(id: str) -> bool:
+    """if a tip has alignment stats, in the summary cache if there is one or else the stats csv"""
+    cache = summary_cache()
+    if cache is not None:
+        return cache.stats(id) is not None
+    return id in seq_stats()
+
+def batch_lookup(ids: Iterable[str]) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    """looks up the alignment stats, tree position and blast hits of many tips at once
+
+    The windows look tips up one at a time, this reads each pipeline output once for the whole batch
+    (or runs a few queries on the summary cache when there is a usable one).
+
+    Args:
+        ids (Iterable[str]): tip names
+
+    Returns:
+        Tuple[List[str], Dict[str, Dict[str, Any]]]: alignment stats headers, and tip name -> {"representative":
+            tip whose stats and tree position are given (itself unless clustering left it out of the alignment),
+            "stats": csv row or None, "tree_order": int or None, "root_distance": float or None, "hits": rows in
+            SUMMARY_HIT_COLUMNS order, best bitscore first}
+    """
+    ids = list(dict.fromkeys(ids))
+    results = {id: {"representative": id, "stats": None, "tree_order": None, "root_distance": None, "hits": []} for id in ids}
+
+    cache = summary_cache()
+    headers, tips = _batch_tips(ids, cache)
+    # tips left out of the alignment by clustering get their representative's stats and tree position,
+    # blast hits stay their own
+    clusters = cluster_map()
+    stand_ins = {}
+    for id in ids:
+        cluster = clusters.get(id)
+        if cluster is not None and cluster[0] != id and tips.get(id, (None,))[0] is None:
+            stand_ins[id] = cluster[0]
+    if stand_ins:
+        _, found = _batch_tips(list(dict.fromkeys(stand_ins.values())), cache)
+        for id, representative in stand_ins.items():
+            if representative in found:
+                tips[id] = found[representative]
+                results[id]["representative"] = representative
+    for id, (stats, order, distance) in tips.items():
+        results[id].update({"stats": stats, "tree_order": order, "root_distance": distance})
+
+    if cache is not None:
+        hits = cache.hits_many(ids)
+    else:
+        # xml outputs first, tabular output for tips without an xml hit, same as blast_table()
+        hits = blast_index().summaries(ids)
+        missing = [id for id in ids if id not in hits]
+        if missing:
+            hits.update(blast_tab().summaries(missing))
+    for id, rows in hits.items():
+        results[id]["hits"] = rows
+    return headers, results
+
+def _batch_tips(ids: List[str], cache: Optional[SummaryCache]) -> Tuple[List[str], Dict[str, Tuple[Optional[List[str]], Optional[int], Optional[float]]]]:
+    """gets the stats row and tree position of many tips, from the summary cache or the stats csv and treefile
+
+    Args:
+        ids (List[str]): tip names
+        cache (Optional[SummaryCache]): usable summary cache, None to read the pipeline files
+
+    Returns:
+        Tuple[List[str], Dict[str, Tuple[Optional[List[str]], Optional[int], Optional[float]]]]: alignment stats
+            headers, and tip name -> (stats row, tree order, root distance) for tips found anywhere
+    """
+    if cache is not None:
+        return cache.stats_headers(), cache.tips_many(ids)
+
+    headers: List[str] = []
+    tips: Dict[str, list] = {}
+    stats_path = f"{os.getcwd()}/alignment/alignment_seq_stats.csv"
+    if os.path.exists(stats_path):
+        store = seq_stats(stats_path)
+        for id in ids:
+            if store.get(id) is not None:
+                tips[id] = [store.get(id), None, None]
+        headers = store.headers
+
+    if os.path.exists(tree_file()):
+        layout = tree_layout()
+        wanted = set(ids)
+        for order, node in enumerate(layout.tips):
+            if layout.names[node] in wanted:
+                tips.setdefault(layout.names[node], [None, None, None])[1:] = [order, layout.distance[node]]
+    return headers, {id: tuple(tip) for id, tip in tips.items()}
+
+# 3-letter pieces of a mistyped name looked up when it shares no useful prefix with any tip, rarest first
+SUGGEST_GRAMS = 8
+# names counted per close-match lookup, the rarest pieces are taken until they hold this many names, pieces
+# most names have (eg. a species prefix) say little and cost the most to count
+SUGGEST_COUNTED = 2000
+
+def _grams(text: str) -> Set[str]:
+    """lower case 3-letter pieces of a name, the whole name if it is shorter"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+
+class TipIndex:
+    """sorted array of tip names for prefix completion and close-match suggestions
+
+    Prefix lookups are two binary searches, so they stay fast for hundreds of
+    thousands of tips. Names holding the same 3-letter pieces as a mistyped one are
+    found through a piece -> names index, only built the first time it's needed.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.names = sorted(set(names))
+        self._gram_names: Optional[Dict[str, List[str]]] = None
+        # the -watch poller adds names while the input box asks for suggestions
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, names: Iterable[str]) -> None:
+        """adds names not already in the index, inserting a few in place instead of sorting everything again
+
+        Args:
+            names (Iterable[str]): tip names
+        """
+        with self._lock:
+            new = [name for name in set(names) if not self._has(name)]
+            if not new:
+                return
+            # a new list is swapped in, so a search on another thread never sees one half inserted
+            if len(new) * 8 < len(self.names):
+                sorted_names = list(self.names)
+                for name in new:
+                    bisect.insort(sorted_names, name)
+            else:
+                sorted_names = sorted(self.names + new)
+            self.names = sorted_names
+            if self._gram_names is not None:
+                self._add_grams(self._gram_names, new)
+
+    def remove(self, names: Iterable[str]) -> None:
+        """drops names from the index
+
+        Args:
+            names (Iterable[str]): tip names
+        """
+        with self._lock:
+            gone = {name for name in names if self._has(name)}
+            if not gone:
+                return
+            self.names = [name for name in self.names if name not in gone]
+            if self._gram_names is not None:
+                for name in gone:
+                    for gram in _grams(name):
+                        self._gram_names[gram] = [other for other in self._gram_names[gram] if other != name]
+
+    def build_suggestions(self) -> None:
+        """builds the 3-letter piece index suggest() falls back on, if it isn't built yet"""
+        if self._gram_names is not None:
+            return
+        with self._lock:
+            if self._gram_names is None:
+                gram_names: Dict[str, List[str]] = {}
+                self._add_grams(gram_names, self.names)
+                self._gram_names = gram_names
+
+    @staticmethod
+    def _add_grams(gram_names: Dict[str, List[str]], names: Iterable[str]) -> None:
+        for name in names:
+            for gram in _grams(name):
+                gram_names.setdefault(gram, []).append(name)
+
+    def _gram_pool(self, text: str, candidates: int) -> List[str]:
+        """names sharing the most of text's rarest 3-letter pieces
+
+        The rarest pieces are counted until they hold SUGGEST_COUNTED names, so a lookup stays well under a
+        millisecond however many tips there are. If even the rarest piece is that common, its first names are used.
+
+        Args:
+            text (str): mistyped tip name
+            candidates (int): max names returned
+
+        Returns:
+            List[str]: names, most pieces shared first
+        """
+        self.build_suggestions()
+        postings = sorted((self._gram_names[gram] for gram in _grams(text) if gram in self._gram_names), key=len)
+        if not postings:
+            return []
+        if len(postings[0]) > SUGGEST_COUNTED:
+            return postings[0][:candidates]
+        shared: collections.Counter = collections.Counter()
+        counted = 0
+        for names in postings[:SUGGEST_GRAMS]:
+            if counted + len(names) > SUGGEST_COUNTED:
+                break
+            shared.update(names)
+            counted += len(names)
+        return heapq.nlargest(candidates, shared, key=shared.__getitem__)
+
+    def _has(self, name: str) -> bool:
+        i = bisect.bisect_left(self.names, name)
+        return i < len(self.names) and self.names[i] == name
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """index range of names starting with prefix"""
+        start = bisect.bisect_left(self.names, prefix)
+        # "\uffff" sorts after any character a tip name will have
+        end = bisect.bisect_left(self.names, prefix + "\uffff", lo=start)
+        return start, end
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """gets names starting with prefix
+
+        Args:
+            prefix (str): start of tip name
+            limit (int, optional): max names returned. Defaults to 10.
+
+        Returns:
+            List[str]: matching names, in sorted order
+        """
+        start, end = self._prefix_range(prefix)
+        return self.names[start:min(end, start + limit)]
+
+    def common_prefix(self, prefix: str) -> str:
+        """longest text every name starting with prefix shares, used for tab completion
+
+        Args:
+            prefix (str): start of tip name
+
+        Returns:
+            str: shared prefix, prefix itself if nothing matches
+        """
+        start, end = self._prefix_range(prefix)
+        if start == end:
+            return prefix
+        # sorted, so the first and last matches are the most different ones
+        return os.path.commonprefix([self.names[start], self.names[end - 1]])
+
+    def suggest(self, text: str, limit: int = 5, candidates: int = 8) -> List[str]:
+        """gets names close to a mistyped tip name
+
+        Finds the longest start of text that any name shares, then ranks the names sharing
+        it by similarity, so only a small slice of the index is ever compared. When no name
+        shares a start with text, or too many to compare do, the names sharing the most of its
+        rarer 3-letter pieces are ranked instead.
+
+        Args:
+            text (str): mistyped tip name
+            limit (int, optional): max names returned. Defaults to 5.
+            candidates (int, optional): max names compared, each costs about 50us. Defaults to 8.
+
+        Returns:
+            List[str]: close names, most similar first
+        """
+        # binary search for the longest prefix with any matches
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            start, end = self._prefix_range(text[:middle])
+            if start < end:
+                low = middle
+            else:
+                high = middle - 1
+        start, end = self._prefix_range(text[:low])
+        if low > 0 and end - start <= candidates:
+            pool = self.names[start:end]
+        else:
+            # a typo early in the name, the names sharing its start are just the alphabetically first ones
+            pool = self._gram_pool(text, candidates)
+        return difflib.get_close_matches(text, pool, n=limit, cutoff=0) if pool else []
+
+_tip_index: Optional[Tuple[tuple, TipIndex]] = None
+# tip_index() and SourceWatcher both swap _tip_index
+_tip_index_lock = threading.Lock()
+
+def _tip_sources(reload: bool = True) -> Tuple[tuple, List[Container[str]]]:
+    """gets every source of tip names
+
+    Args:
+        reload (bool, optional): reread sources that changed on disk first. Defaults to True.
+
+    Returns:
+        Tuple[tuple, List[Container[str]]]: key that changes whenever a source is reloaded, and the sources
+    """
+    sources: List[Container[str]] = []
+    key: list = []
+    store = seq_stats()
+    if reload and os.path.exists(store.path):
+        store._reload_if_needed()
+    sources.append(store.rows)
+    key.append((store, store.version))
+    blast = blast_index()
+    if reload:
+        blast.refresh()
+    sources.append(blast.hits)
+    key.append((blast, blast.version))
+    table = blast_tab()
+    if reload:
+        table._reload_if_needed()
+    sources.append(set(table.columns["sseqid"].tolist()))
+    key.append((table, table.version))
+    clusters = cluster_map()
+    if reload:
+        clusters._reload_if_needed()
+    sources.append(clusters.rows)
+    key.append((clusters, clusters.version))
+    layout = None
+    if os.path.exists(tree_file()):
+        layout = tree_layout()
+        sources.append(layout.tip_nodes)
+    # the layout itself, not its id, a new layout can get a freed one's id
+    key.append(layout)
+    return tuple(key), sources
+
+def tip_index() -> TipIndex:
+    """gets the index of every tip name in the alignment stats, tree and blast outputs
+
+    Rebuilt only when one of the sources has been reloaded.
+
+    Returns:
+        TipIndex: index of all known tip names
+    """
+    global _tip_index
+    with _tip_index_lock:
+        key, sources = _tip_sources()
+        if _tip_index is None or _tip_index[0] != key:
+            names = set()
+            for source in sources:
+                names.update(source)
+            _tip_index = (key, TipIndex(names))
+        return _tip_index[1]
+
+class SourceWatcher:
+    """polls the pipeline outputs the viewer reads and brings their indexes up to date as outputs land
+
+    A poll is a stat of each output (one directory listing for the blast outputs), only outputs that
+    changed are read again, and the blast indexes only rescan the files that changed. What changed is
+    worked out by comparing what the indexes hold with what they held at the last poll, not from what
+    the poll's own reloads report, so an output a lookup happened to reload first is still reported.
+    Tip names that appear or go away are added to or dropped from an already built tip index rather
+    than it being rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self._stamps = {path: self._stamp(path) for path in (tree_file(), alignment_index().path)}
+        self._seen = self._snapshot()
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int]]:
+        """mtime and size of a file, None if it isn't there"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _snapshot() -> Dict[str, Any]:
+        """what each index holds now, as the objects its reloads replace instead of changing"""
+        blast = blast_index()
+        table = blast_tab()
+        with blast._lock:
+            files = dict(blast.files)
+        with table._lock:
+            tables = dict(table._tables)
+        return {
+            "blast": files,
+            "tab": tables,
+            "stats": seq_stats().rows,
+            "clusters": cluster_map().rows,
+            "tree": tree_layout().tip_nodes if os.path.exists(tree_file()) else {},
+        }
+
+    @staticmethod
+    def _changed_files(old: Dict[str, Any], new: Dict[str, Any], ids: Callable[[Any], Iterable[str]]) -> Set[str]:
+        """ids in the per file entries that were added, replaced or removed between two snapshots of an index
+
+        Args:
+            old (Dict[str, Any]): earlier snapshot, file name -> entry
+            new (Dict[str, Any]): later snapshot, file name -> entry
+            ids (Callable[[Any], Iterable[str]]): ids an entry holds
+
+        Returns:
+            Set[str]: ids the changed entries held before or after they changed
+        """
+        changed: Set[str] = set()
+        for name in old.keys() | new.keys():
+            before, after = old.get(name), new.get(name)
+            if before is after:
+                continue
+            for entry in (before, after):
+                if entry is not None:
+                    changed.update(ids(entry))
+        return changed
+
+    @staticmethod
+    def _changed_rows(old: Dict[str, Any], new: Dict[str, Any]) -> Set[str]:
+        """ids whose row was added, changed or removed between two snapshots of a table"""
+        if new is old:
+            return set()
+        return {id for id in old.keys() | new.keys() if old.get(id) != new.get(id)}
+
+    def poll(self) -> Dict[str, Optional[Set[str]]]:
+        """refreshes the indexes of outputs that changed since the last poll
+
+        A poll that raises (eg. a treefile caught mid write) keeps nothing, the next one reports the same changes.
+
+        Returns:
+            Dict[str, Optional[Set[str]]]: what changed, "blast", "stats" and "clusters" -> tip names
+                whose rows changed, "tree" and "alignment" -> None, the whole file changed
+        """
+        blast_index().refresh()
+        blast_tab()._reload_if_needed()
+        store = seq_stats()
+        if os.path.exists(store.path):
+            store._reload_if_needed()
+        cluster_map()._reload_if_needed()
+        stamps = {path: self._stamp(path) for path in self._stamps}
+        seen = self._snapshot()
+
+        changes: Dict[str, Optional[Set[str]]] = {}
+        blast = self._changed_files(self._seen["blast"], seen["blast"], lambda entry: entry["hits"])
+        blast |= self._changed_files(self._seen["tab"], seen["tab"], lambda rows: rows[:, BLAST_TAB_COLUMNS.index("sseqid")].tolist())
+        if blast:
+            changes["blast"] = blast
+        for name in ("stats", "clusters"):
+            rows = self._changed_rows(self._seen[name], seen[name])
+            if rows:
+                changes[name] = rows
+        tips = self._seen["tree"].keys() ^ seen["tree"].keys()
+        if stamps[tree_file()] != self._stamps[tree_file()]:
+            changes["tree"] = None
+        if stamps[alignment_index().path] != self._stamps[alignment_index().path]:
+            changes["alignment"] = None
+
+        if _tip_index is not None:
+            names = set(tips).union(*(names for names in changes.values() if names is not None))
+            if names:
+                self._update_tip_index(names)
+        # only kept once everything was read, a failed poll reports the same files again next time
+        self._stamps, self._seen = stamps, seen
+        return changes
+
+    @staticmethod
+    def _update_tip_index(names: Set[str]) -> None:
+        """adds names that are in a source to the built tip index, and drops the ones no source has any more
+
+        Args:
+            names (Set[str]): tip names whose rows changed somewhere
+        """
+        global _tip_index
+        with _tip_index_lock:
+            # the sources were just reloaded by poll(), reloading them again here would hide what that changed
+            key, sources = _tip_sources(reload=False)
+            index = _tip_index[1]
+            known = {name for name in names if any(name in source for source in sources)}
+            index.add(known)
+            index.remove(names - known)
+            _tip_index = (key, index)
 
 # def main():
 #     """Testing Use"""